@@ -0,0 +1,110 @@
+"""initial schema
+
+Creates the projects, documents, document_chunks and messages tables
+exactly as Base.metadata.create_all used to build them (naive DateTime
+columns, JSON metadata, an index on every primary key). Databases that
+were created that way should be marked with `alembic stamp 0001` and
+then brought up to date with `alembic upgrade head`.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'projects',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_projects_id', 'projects', ['id'])
+    op.create_index('ix_projects_name', 'projects', ['name'])
+
+    op.create_table(
+        'documents',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('project_id', sa.String(), nullable=False),
+        sa.Column('filename', sa.String(length=255), nullable=False),
+        sa.Column('file_type', sa.String(length=10), nullable=False),
+        sa.Column('file_path', sa.String(length=500), nullable=True),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('page_count', sa.Integer(), nullable=True),
+        sa.Column('word_count', sa.Integer(), nullable=True),
+        sa.Column('chunk_count', sa.Integer(), nullable=True),
+        sa.Column('indexed', sa.Boolean(), nullable=True),
+        sa.Column('uploaded_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_documents_id', 'documents', ['id'])
+    op.create_index('ix_documents_project_id', 'documents', ['project_id'])
+    op.create_index('ix_documents_status', 'documents', ['status'])
+
+    op.create_table(
+        'document_chunks',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('document_id', sa.String(), nullable=False),
+        sa.Column('chunk_index', sa.Integer(), nullable=False),
+        sa.Column('chunk_text', sa.Text(), nullable=False),
+        sa.Column('page_number', sa.Integer(), nullable=True),
+        sa.Column('char_start', sa.Integer(), nullable=True),
+        sa.Column('char_end', sa.Integer(), nullable=True),
+        sa.Column('vector_id', sa.String(), nullable=True),
+        sa.Column('embedding_model', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_document_chunks_id', 'document_chunks', ['id'])
+    op.create_index('ix_document_chunks_document_id', 'document_chunks', ['document_id'])
+    op.create_index('ix_document_chunks_vector_id', 'document_chunks', ['vector_id'])
+
+    op.create_table(
+        'messages',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('project_id', sa.String(), nullable=False),
+        sa.Column('conversation_id', sa.String(), nullable=True),
+        sa.Column('role', sa.String(), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('message_metadata', sa.JSON(), nullable=True),
+        sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_messages_id', 'messages', ['id'])
+    op.create_index('ix_messages_conversation_id', 'messages', ['conversation_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_conversation_id', table_name='messages')
+    op.drop_index('ix_messages_id', table_name='messages')
+    op.drop_table('messages')
+    op.drop_index('ix_document_chunks_vector_id', table_name='document_chunks')
+    op.drop_index('ix_document_chunks_document_id', table_name='document_chunks')
+    op.drop_index('ix_document_chunks_id', table_name='document_chunks')
+    op.drop_table('document_chunks')
+    op.drop_index('ix_documents_status', table_name='documents')
+    op.drop_index('ix_documents_project_id', table_name='documents')
+    op.drop_index('ix_documents_id', table_name='documents')
+    op.drop_table('documents')
+    op.drop_index('ix_projects_name', table_name='projects')
+    op.drop_index('ix_projects_id', table_name='projects')
+    op.drop_table('projects')
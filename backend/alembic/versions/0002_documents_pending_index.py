@@ -0,0 +1,34 @@
+"""partial index for pending documents
+
+Replaces the full ix_documents_status index with ix_documents_pending,
+which only covers rows still being uploaded or processed.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-16 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_documents_pending',
+        'documents',
+        ['status'],
+        postgresql_where=sa.text("status IN ('uploading', 'processing')")
+    )
+    op.drop_index('ix_documents_status', table_name='documents')
+
+
+def downgrade() -> None:
+    op.create_index('ix_documents_status', 'documents', ['status'])
+    op.drop_index('ix_documents_pending', table_name='documents')
@@ -0,0 +1,30 @@
+"""drop redundant primary key indexes
+
+The old models declared index=True on every primary key, which gave each
+table an ix_<table>_id index duplicating its primary key constraint.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-16 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('projects', 'documents', 'document_chunks', 'messages')
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        op.execute(f'DROP INDEX IF EXISTS ix_{table}_id')
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.create_index(f'ix_{table}_id', table, ['id'])
@@ -0,0 +1,27 @@
+"""add document_chunks.token_count
+
+Stores the tiktoken length of each chunk so the embedder doesn't have to
+re-tokenize chunk text.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('document_chunks', sa.Column('token_count', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('document_chunks', 'token_count')
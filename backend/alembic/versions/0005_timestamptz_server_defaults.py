@@ -0,0 +1,54 @@
+"""store timestamps as timestamptz stamped by the database
+
+Existing values were written with datetime.utcnow() into naive columns,
+so they are reinterpreted as UTC. Projects and chunks are now inserted
+without created_at/updated_at, which relies on the now() defaults.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (table, column, has now() default)
+TIMESTAMP_COLUMNS = (
+    ('projects', 'created_at', True),
+    ('projects', 'updated_at', True),
+    ('documents', 'uploaded_at', True),
+    ('documents', 'processed_at', False),
+    ('document_chunks', 'created_at', True),
+    ('messages', 'timestamp', True),
+)
+
+
+def upgrade() -> None:
+    for table, column, has_default in TIMESTAMP_COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=sa.DateTime(timezone=True),
+            existing_type=sa.DateTime(),
+            postgresql_using=f'"{column}" AT TIME ZONE \'UTC\'',
+            server_default=sa.text('now()') if has_default else None
+        )
+
+
+def downgrade() -> None:
+    for table, column, has_default in TIMESTAMP_COLUMNS:
+        op.alter_column(
+            table,
+            column,
+            type_=sa.DateTime(),
+            existing_type=sa.DateTime(timezone=True),
+            postgresql_using=f'"{column}" AT TIME ZONE \'UTC\'',
+            server_default=None
+        )
@@ -0,0 +1,47 @@
+"""store messages.message_metadata as jsonb with a GIN index
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-16 00:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.alter_column(
+        'messages',
+        'message_metadata',
+        type_=postgresql.JSONB(astext_type=sa.Text()),
+        existing_type=sa.JSON(),
+        existing_nullable=True,
+        postgresql_using='message_metadata::jsonb'
+    )
+    op.create_index(
+        'ix_messages_metadata_gin',
+        'messages',
+        ['message_metadata'],
+        postgresql_using='gin',
+        postgresql_ops={'message_metadata': 'jsonb_path_ops'}
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_metadata_gin', table_name='messages')
+    op.alter_column(
+        'messages',
+        'message_metadata',
+        type_=sa.JSON(),
+        existing_type=postgresql.JSONB(astext_type=sa.Text()),
+        existing_nullable=True,
+        postgresql_using='message_metadata::json'
+    )
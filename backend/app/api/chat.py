@@ -13,6 +13,7 @@ This module provides:
 
 API Endpoints:
 - POST /api/chat/query - Send a question and get a response
+- POST /api/chat/query/stream - Same, streamed as Server-Sent Events
 - GET /api/chat/history/{project_id} - Get chat history
 - DELETE /api/chat/history/{conversation_id} - Clear conversation
 """
@@ -20,16 +21,31 @@ API Endpoints:
 # ============================================================================
 # IMPORTS
 # ============================================================================
-from typing import List, Optional
+import json
+import asyncio
+from typing import List, Optional, Iterator
 from datetime import datetime
 from uuid import uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+
+# Chat responses are returned pre-serialised (skipping FastAPI's response_model
+# pass and jsonable_encoder); orjson when installed, like the app default
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:
+    from fastapi.responses import JSONResponse as FastJSONResponse
 from sqlalchemy.orm import Session
 
 # Import our modules - Models are now imported from models.py
 from app.database import get_db, Message, Project, Document
 from app.chat_service import ChatService
+from app.embeddings_service import EmbeddingsService, get_embeddings
+from app.pinecone_service import PineconeService, get_pinecone
 from app.models import ChatRequest, ChatResponse, ConversationHistory 
 
 # ============================================================================
@@ -41,25 +57,73 @@ router = APIRouter()
 # Initialize chat service (singleton pattern)
 _chat_service = None
 
-def get_chat_service() -> ChatService:
+def get_chat_service(embeddings_service: Optional[EmbeddingsService],
+                     pinecone_service: Optional[PineconeService]) -> ChatService:
     """
     Get or create the chat service instance.
     Using singleton pattern to avoid reinitializing services.
+    
+    Args:
+        embeddings_service: The app's shared embeddings service (from get_embeddings)
+        pinecone_service: The app's shared Pinecone service (from get_pinecone)
     """
     global _chat_service
     if _chat_service is None:
         print("[Chat API] Initializing chat service...")
-        _chat_service = ChatService()
+        _chat_service = ChatService(
+            embeddings_service=embeddings_service,
+            pinecone_service=pinecone_service
+        )
+    elif pinecone_service is not None:
+        # Created before the background Pinecone connection finished
+        _chat_service.attach_pinecone(pinecone_service)
     return _chat_service
 
+def invalidate_answer_cache(project_id: str) -> None:
+    """Drop a project's cached answers after its documents change"""
+    if _chat_service is not None:
+        _chat_service.invalidate_answer_cache(project_id)
+
+def close_chat_service() -> None:
+    """Release the chat service's background workers (called from the app lifespan)"""
+    global _chat_service
+    if _chat_service is not None:
+        _chat_service.close()
+        _chat_service = None
+
+async def parse_chat_request(http_request: Request) -> ChatRequest:
+    """
+    Validate the raw chat request body with ChatRequest.model_validate_json.
+    
+    pydantic-core parses and validates the bytes in one pass, instead of
+    FastAPI decoding JSON into a dict and validating that. Errors are
+    raised as RequestValidationError, so clients still get the usual 422.
+    """
+    try:
+        return ChatRequest.model_validate_json(await http_request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, 'loc': ('body', *error['loc'])} for error in e.errors(include_url=False)]
+        )
+
+# The body is read by parse_chat_request, so document it explicitly
+CHAT_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": ChatRequest.model_json_schema()}}
+    }
+}
+
 # ============================================================================
 # API ENDPOINTS
 # ============================================================================
 
-@router.post("/query", response_model=ChatResponse)
+@router.post("/query", response_model=ChatResponse, openapi_extra=CHAT_REQUEST_BODY)
 async def chat_query(
-    request: ChatRequest,
-    db: Session = Depends(get_db)
+    request: ChatRequest = Depends(parse_chat_request),
+    db: Session = Depends(get_db),
+    embeddings_service: Optional[EmbeddingsService] = Depends(get_embeddings),
+    pinecone_service: Optional[PineconeService] = Depends(get_pinecone)
 ):
     """
     Process a chat query using RAG.
@@ -111,18 +175,17 @@ async def chat_query(
         print(f"[Chat API] Conversation ID: {conversation_id}")
         
         # Step 3: Get chat service and process query
-        chat_service = get_chat_service()
-        
-        # Override max_chunks if specified
-        if request.max_chunks:
-            chat_service.max_context_chunks = request.max_chunks
+        chat_service = get_chat_service(embeddings_service, pinecone_service)
         
-        # Process the chat query
-        result = chat_service.chat(
+        # Process the chat query (blocking OpenAI/Pinecone/DB I/O, so off the event loop)
+        result = await asyncio.to_thread(
+            chat_service.chat,
             project_id=request.project_id,
             query=request.query,
             conversation_id=conversation_id,
-            save_to_db=True
+            save_to_db=True,
+            no_cache=request.no_cache,
+            max_chunks=request.max_chunks
         )
         
         # Step 4: Save to database
@@ -159,8 +222,9 @@ async def chat_query(
                 db.rollback()
                 # Continue - the response was still generated
         
-        # Step 5: Format response
-        response = ChatResponse(
+        # Step 5: Format response (trusted internal data - model_construct
+        # skips re-validation; only the ChatRequest body is validated)
+        response = ChatResponse.model_construct(
             success=result['success'],
             response=result['response'],
             conversation_id=conversation_id,
@@ -169,7 +233,7 @@ async def chat_query(
         )
         
         print(f"[Chat API] ✅ Query processed successfully")
-        return response
+        return FastJSONResponse(content=response.model_dump(mode='json'))
         
     except HTTPException:
         raise
@@ -186,6 +250,96 @@ async def chat_query(
             detail=f"Failed to process query: {str(e)}"
         )
 
+def _sse(event: dict) -> str:
+    """Format one Server-Sent Events frame."""
+    return f"data: {json.dumps(event, default=str)}\n\n"
+
+@router.post("/query/stream", openapi_extra=CHAT_REQUEST_BODY)
+async def chat_query_stream(
+    request: ChatRequest = Depends(parse_chat_request),
+    db: Session = Depends(get_db),
+    embeddings_service: Optional[EmbeddingsService] = Depends(get_embeddings),
+    pinecone_service: Optional[PineconeService] = Depends(get_pinecone)
+):
+    """
+    Process a chat query using RAG, streaming the answer as it is generated.
+    
+    Returns a text/event-stream of `data: {json}` frames:
+    - {"type": "token", "content": "..."} for each piece of the answer
+    - {"type": "done", "conversation_id", "response", "sources", "metadata"} last
+    - {"type": "error", "error", "response"} if generation fails
+    
+    The interaction is saved to the database once the stream completes.
+    Use POST /api/chat/query for a single buffered ChatResponse.
+    """
+    print(f"\n[Chat API] Received streaming query for project: {request.project_id}")
+    
+    project = db.query(Project).filter(
+        Project.id == request.project_id
+    ).first()
+    
+    if not project:
+        print(f"[Chat API] ❌ Project not found: {request.project_id}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Project '{request.project_id}' not found"
+        )
+    
+    conversation_id = request.conversation_id or f"conv_{uuid4().hex[:12]}"
+    chat_service = get_chat_service(embeddings_service, pinecone_service)
+    
+    # Sync generator: Starlette iterates it in the threadpool, so the blocking
+    # OpenAI stream and DB writes never stall the event loop
+    def event_stream() -> Iterator[str]:
+        for event in chat_service.stream_chat(
+            project_id=request.project_id,
+            query=request.query,
+            conversation_id=conversation_id,
+            max_chunks=request.max_chunks,
+            no_cache=request.no_cache
+        ):
+            if event['type'] != 'done':
+                yield _sse(event)
+                continue
+            
+            try:
+                db.add(Message(
+                    id=f"msg_{uuid4().hex[:12]}",
+                    project_id=request.project_id,
+                    conversation_id=conversation_id,
+                    role="user",
+                    content=request.query,
+                    timestamp=datetime.utcnow()
+                ))
+                db.add(Message(
+                    id=f"msg_{uuid4().hex[:12]}",
+                    project_id=request.project_id,
+                    conversation_id=conversation_id,
+                    role="assistant",
+                    content=event['response'],
+                    timestamp=datetime.utcnow(),
+                    message_metadata=event.get('metadata', {})
+                ))
+                db.commit()
+                print(f"[Chat API] ✅ Streamed messages saved to database")
+            except Exception as e:
+                print(f"[Chat API] ⚠️  Failed to save messages: {e}")
+                db.rollback()
+            
+            yield _sse({
+                'type': 'done',
+                'conversation_id': conversation_id,
+                'response': event['response'],
+                'sources': event.get('sources', []) if request.include_sources else None,
+                'metadata': event.get('metadata', {})
+            })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/history/{project_id}", response_model=List[ConversationHistory])
 async def get_chat_history(
     project_id: str,
@@ -233,7 +387,7 @@ async def get_chat_history(
             ).order_by(Message.timestamp).all()
             
             if messages:
-                history.append(ConversationHistory(
+                history.append(ConversationHistory.model_construct(
                     conversation_id=conv_id,
                     project_id=project_id,
                     messages=[
@@ -248,7 +402,7 @@ async def get_chat_history(
                     updated_at=messages[-1].timestamp
                 ))
         
-        return history
+        return FastJSONResponse(content=[item.model_dump(mode='json') for item in history])
         
     except HTTPException:
         raise
@@ -300,13 +454,16 @@ async def clear_conversation(
         )
 
 @router.get("/test")
-async def test_chat_endpoint():
+async def test_chat_endpoint(
+    embeddings_service: Optional[EmbeddingsService] = Depends(get_embeddings),
+    pinecone_service: Optional[PineconeService] = Depends(get_pinecone)
+):
     """
     Test endpoint to verify chat API is working.
     """
     try:
         # Try to initialize chat service
-        chat_service = get_chat_service()
+        chat_service = get_chat_service(embeddings_service, pinecone_service)
         
         return {
             "status": "operational",
@@ -326,13 +483,16 @@ async def test_chat_endpoint():
 
 # Debug endpoint for testing
 @router.post("/test/simple")
-async def test_simple_chat():
+async def test_simple_chat(
+    embeddings_service: Optional[EmbeddingsService] = Depends(get_embeddings),
+    pinecone_service: Optional[PineconeService] = Depends(get_pinecone)
+):
     """
     Simple test endpoint that doesn't require a project.
     Useful for testing the chat service is working.
     """
     try:
-        chat_service = get_chat_service()
+        chat_service = get_chat_service(embeddings_service, pinecone_service)
         
         # Test with a simple query
         test_query = "What is machine learning?"
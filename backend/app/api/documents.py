@@ -14,6 +14,7 @@ Date: 2024
 import os
 import uuid
 import shutil
+import asyncio
 from typing import List, Optional
 from datetime import datetime
 from pathlib import Path
@@ -28,16 +29,19 @@ from fastapi import (
     File,
     BackgroundTasks
 )
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 
 # SQLAlchemy for database operations
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
+from sqlalchemy import and_, func
 
 # Import our modules
 from app.database import get_db, Document as DocumentModel, Project, DocumentChunk
-from app.models import DocumentResponse, DocumentStatus, SuccessResponse
+from app.models import DocumentResponse, DocumentStatus, SuccessResponse, DocumentListAdapter
 from app.config import settings
+from app.embeddings_service import EmbeddingsService, get_embeddings
+from app.pinecone_service import PineconeService, get_pinecone
+from app.api.chat import invalidate_answer_cache
 # from app.document_processor import DocumentProcessor  # We'll create this next
 
 # Create router for document endpoints
@@ -130,7 +134,9 @@ def save_upload_file(upload_file: UploadFile, destination: Path) -> int:
         raise
 
 
-async def process_document_background(document_id: str, file_path: str, db: Session):
+async def process_document_background(document_id: str, file_path: str, db: Session,
+                                      embeddings_service: Optional[EmbeddingsService] = None,
+                                      pinecone_service: Optional[PineconeService] = None):
     """
     Background task to process a document after upload.
     Complete pipeline with Pinecone integration!
@@ -139,14 +145,18 @@ async def process_document_background(document_id: str, file_path: str, db: Sess
     1. Extract text from document
     2. Create chunks
     3. Generate embeddings for each chunk
-    4. Store embeddings in Pinecone ← NEW!
-    5. Store chunks in PostgreSQL
+    4. Store chunks in PostgreSQL (the chunk text lives here)
+    5. Store embeddings in Pinecone (IDs + minimal metadata)
     6. Mark document as ready and indexed
     
     Args:
         document_id: ID of the document in database
         file_path: Path to the uploaded file
         db: Database session
+        embeddings_service: The app's shared embeddings service; a temporary
+            one is created (and closed) if None
+        pinecone_service: The app's shared Pinecone service; vectors are not
+            stored if None
     """
     print(f"\n{'='*70}")
     print(f"[Background Task] Starting processing for document: {document_id}")
@@ -192,50 +202,78 @@ async def process_document_background(document_id: str, file_path: str, db: Sess
             print(f"  - Words: {document.word_count}")
             print(f"  - Chunks: {document.chunk_count}")
             
-            # Step 4: Initialize embeddings service
-            print("\n[Background Task] Initializing embeddings service...")
-            from app.embeddings_service import EmbeddingsService
-            
+            # Step 4: Get embeddings service (the app's shared one when available)
             embeddings_generated = False
             vectors_stored = False
             
             try:
-                embeddings_service = EmbeddingsService()
+                owns_service = embeddings_service is None
+                if owns_service:
+                    print("\n[Background Task] Initializing embeddings service...")
+                    embeddings_service = EmbeddingsService()
                 
                 # Step 5: Generate embeddings for all chunks
                 print(f"[Background Task] Generating embeddings for {len(chunks)} chunks...")
                 
                 # Extract just the text from chunks
-                chunk_texts = [chunk['text'] for chunk in chunks]
+                chunk_texts = [chunk.text for chunk in chunks]
                 
-                # Generate embeddings in batches
-                embeddings = embeddings_service.generate_embeddings_batch(
-                    chunk_texts, 
-                    batch_size=20  # Process 20 chunks at a time
-                )
+                # Generate embeddings in batches (packed by token budget) as one
+                # float32 matrix plus a mask of rows that succeeded
+                try:
+                    embedding_matrix, embedded = await embeddings_service.agenerate_embedding_matrix(
+                        chunk_texts,
+                        token_counts=[chunk.token_count for chunk in chunks]
+                    )
+                finally:
+                    if owns_service:
+                        # Temporary service - release its pooled connections
+                        await embeddings_service.aclose()
+                embeddings = [row if ok else None for row, ok in zip(embedding_matrix, embedded)]
                 
                 # Check if embeddings were generated successfully
-                successful_embeddings = sum(1 for e in embeddings if e is not None)
+                successful_embeddings = int(embedded.sum())
                 print(f"[Background Task] Generated {successful_embeddings}/{len(chunks)} embeddings")
                 
+                # Step 6: Store chunks in PostgreSQL database - committed before the
+                # Pinecone upsert, since search reads chunk text from here
+                from app.database import bulk_create_chunks
+                
+                chunks_stored = 0
+                chunk_rows = []
+                for i, chunk_data in enumerate(chunks):
+                    # Store metadata about embedding
+                    has_embedding = bool(embedded[i])
+                    if has_embedding:
+                        chunks_stored += 1
+                    
+                    chunk_rows.append({
+                        'id': f"{document_id}_chunk_{chunk_data.chunk_index}",
+                        'document_id': document_id,
+                        'chunk_index': chunk_data.chunk_index,
+                        'chunk_text': chunk_data.text,
+                        'page_number': chunk_data.page_number,
+                        'char_start': chunk_data.start_char,
+                        'char_end': chunk_data.end_char,
+                        'token_count': chunk_data.token_count,
+                        'embedding_model': embeddings_service.embedding_model if has_embedding else None
+                    })
+                
+                bulk_create_chunks(db, chunk_rows)
+                db.commit()
+                print(f"[Background Task] ✅ Stored {chunks_stored} chunks in PostgreSQL")
+                
                 if successful_embeddings > 0:
                     embeddings_generated = True
-                    
-                    # Step 6: Store embeddings in Pinecone
+                
+                if successful_embeddings > 0 and pinecone_service is not None:
+                    # Step 7: Store embeddings in Pinecone
                     print("\n[Background Task] Storing embeddings in Pinecone...")
-                    from app.pinecone_service import PineconeService
                     
                     try:
-                        pinecone_service = PineconeService()
-                        
-                        # Add document metadata to chunks for Pinecone
-                        for chunk in chunks:
-                            chunk['document_id'] = document_id
-                            chunk['filename'] = document.filename
-                            chunk['project_id'] = document.project_id
-                        
-                        # Store in Pinecone
-                        pinecone_result = pinecone_service.upsert_embeddings(
+                        # Store in Pinecone (blocking client - keep it off the event loop)
+                        pinecone_result = await asyncio.to_thread(
+                            pinecone_service.upsert_embeddings,
                             document_id=document_id,
                             chunks=chunks,
                             embeddings=embeddings,
@@ -245,7 +283,7 @@ async def process_document_background(document_id: str, file_path: str, db: Sess
                         if pinecone_result['success']:
                             vectors_stored = True
                             print(f"[Background Task] ✅ Stored {pinecone_result['upserted']} vectors in Pinecone")
-                            print(f"[Background Task] Total vectors in index: {pinecone_result['total_vectors_in_index']}")
+                            print(f"[Background Task] Vectors in project namespace: {pinecone_result['vectors_in_namespace']}")
                         else:
                             print(f"[Background Task] ⚠️  Pinecone storage failed: {pinecone_result.get('error')}")
                             
@@ -253,30 +291,6 @@ async def process_document_background(document_id: str, file_path: str, db: Sess
                         print(f"[Background Task] ⚠️  Pinecone error (non-fatal): {e}")
                         # Continue even if Pinecone fails - document is still useful
                 
-                # Step 7: Store chunks in PostgreSQL database
-                from app.database import DocumentChunk
-                
-                chunks_stored = 0
-                for i, chunk_data in enumerate(chunks):
-                    chunk = DocumentChunk(
-                        id=f"{document_id}_chunk_{chunk_data['chunk_index']}",
-                        document_id=document_id,
-                        chunk_index=chunk_data['chunk_index'],
-                        chunk_text=chunk_data['text'],
-                        char_start=chunk_data.get('start_char'),
-                        char_end=chunk_data.get('start_char', 0) + chunk_data['char_count']
-                    )
-                    
-                    # Store metadata about embedding
-                    if embeddings_generated and i < len(embeddings) and embeddings[i] is not None:
-                        chunk.embedding_model = embeddings_service.embedding_model
-                        chunks_stored += 1
-                    
-                    db.add(chunk)
-                
-                db.commit()
-                print(f"[Background Task] ✅ Stored {chunks_stored} chunks in PostgreSQL")
-                
                 # Step 8: Calculate final cost
                 total_cost = (embeddings_service.total_tokens_used / 1000) * embeddings_service.cost_per_1k_tokens
                 print(f"[Background Task] Total embedding cost: ${total_cost:.6f}")
@@ -287,10 +301,13 @@ async def process_document_background(document_id: str, file_path: str, db: Sess
             
             # Step 9: Update document status
             document.status = "ready"
-            document.processed_at = datetime.utcnow()
+            document.processed_at = func.now()
             document.indexed = vectors_stored  # True if vectors stored in Pinecone
             db.commit()
             
+            # Cached answers were generated without this document
+            invalidate_answer_cache(document.project_id)
+            
             # Print final status
             status_msg = "✅ Document processed successfully!"
             if vectors_stored:
@@ -344,7 +361,9 @@ async def upload_document(
     project_id: str,
     background_tasks: BackgroundTasks,  # For async processing
     file: UploadFile = File(...),  # The uploaded file
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    embeddings_service: Optional[EmbeddingsService] = Depends(get_embeddings),
+    pinecone_service: Optional[PineconeService] = Depends(get_pinecone)
 ):
     """
     Upload a document to a project.
@@ -426,8 +445,7 @@ async def upload_document(
             file_type=file_extension,
             file_path=str(file_path),
             size=file_size,
-            status="uploading",
-            uploaded_at=datetime.utcnow()
+            status="uploading"
         )
         
         db.add(new_document)
@@ -440,16 +458,20 @@ async def upload_document(
         await process_document_background(
             document_id,
             str(file_path),
-            db
+            db,
+            embeddings_service,
+            pinecone_service
         )
         
         print(f"[Documents API] ✅ Document processing completed")
         
-        # Step 8: Return response (fetch updated document info)
+        # Step 8: Return response (fetch updated document info). Built from
+        # our own DB row, so model_construct skips re-validation (only
+        # request bodies crossing the API boundary are validated)
         updated_document = db.query(DocumentModel).filter(
             DocumentModel.id == document_id
         ).first()
-        return DocumentResponse(
+        return DocumentResponse.model_construct(
             id=updated_document.id,
             project_id=updated_document.project_id,
             filename=updated_document.filename,
@@ -509,7 +531,7 @@ async def get_document(
         
         print(f"[Documents API] ✅ Found document: {document.filename}")
         
-        return DocumentResponse(
+        return DocumentResponse.model_construct(
             id=document.id,
             project_id=document.project_id,
             filename=document.filename,
@@ -567,9 +589,10 @@ async def get_project_documents(
         
         print(f"[Documents API] ✅ Found {len(documents)} documents")
         
-        # Convert to response models
-        return [
-            DocumentResponse(
+        # Convert to response models and serialise in one pass with the
+        # prebuilt adapter
+        document_responses = [
+            DocumentResponse.model_construct(
                 id=doc.id,
                 project_id=doc.project_id,
                 filename=doc.filename,
@@ -582,6 +605,10 @@ async def get_project_documents(
             )
             for doc in documents
         ]
+        return Response(
+            content=DocumentListAdapter.dump_json(document_responses),
+            media_type="application/json"
+        )
         
     except HTTPException:
         raise
@@ -595,7 +622,8 @@ async def get_project_documents(
 @router.delete("/{document_id}", response_model=SuccessResponse)
 async def delete_document(
     document_id: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    pinecone_service: Optional[PineconeService] = Depends(get_pinecone)
 ):
     """
     Delete a document and its associated data.
@@ -603,7 +631,7 @@ async def delete_document(
     This will:
     1. Delete the file from disk
     2. Delete chunks from database
-    3. Delete vectors from Pinecone (when implemented)
+    3. Delete vectors from Pinecone
     4. Delete document record from database
     
     Args:
@@ -636,14 +664,26 @@ async def delete_document(
             except Exception as e:
                 print(f"[Documents API] ⚠️  Could not delete file: {e}")
         
-        # Step 2: Delete from Pinecone (TODO: implement when we add Pinecone)
-        # if document.indexed:
-        #     delete_from_pinecone(document_id)
+        # Step 2: Delete vectors from Pinecone
+        if document.indexed and pinecone_service is None:
+            print(f"[Documents API] ⚠️  Pinecone not available - vectors for {document_id} were not deleted")
+        elif document.indexed:
+            try:
+                await asyncio.to_thread(
+                    pinecone_service.delete_document,
+                    document_id,
+                    project_namespace=document.project_id,
+                    chunk_count=document.chunk_count
+                )
+            except Exception as e:
+                print(f"[Documents API] ⚠️  Could not delete vectors: {e}")
         
         # Step 3: Delete document (chunks will cascade delete)
         filename = document.filename
+        project_id = document.project_id
         db.delete(document)
         db.commit()
+        invalidate_answer_cache(project_id)
         
         print(f"[Documents API] ✅ Document deleted: {filename}")
         
@@ -3,13 +3,14 @@ Project management API endpoints.
 Handles creating, reading, updating, and deleting projects.
 """
 
-from typing import List
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 import uuid
-from datetime import datetime
-from app.pinecone_service import PineconeService
+import asyncio
+from app.pinecone_service import PineconeService, get_pinecone
+from app.api.chat import invalidate_answer_cache
 
 
 # Import our database models and schemas
@@ -47,8 +48,10 @@ async def get_all_projects(
                 Document.project_id == project.id
             ).count()
             
-            # Create response with file count
-            response = ProjectResponse(
+            # Create response with file count. Responses are built from our
+            # own DB rows, so model_construct skips re-validation (only
+            # request bodies crossing the API boundary are validated)
+            response = ProjectResponse.model_construct(
                 id=project.id,
                 name=project.name,
                 description=project.description,
@@ -86,13 +89,11 @@ async def create_project(
         # Generate unique ID for the project
         project_id = f"proj_{uuid.uuid4().hex[:12]}"
         
-        # Create database model instance
+        # Create database model instance (timestamps are set by the database)
         new_project = Project(
             id=project_id,
             name=project_data.name,
-            description=project_data.description,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
+            description=project_data.description
         )
         
         # Add to database
@@ -103,7 +104,7 @@ async def create_project(
         print(f"[API] Created project: {new_project.name} (ID: {project_id})")
         
         # Return response
-        return ProjectResponse(
+        return ProjectResponse.model_construct(
             id=new_project.id,
             name=new_project.name,
             description=new_project.description,
@@ -151,7 +152,7 @@ async def get_project(
             Document.project_id == project_id
         ).count()
         
-        return ProjectResponse(
+        return ProjectResponse.model_construct(
             id=project.id,
             name=project.name,
             description=project.description,
@@ -203,7 +204,7 @@ async def update_project(
         if project_update.description is not None:
             project.description = project_update.description
         
-        project.updated_at = datetime.utcnow()
+        # updated_at is refreshed by the column's onupdate=func.now()
         
         # Save changes
         db.commit()
@@ -216,7 +217,7 @@ async def update_project(
         
         print(f"[API] Updated project: {project.name}")
         
-        return ProjectResponse(
+        return ProjectResponse.model_construct(
             id=project.id,
             name=project.name,
             description=project.description,
@@ -238,7 +239,8 @@ async def update_project(
 @router.delete("/{project_id}", response_model=SuccessResponse)
 async def delete_project(
     project_id: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    pinecone_service: Optional[PineconeService] = Depends(get_pinecone)
 ):
     """
     Delete a project and all its documents.
@@ -268,11 +270,13 @@ async def delete_project(
         db.commit()
         
         print(f"[API] Deleted project from DB: {project_name}")
+        invalidate_answer_cache(project_id)
 
-        # Deleteing project namespace from Pinecone.
-        pinecone_service = PineconeService()
-
-        pinecone_service.delete_namespace(namespace=project_id)
+        # Deleteing project namespace from Pinecone (blocking client - keep it off the event loop)
+        if pinecone_service is not None:
+            await asyncio.to_thread(pinecone_service.delete_namespace, namespace=project_id)
+        else:
+            print(f"[API] ⚠️  Pinecone not available - namespace '{project_id}' was not deleted")
 
         print(f"[API] Deleted Project '{project_name}' entirely")
         
@@ -21,9 +21,12 @@ User Question → Embedding → Pinecone Search → Context Retrieval → GPT-4
 # ============================================================================
 import os
 import json
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 from datetime import datetime
 import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # OpenAI for chat completion
 try:
@@ -36,9 +39,12 @@ except ImportError:
 
 # Import our services
 from app.config import settings
-from app.embeddings_service import EmbeddingsService
+from app.embeddings_service import EmbeddingsService, SemanticCache
 from app.pinecone_service import PineconeService
-from app.database import get_db, Message, Project, Document, DocumentChunk
+from app.database import get_db, get_chunk_texts, SessionLocal, Message, Project, Document, DocumentChunk
+
+# Projects with a semantic answer cache; the least recently used is dropped
+ANSWER_CACHE_PROJECTS = 64
 
 # ============================================================================
 # CHAT SERVICE CLASS
@@ -55,9 +61,15 @@ class ChatService:
     4. Maintains conversation history
     """
     
-    def __init__(self):
+    def __init__(self, embeddings_service: Optional[EmbeddingsService] = None,
+                 pinecone_service: Optional[PineconeService] = None):
         """
         Initialize the chat service with necessary components.
+        
+        Args:
+            embeddings_service: Shared service to reuse (created here if None)
+            pinecone_service: Shared service to reuse (None answers without
+                document context until attach_pinecone() is called)
         """
         print("\n[ChatService] Initializing...")
         
@@ -80,18 +92,17 @@ class ChatService:
         
         # Initialize other services
         try:
-            self.embeddings_service = EmbeddingsService()
+            self.embeddings_service = embeddings_service or EmbeddingsService()
             print("[ChatService] ✅ Embeddings service initialized")
         except Exception as e:
             print(f"[ChatService] ⚠️  Embeddings service failed: {e}")
             self.embeddings_service = None
         
-        try:
-            self.pinecone_service = PineconeService()
+        self.pinecone_service = pinecone_service
+        if pinecone_service is not None:
             print("[ChatService] ✅ Pinecone service initialized")
-        except Exception as e:
-            print(f"[ChatService] ⚠️  Pinecone service failed: {e}")
-            self.pinecone_service = None
+        else:
+            print("[ChatService] ⚠️  Pinecone service not available - answering without document context")
         
         # Configuration
         self.chat_model = settings.openai_model  # Default: gpt-4-turbo-preview
@@ -99,17 +110,57 @@ class ChatService:
         self.temperature = 0.2  # Creativity level (0-1)
         self.max_tokens = 2000  # Maximum response length
         
+        # Semantic answer cache, one per project (answers depend on its
+        # documents, so a project's cache is dropped when they change)
+        self.semantic_cache_enabled = self.embeddings_service is not None
+        self._answer_caches: "OrderedDict[str, SemanticCache]" = OrderedDict()
+        self._answer_caches_lock = threading.Lock()  # chat() runs in worker threads
+        
+        # Background I/O (conversation history) that overlaps with retrieval
+        self._io_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="chat-io")
+        
         print(f"[ChatService] Configuration:")
         print(f"  - Chat model: {self.chat_model}")
         print(f"  - Max context chunks: {self.max_context_chunks}")
         print(f"  - Temperature: {self.temperature}")
+        print(f"  - Semantic cache: {'threshold ' + str(settings.semantic_cache_threshold) if self.semantic_cache_enabled else 'disabled'}")
         print("[ChatService] ✅ Initialization complete\n")
     
+    def _answer_cache(self, project_id: str, dimension: int) -> SemanticCache:
+        """Get (or create) a project's answer cache, keeping at most ANSWER_CACHE_PROJECTS"""
+        with self._answer_caches_lock:
+            if project_id in self._answer_caches:
+                self._answer_caches.move_to_end(project_id)
+                return self._answer_caches[project_id]
+            
+            cache = SemanticCache(dimension, threshold=settings.semantic_cache_threshold)
+            self._answer_caches[project_id] = cache
+            if len(self._answer_caches) > ANSWER_CACHE_PROJECTS:
+                self._answer_caches.popitem(last=False)
+            return cache
+    
+    def invalidate_answer_cache(self, project_id: str) -> None:
+        """Forget a project's cached answers (call when its documents change)"""
+        with self._answer_caches_lock:
+            if self._answer_caches.pop(project_id, None) is not None:
+                print(f"[ChatService] Cleared answer cache for project: {project_id}")
+    
+    def attach_pinecone(self, pinecone_service: PineconeService) -> None:
+        """Start retrieving context once the shared Pinecone service is ready"""
+        if self.pinecone_service is None:
+            self.pinecone_service = pinecone_service
+            print("[ChatService] ✅ Pinecone service attached")
+    
+    def close(self) -> None:
+        """Stop the background I/O pool (called on application shutdown)"""
+        self._io_pool.shutdown(wait=False)
+    
     def search_relevant_context(
         self, 
         query: str, 
         project_id: Optional[str] = None,
-        top_k: int = 5
+        top_k: int = 5,
+        query_embedding: Optional[List[float]] = None
     ) -> List[Dict[str, Any]]:
         """
         Search for relevant document chunks based on the query.
@@ -118,6 +169,7 @@ class ChatService:
             query: The user's question
             project_id: Optional project ID to filter results
             top_k: Number of chunks to retrieve
+            query_embedding: Embedding of the query, if already computed
             
         Returns:
             List of relevant chunks with metadata
@@ -132,9 +184,10 @@ class ChatService:
             return []
         
         try:
-            # Step 1: Generate embedding for the query
-            print("\n[ChatService] Generating query embedding...")
-            query_embedding = self.embeddings_service.generate_embedding(query)
+            # Step 1: Generate embedding for the query (unless the caller has it)
+            if query_embedding is None:
+                print("\n[ChatService] Generating query embedding...")
+                query_embedding = self.embeddings_service.get_query_embedding(query)
             
             if not query_embedding:
                 print("[ChatService] ❌ Failed to generate query embedding")
@@ -143,20 +196,18 @@ class ChatService:
             # Step 2: Search Pinecone for similar chunks
             print(f"[ChatService] Searching Pinecone for top {top_k} chunks...")
             
-            # # Build filter if project_id is provided
-            # filter_dict = None
-            # if project_id:
-            #     filter_dict = {'project_id': project_id}
-            
-            # Perform search
+            # Perform search (scoped by the project's namespace)
             search_results = self.pinecone_service.search(
                 query_embedding=query_embedding,
                 top_k=top_k,
-                # filter=filter_dict,
                 include_metadata=True,
                 project_namespace=project_id 
             )
             
+            # Step 3: Fill in chunk text from PostgreSQL (Pinecone only keeps
+            # document_id / chunk_index) - one query for all top-k matches
+            self._attach_chunk_texts(search_results)
+            
             print(f"[ChatService] ✅ Found {len(search_results)} relevant chunks")
             
             # Debug: Show relevance scores
@@ -290,6 +341,53 @@ class ChatService:
                     'response': 'I apologize, but I encountered an error generating a response. Please try again.'
                 }
     
+    def _attach_chunk_texts(self, results: List[Dict[str, Any]]) -> None:
+        """
+        Set 'text' on search results that don't carry it in their metadata.
+        
+        Args:
+            results: Pinecone search results (modified in place)
+        """
+        missing = [
+            r for r in results
+            if not r.get('text') and r.get('document_id') and r.get('chunk_index') is not None
+        ]
+        if not missing:
+            return
+        
+        db = SessionLocal()
+        try:
+            # Pinecone returns numeric metadata as floats
+            texts = get_chunk_texts(db, ((r['document_id'], int(r['chunk_index'])) for r in missing))
+        except Exception as e:
+            print(f"[ChatService] ⚠️  Failed to load chunk text: {e}")
+            texts = {}
+        finally:
+            db.close()
+        
+        for r in missing:
+            r['chunk_index'] = int(r['chunk_index'])
+            r['text'] = texts.get((r['document_id'], r['chunk_index']), '')
+    
+    def _load_conversation_history(self, conversation_id: str, limit: int = 10) -> List[Dict[str, str]]:
+        """
+        Load the most recent messages of a conversation, oldest first.
+        
+        Runs on the I/O pool alongside the embedding/Pinecone search, so it
+        opens its own session rather than sharing the request's.
+        """
+        db = SessionLocal()
+        try:
+            rows = db.query(Message.role, Message.content).filter(
+                Message.conversation_id == conversation_id
+            ).order_by(Message.timestamp.desc()).limit(limit).all()
+            return [{"role": role, "content": content} for role, content in reversed(rows)]
+        except Exception as e:
+            print(f"[ChatService] ⚠️  Failed to load conversation history: {e}")
+            return []
+        finally:
+            db.close()
+    
     def _build_context(self, chunks: List[Dict[str, Any]]) -> str:
         """
         Build a formatted context string from chunks.
@@ -421,7 +519,9 @@ class ChatService:
         project_id: str,
         query: str,
         conversation_id: Optional[str] = None,
-        save_to_db: bool = True
+        save_to_db: bool = True,
+        no_cache: bool = False,
+        max_chunks: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Main chat method that combines all RAG components.
@@ -433,6 +533,8 @@ class ChatService:
             query: The user's question
             conversation_id: Optional conversation ID for context
             save_to_db: Whether to save the interaction to database
+            no_cache: Always generate a fresh answer (skip the semantic cache)
+            max_chunks: Chunks to retrieve for this request (default max_context_chunks)
             
         Returns:
             Complete response with answer, sources, and metadata
@@ -444,12 +546,43 @@ class ChatService:
         print(f"{'='*60}")
         
         try:
+            # Start the history fetch now; it is independent of retrieval and
+            # overlaps with the query embedding and Pinecone round trips
+            history_future = None
+            if conversation_id and save_to_db:
+                history_future = self._io_pool.submit(self._load_conversation_history, conversation_id)
+            
+            # Step 0: Reuse the answer to an earlier, near-identical question
+            query_embedding = None
+            answer_cache = None
+            if self.semantic_cache_enabled and not no_cache:
+                query_embedding = self.embeddings_service.get_query_embedding(query)
+                # Follow-up questions depend on their conversation, so only
+                # standalone questions are answered from (and added to) the cache
+                if query_embedding and not (history_future is not None and history_future.result()):
+                    answer_cache = self._answer_cache(project_id, len(query_embedding))
+                    cached = answer_cache.lookup(query_embedding)
+                    if cached:
+                        cached_response, similarity = cached
+                        print(f"[ChatService] ✅ Semantic cache hit (similarity {similarity:.4f})")
+                        return {
+                            **cached_response,
+                            'metadata': {
+                                **cached_response['metadata'],
+                                'conversation_id': conversation_id,
+                                'timestamp': datetime.utcnow().isoformat(),
+                                'semantic_cache_hit': True,
+                                'cache_similarity': similarity
+                            }
+                        }
+            
             # Step 1: Search for relevant context
             print("\n[Step 1] Searching for relevant context...")
             context_chunks = self.search_relevant_context(
                 query=query,
                 project_id=project_id,
-                top_k=self.max_context_chunks
+                top_k=max_chunks or self.max_context_chunks,
+                query_embedding=query_embedding
             )
             
             if not context_chunks:
@@ -458,10 +591,9 @@ class ChatService:
             
             # Step 2: Get conversation history if conversation_id provided
             conversation_history = None
-            if conversation_id and save_to_db:
-                # TODO: Implement conversation history retrieval
-                print(f"[Step 2] Loading conversation history: {conversation_id}")
-                conversation_history = []
+            if history_future is not None:
+                conversation_history = history_future.result()
+                print(f"[Step 2] Loaded {len(conversation_history)} history messages: {conversation_id}")
             
             # Step 3: Generate response
             print("\n[Step 3] Generating response with GPT-4...")
@@ -494,6 +626,9 @@ class ChatService:
                 }
             }
             
+            if answer_cache is not None and final_response['success']:
+                answer_cache.add(query_embedding, final_response)
+            
             print(f"\n{'='*60}")
             print("[ChatService] ✅ Chat request completed successfully")
             print(f"{'='*60}\n")
@@ -513,6 +648,143 @@ class ChatService:
                 }
             }
 
+    def stream_chat(
+        self,
+        project_id: str,
+        query: str,
+        conversation_id: Optional[str] = None,
+        max_chunks: Optional[int] = None,
+        no_cache: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming variant of chat().
+        
+        Yields {'type': 'token', 'content': ...} events as GPT-4 produces
+        them, then a single {'type': 'done', ...} event carrying the full
+        response, sources and metadata (the same fields chat() returns).
+        On failure a {'type': 'error', ...} event is yielded instead of 'done'.
+        
+        Args:
+            project_id: The project to search documents in
+            query: The user's question
+            conversation_id: Optional conversation ID for context
+            max_chunks: Chunks to retrieve for this request (default max_context_chunks)
+            no_cache: Always generate a fresh answer (skip the semantic cache)
+        """
+        print(f"\n[ChatService] Streaming chat request for project: {project_id}")
+        
+        if not self.client:
+            print("[ChatService] ❌ OpenAI client not available")
+            yield {
+                'type': 'error',
+                'error': 'OpenAI client not initialized',
+                'response': 'I apologize, but I cannot generate a response at this time. Please check the API configuration.'
+            }
+            return
+        
+        try:
+            history_future = None
+            if conversation_id:
+                history_future = self._io_pool.submit(self._load_conversation_history, conversation_id)
+            
+            # Step 0: Semantic cache - replay a cached answer as one token event
+            query_embedding = None
+            answer_cache = None
+            if self.semantic_cache_enabled and not no_cache:
+                query_embedding = self.embeddings_service.get_query_embedding(query)
+                if query_embedding and not (history_future is not None and history_future.result()):
+                    answer_cache = self._answer_cache(project_id, len(query_embedding))
+                    cached = answer_cache.lookup(query_embedding)
+                    if cached:
+                        cached_response, similarity = cached
+                        print(f"[ChatService] ✅ Semantic cache hit (similarity {similarity:.4f})")
+                        yield {'type': 'token', 'content': cached_response['response']}
+                        yield {
+                            'type': 'done',
+                            **cached_response,
+                            'metadata': {
+                                **cached_response['metadata'],
+                                'conversation_id': conversation_id,
+                                'timestamp': datetime.utcnow().isoformat(),
+                                'semantic_cache_hit': True,
+                                'cache_similarity': similarity
+                            }
+                        }
+                        return
+            
+            # Step 1: Search for relevant context
+            context_chunks = self.search_relevant_context(
+                query=query,
+                project_id=project_id,
+                top_k=max_chunks or self.max_context_chunks,
+                query_embedding=query_embedding
+            )
+            
+            # Step 2: Build the prompt exactly as generate_response() does
+            messages = self._build_prompt(
+                query=query,
+                context=self._build_context(context_chunks),
+                context_chunks=context_chunks,
+                conversation_history=history_future.result() if history_future else None
+            )
+            
+            # Step 3: Stream the completion
+            print("[ChatService] Streaming from GPT-4...")
+            start_time = time.time()
+            stream = self.client.chat.completions.create(
+                model=self.chat_model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=self.max_tokens,
+                top_p=1,
+                frequency_penalty=0,
+                presence_penalty=0,
+                stream=True
+            )
+            
+            parts = []
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield {'type': 'token', 'content': delta}
+            
+            response_time = time.time() - start_time
+            print(f"[ChatService] ✅ Stream finished in {response_time:.2f} seconds")
+            
+            # Step 4: Final event with sources and metadata
+            final_response = {
+                'success': True,
+                'response': ''.join(parts),
+                'sources': self._extract_sources(context_chunks),
+                'metadata': {
+                    'project_id': project_id,
+                    'conversation_id': conversation_id,
+                    'timestamp': datetime.utcnow().isoformat(),
+                    'context_used': len(context_chunks) > 0,
+                    'chunks_retrieved': len(context_chunks),
+                    'model': self.chat_model,
+                    'temperature': self.temperature,
+                    'context_chunks_used': len(context_chunks),
+                    'response_time': response_time
+                }
+            }
+            
+            if answer_cache is not None:
+                answer_cache.add(query_embedding, final_response)
+            
+            yield {'type': 'done', **final_response}
+            
+        except Exception as e:
+            print(f"\n[ChatService] ❌ Streaming chat error: {e}")
+            yield {
+                'type': 'error',
+                'error': str(e),
+                'response': 'I apologize, but I encountered an error processing your request. Please try again.'
+            }
+
 # ============================================================================
 # UTILITY FUNCTIONS FOR TESTING
 # ============================================================================
@@ -528,7 +800,7 @@ def test_chat_service():
     # Initialize service
     try:
         print("\n[Test] Initializing chat service...")
-        chat_service = ChatService()
+        chat_service = ChatService(pinecone_service=PineconeService())
         print("[Test] ✅ Service initialized successfully")
     except Exception as e:
         print(f"[Test] ❌ Failed to initialize service: {e}")
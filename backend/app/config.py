@@ -26,14 +26,22 @@ class Settings(BaseSettings):
     # OpenAI Configuration
     openai_api_key: str = Field(default="", env="OPENAI_API_KEY")
     openai_model: str = Field(default="gpt-4-turbo-preview", env="OPENAI_MODEL")
+    openai_tpm: int = Field(default=1_000_000, env="OPENAI_TPM")  # Embedding tokens-per-minute quota
+    openai_rpm: int = Field(default=3000, env="OPENAI_RPM")  # Embedding requests-per-minute quota
+    verify_openai_key: bool = Field(default=True, env="VERIFY_OPENAI_KEY")  # Test request at startup (off in production)
 
     # Embedding Configuration
     embedding_model: str = Field(default="text-embedding-3-small", env="EMBEDDING_MODEL")
     embedding_dimension: int = Field(default=1536, env="EMBEDDING_DIMENSION")
+    embedding_cache_path: str = Field(default="embed_cache.db", env="EMBEDDING_CACHE_PATH")  # Empty disables the disk cache
+    semantic_cache_threshold: float = Field(default=0.97, env="SEMANTIC_CACHE_THRESHOLD")  # Cosine similarity to reuse an answer
 
     # Document Processing Configuration
     chunk_size: int = Field(default=1000, env="CHUNK_SIZE")
     chunk_overlap: int = Field(default=200, env="CHUNK_OVERLAP")
+    chunk_tokens: int = Field(default=256, env="CHUNK_TOKENS")  # Used by the tiktoken splitter
+    chunk_token_overlap: int = Field(default=50, env="CHUNK_TOKEN_OVERLAP")
+    pdf_backend: str = Field(default="auto", env="PDF_BACKEND")  # auto, pdfium or pypdf
 
     # Pinecone Configuration
     pinecone_api_key: str = Field(default="", env="PINECONE_API_KEY")
@@ -86,10 +94,10 @@ class Settings(BaseSettings):
             return extensions
         return ["pdf", "docx", "doc", "xlsx", "xls", "txt"]  # Default list
     
-    @validator('debug_mode', pre=True)
+    @validator('debug_mode', 'verify_openai_key', pre=True)
     def parse_debug_mode(cls, v):
         """
-        Parse debug_mode from string to boolean.
+        Parse debug_mode (and other flags) from string to boolean.
         Handles various string representations of boolean.
         """
         if isinstance(v, bool):
@@ -108,7 +116,8 @@ class Settings(BaseSettings):
         except (ValueError, TypeError):
             return 10  # Default value
     
-    @validator('chunk_size', 'chunk_overlap', 'embedding_dimension', pre=True)
+    @validator('chunk_size', 'chunk_overlap', 'chunk_tokens', 'chunk_token_overlap', 'embedding_dimension',
+               'openai_tpm', 'openai_rpm', pre=True)
     def parse_integers(cls, v):
         """
         Parse integer fields from environment variables.
@@ -171,11 +180,17 @@ try:
         print(f"Frontend URL: {settings.frontend_url}")
         print(f"OpenAI Model: {settings.openai_model}")
         print(f"OpenAI API Key Set: {bool(settings.openai_api_key)}")
+        print(f"OpenAI Rate Limits: {settings.openai_tpm} TPM / {settings.openai_rpm} RPM")
+        print(f"Verify OpenAI Key at Startup: {settings.verify_openai_key}")
         print(f"Pinecone API Key Set: {bool(settings.pinecone_api_key)}")
         print(f"Embedding Model: {settings.embedding_model}")
+        print(f"Embedding Cache: {settings.embedding_cache_path or 'memory only'}")
+        print(f"Semantic Cache Threshold: {settings.semantic_cache_threshold}")
         print(f"Pinecone Index: {settings.pinecone_index_name}")
         print(f"Chunk Size: {settings.chunk_size}")
         print(f"Chunk Overlap: {settings.chunk_overlap}")
+        print(f"Chunk Tokens: {settings.chunk_tokens} (overlap {settings.chunk_token_overlap})")
+        print(f"PDF Backend: {settings.pdf_backend}")
         print(f"Max File Size: {settings.max_file_size_mb} MB")
         print(f"Allowed Extensions: {settings.allowed_extensions}")
         print("="*50 + "\n")
@@ -204,6 +219,9 @@ except Exception as e:
         """Fallback settings if .env parsing fails"""
         openai_api_key = ""
         openai_model = "gpt-4-turbo-preview"
+        openai_tpm = 1_000_000
+        openai_rpm = 3000
+        verify_openai_key = True
         pinecone_api_key = ""
         pinecone_environment = ""
         pinecone_index_name = "internal-rag-index"
@@ -217,8 +235,13 @@ except Exception as e:
         allowed_extensions_str = "pdf,docx,doc,xlsx,xls,txt"
         chunk_size = 1000
         chunk_overlap = 200
+        chunk_tokens = 256
+        chunk_token_overlap = 50
+        pdf_backend = "auto"
         embedding_model = "text-embedding-3-small"
         embedding_dimension = 1536
+        embedding_cache_path = "embed_cache.db"
+        semantic_cache_threshold = 0.97
         
         def validate_config(self):
             return True
@@ -5,9 +5,11 @@ Updated for SQLAlchemy 2.0 compatibility.
 """
 
 import os
-from datetime import datetime
-from typing import Generator
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text, Float, ForeignKey, Boolean, text, JSON
+import io
+import csv
+from typing import Generator, List, Dict, Any, Iterable, Tuple
+from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text, Float, ForeignKey, Boolean, Index, text, func, insert, tuple_
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session, relationship
 from sqlalchemy.pool import StaticPool
@@ -29,7 +31,9 @@ try:
         # PostgreSQL-specific connection pool settings
         pool_size=10,  # Number of connections to maintain in pool
         max_overflow=20,  # Maximum overflow connections
-        pool_pre_ping=True,  # Verify connections before using
+        pool_use_lifo=True,  # Reuse the most recently returned (warm) connection
+        pool_pre_ping=False,  # No SELECT 1 per checkout - liveness checked at startup
+        pool_recycle=600,  # Replace connections older than 10 minutes instead
         echo=settings.debug_mode,  # Log SQL queries in debug mode
         connect_args={
             # PostgreSQL-specific connection arguments
@@ -60,15 +64,15 @@ class Project(Base):
     __tablename__ = "projects"
     
     # Primary key
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True)
     
     # Project details
     name = Column(String(100), nullable=False, index=True)
     description = Column(Text, nullable=True)
     
-    # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    # Timestamps (stamped by the database, stored as TIMESTAMPTZ)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     
     # Relationships (cascade delete means deleting project deletes all related items)
     documents = relationship("Document", back_populates="project", cascade="all, delete-orphan")
@@ -83,9 +87,17 @@ class Document(Base):
     Stores metadata about documents that are processed and indexed.
     """
     __tablename__ = "documents"
+    __table_args__ = (
+        # Partial index covering only documents still in the processing queue
+        Index(
+            "ix_documents_pending",
+            "status",
+            postgresql_where=text("status IN ('uploading', 'processing')")
+        ),
+    )
     
     # Primary key
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True)
     
     # Foreign key to project
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -97,7 +109,7 @@ class Document(Base):
     size = Column(Integer, nullable=False)  # File size in bytes
     
     # Processing status
-    status = Column(String(20), default="uploading", nullable=False, index=True)
+    status = Column(String(20), default="uploading", nullable=False)
     # Status values: uploading, processing, ready, error
     error_message = Column(Text, nullable=True)
     
@@ -110,8 +122,8 @@ class Document(Base):
     indexed = Column(Boolean, default=False)  # Whether indexed in Pinecone
     
     # Timestamps
-    uploaded_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    processed_at = Column(DateTime, nullable=True)
+    uploaded_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    processed_at = Column(DateTime(timezone=True), nullable=True)
     
     # Relationships
     project = relationship("Project", back_populates="documents")
@@ -128,7 +140,7 @@ class DocumentChunk(Base):
     __tablename__ = "document_chunks"
     
     # Primary key
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True)
     
     # Foreign key to document
     document_id = Column(String, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -141,13 +153,14 @@ class DocumentChunk(Base):
     page_number = Column(Integer, nullable=True)  # Page number if applicable
     char_start = Column(Integer, nullable=True)  # Starting character position
     char_end = Column(Integer, nullable=True)  # Ending character position
+    token_count = Column(Integer, nullable=True)  # Tokens in chunk_text (set by tiktoken splitter)
     
     # Vector store metadata
     vector_id = Column(String, nullable=True, index=True)  # ID in Pinecone
     embedding_model = Column(String, nullable=True)  # Model used for embedding
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationship
     document = relationship("Document", back_populates="chunks")
@@ -161,9 +174,18 @@ class Message(Base):
     UPDATED: Added conversation_id for grouping messages into conversations
     """
     __tablename__ = "messages"
+    __table_args__ = (
+        # GIN index for filtering on metadata keys (e.g. model, tokens_used)
+        Index(
+            "ix_messages_metadata_gin",
+            "message_metadata",
+            postgresql_using="gin",
+            postgresql_ops={"message_metadata": "jsonb_path_ops"}
+        ),
+    )
     
     # Primary key
-    id = Column(String, primary_key=True, index=True)
+    id = Column(String, primary_key=True)
     
     # Foreign keys
     project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), nullable=False)
@@ -176,8 +198,8 @@ class Message(Base):
     content = Column(Text, nullable=False)
     
     # Metadata
-    timestamp = Column(DateTime, default=datetime.utcnow, nullable=False)
-    message_metadata = Column(JSON, nullable=True)  # Store additional data like tokens, model, etc.
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    message_metadata = Column(JSONB, nullable=True)  # Store additional data like tokens, model, etc.
     
     # Relationships
     project = relationship("Project", back_populates="messages")
@@ -191,13 +213,19 @@ print("[Database] Message model updated with conversation_id field")
 # Database initialization and utilities
 def init_db():
     """
-    Initialize the database by creating all tables.
-    Run this once when setting up the application.
+    Initialize the database connection at startup.
+    
+    The schema is owned by Alembic (run `alembic upgrade head` before
+    deploying). create_all is only used in debug mode as a convenience
+    for local databases that haven't been migrated yet.
     """
     try:
-        print("[Database] Creating database tables...")
-        Base.metadata.create_all(bind=engine)
-        print("[Database] ✅ All tables created successfully!")
+        if settings.debug_mode:
+            print("[Database] Debug mode: creating any missing tables...")
+            Base.metadata.create_all(bind=engine)
+            print("[Database] ✅ All tables created successfully!")
+        else:
+            print("[Database] Skipping create_all - schema managed by Alembic")
         
         # Test connection with correct SQLAlchemy 2.0 syntax
         with engine.connect() as conn:
@@ -211,8 +239,83 @@ def init_db():
         print("1. Check PostgreSQL is running: Get-Service -Name 'postgresql*'")
         print("2. Check database exists: psql -U postgres -c '\\l'")
         print("3. Check user permissions: psql -U rag_user -d rag_database")
+        print("4. Apply migrations: alembic upgrade head")
         raise
 
+# Chunk batches at or above this size are loaded with COPY instead of INSERT
+CHUNK_COPY_THRESHOLD = 5000
+
+# Column order used for COPY (created_at is filled by its server default)
+CHUNK_COPY_COLUMNS = (
+    "id", "document_id", "chunk_index", "chunk_text", "page_number",
+    "char_start", "char_end", "token_count", "embedding_model"
+)
+
+def bulk_create_chunks(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """
+    Insert many document chunks in one go.
+    
+    Small batches use a single multi-row INSERT; very large batches are
+    streamed with PostgreSQL COPY, which skips per-row statement parsing.
+    Both run on the session's connection, so the caller's db.commit()
+    still controls the transaction.
+    
+    Args:
+        db: Database session
+        rows: Chunk column values keyed by CHUNK_COPY_COLUMNS names
+        
+    Returns:
+        Number of rows written
+    """
+    if not rows:
+        return 0
+    
+    if len(rows) < CHUNK_COPY_THRESHOLD:
+        db.execute(insert(DocumentChunk), rows)
+        return len(rows)
+    
+    # Serialize rows as CSV (None -> empty unquoted field -> NULL)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row.get(column) for column in CHUNK_COPY_COLUMNS])
+    buffer.seek(0)
+    
+    # Use the raw psycopg2 cursor behind the session's connection
+    raw_connection = db.connection().connection
+    with raw_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {DocumentChunk.__tablename__} ({', '.join(CHUNK_COPY_COLUMNS)}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    
+    if settings.debug_mode:
+        print(f"[Database] COPY loaded {len(rows)} chunks")
+    return len(rows)
+
+def get_chunk_texts(db: Session, keys: Iterable[Tuple[str, int]]) -> Dict[Tuple[str, int], str]:
+    """
+    Fetch chunk text for search results in a single query.
+    
+    Args:
+        db: Database session
+        keys: (document_id, chunk_index) pairs, e.g. from Pinecone matches
+        
+    Returns:
+        Chunk text keyed by (document_id, chunk_index); missing chunks are absent
+    """
+    keys = list(set(keys))
+    if not keys:
+        return {}
+    
+    rows = db.query(
+        DocumentChunk.document_id, DocumentChunk.chunk_index, DocumentChunk.chunk_text
+    ).filter(
+        tuple_(DocumentChunk.document_id, DocumentChunk.chunk_index).in_(keys)
+    ).all()
+    return {(document_id, chunk_index): chunk_text for document_id, chunk_index, chunk_text in rows}
+
 def get_db() -> Generator[Session, None, None]:
     """
     Dependency function to get database session.
@@ -245,29 +348,20 @@ def test_connection():
         
         # Test raw connection with SQLAlchemy 2.0 syntax
         with engine.connect() as conn:
-            # Get PostgreSQL version
-            result = conn.execute(text("SELECT version()"))
-            version = result.fetchone()[0]
-            print(f"✅ PostgreSQL Version: {version[:50]}...")
+            # Fetch version, database, user and table list in one round-trip
+            result = conn.execute(text("""
+                SELECT version(),
+                       current_database(),
+                       current_user,
+                       (SELECT json_agg(table_name ORDER BY table_name)
+                        FROM information_schema.tables
+                        WHERE table_schema = 'public')
+            """))
+            version, db_name, user, tables = result.fetchone()
             
-            # Get current database
-            result = conn.execute(text("SELECT current_database()"))
-            db_name = result.fetchone()[0]
+            print(f"✅ PostgreSQL Version: {version[:50]}...")
             print(f"✅ Current Database: {db_name}")
-            
-            # Get current user
-            result = conn.execute(text("SELECT current_user"))
-            user = result.fetchone()[0]
             print(f"✅ Current User: {user}")
-            
-            # List all tables
-            result = conn.execute(text("""
-                SELECT table_name 
-                FROM information_schema.tables 
-                WHERE table_schema = 'public'
-                ORDER BY table_name
-            """))
-            tables = [row[0] for row in result]
             print(f"✅ Tables in database: {tables if tables else 'No tables yet'}")
             
         print("="*50)
@@ -18,49 +18,267 @@ This module handles:
 
 import os
 import re
-from typing import List, Dict, Any, Optional, Tuple
+import json
+import mmap
+import hashlib
+import tempfile
+import bisect
+import logging
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 from pathlib import Path
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 # For PDF processing
 try:
     from pypdf import PdfReader
     PDF_AVAILABLE = True
-    print("[DocumentProcessor] ✅ PDF support available (pypdf)")
+    logger.debug("PDF support available (pypdf)")
 except ImportError:
     PDF_AVAILABLE = False
-    print("[DocumentProcessor] ❌ PDF support not available - install pypdf")
+    logger.warning("PDF support not available - install pypdf")
+
+# Peak-memory reporting for large PDFs (Unix only)
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Faster PDF text extraction (PDFium, C++)
+try:
+    import pypdfium2 as pdfium
+    PDFIUM_AVAILABLE = True
+    logger.debug("PDFium text extraction available (pypdfium2)")
+except ImportError:
+    PDFIUM_AVAILABLE = False
+    logger.info("pypdfium2 not available - PDFs will be read with pypdf")
 
 # For Word document processing
 try:
     from docx import Document as DocxDocument
+    from docx.oxml.ns import qn
+    from docx.text.paragraph import Paragraph as DocxParagraph
     DOCX_AVAILABLE = True
-    print("[DocumentProcessor] ✅ Word support available (python-docx)")
+    logger.debug("Word support available (python-docx)")
 except ImportError:
     DOCX_AVAILABLE = False
-    print("[DocumentProcessor] ❌ Word support not available - install python-docx")
+    logger.warning("Word support not available - install python-docx")
 
 # For Excel processing
 try:
     import openpyxl
     EXCEL_AVAILABLE = True
-    print("[DocumentProcessor] ✅ Excel support available (openpyxl)")
+    logger.debug("Excel support available (openpyxl)")
 except ImportError:
     EXCEL_AVAILABLE = False
-    print("[DocumentProcessor] ❌ Excel support not available - install openpyxl")
+    logger.warning("Excel support not available - install openpyxl")
 
 # For text splitting (important for creating chunks)
 try:
     from langchain.text_splitter import RecursiveCharacterTextSplitter
     LANGCHAIN_AVAILABLE = True
-    print("[DocumentProcessor] ✅ LangChain text splitter available")
+    logger.debug("LangChain text splitter available")
 except ImportError:
     LANGCHAIN_AVAILABLE = False
-    print("[DocumentProcessor] ⚠️  LangChain not available - using basic splitter")
+    logger.info("LangChain not available - using basic splitter")
+
+# Optional JIT compilation for the basic chunker's offset loop
+try:
+    import numpy as np
+    from numba import njit
+    NUMBA_AVAILABLE = True
+    logger.debug("Numba available - basic chunker will be compiled")
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 # Import our configuration
 from app.config import settings
 
+# For token-aware chunking (Rust-backed BPE encoder)
+try:
+    import tiktoken
+    try:
+        TOKEN_ENCODER = tiktoken.encoding_for_model(settings.embedding_model)
+    except KeyError:
+        # Unknown model name - all current OpenAI embedding models use cl100k_base
+        TOKEN_ENCODER = tiktoken.get_encoding("cl100k_base")
+    TIKTOKEN_AVAILABLE = True
+    logger.debug("tiktoken splitter available (%s)", TOKEN_ENCODER.name)
+except Exception as e:
+    TOKEN_ENCODER = None
+    TIKTOKEN_AVAILABLE = False
+    logger.info("tiktoken not available (%s) - using character splitter", e)
+
+# ============================================================================
+# TEXT HELPERS
+# ============================================================================
+
+# Matches a single whitespace-delimited word
+_WORD_PATTERN = re.compile(r"\S+")
+
+# Matches a run of whitespace (collapsed to one space when cleaning text)
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Places a chunk may end: after sentence punctuation + space, or a line break
+_SENTENCE_BOUNDARY_PATTERN = re.compile(r"[.!?] |\n\n|\n")
+
+# Log peak memory every this many PDF pages
+PDF_MEMORY_LOG_INTERVAL = 50
+
+# On-disk cache of chunking results (used when enable_chunk_cache is set)
+CHUNK_CACHE_DIR = Path.home() / ".cache" / "rag" / "chunks"
+
+# Text files above this size are read and counted block by block
+TEXT_STREAM_THRESHOLD = 16 * 1024 * 1024  # 16 MiB
+TEXT_READ_BLOCK_SIZE = 1 << 20  # 1 Mi characters per read
+
+def _cell_str(value: Any) -> str:
+    """Format an Excel cell value for text output (empty cells become empty strings)"""
+    return "" if value is None else str(value)
+
+@functools.lru_cache(maxsize=8)
+def _get_splitter(chunk_size: int, chunk_overlap: int) -> "RecursiveCharacterTextSplitter":
+    """
+    Build (once per size/overlap pair) the LangChain splitter, so processors
+    created per file or per worker process share the same instance.
+    """
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,  # Use character count
+        separators=["\n\n", "\n", ".", "!", "?", ";", ",", " ", ""],
+        is_separator_regex=False
+    )
+
+def _basic_chunk_offsets(boundaries: List[int], text_length: int,
+                         chunk_size: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    Compute (start, end) character offsets for the basic chunker.
+    
+    Each chunk ends at the last sentence boundary inside its window, as long
+    as that boundary is past the halfway point; otherwise at chunk_size.
+    
+    Args:
+        boundaries: Sorted character offsets just past each sentence boundary
+        text_length: Length of the text being chunked
+        chunk_size: Maximum chunk size in characters
+        overlap: Characters shared between consecutive chunks
+        
+    Returns:
+        List of (start, end) offsets, in order
+    """
+    spans = []
+    start = 0
+    min_break = chunk_size // 2  # A boundary must be at least this far into the chunk
+    while start < text_length:
+        end = start + chunk_size
+        if end < text_length:
+            idx = bisect.bisect_right(boundaries, end)
+            if idx > 0 and boundaries[idx - 1] > start + min_break:
+                end = boundaries[idx - 1]
+        spans.append((start, end))
+        # Move to next chunk with overlap
+        start = end - overlap if end < text_length else end
+    return spans
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _basic_chunk_offsets_jit(boundaries, text_length, chunk_size, overlap):
+        """Compiled twin of _basic_chunk_offsets (boundaries as an int64 array)"""
+        spans = []
+        start = 0
+        min_break = chunk_size // 2
+        while start < text_length:
+            end = start + chunk_size
+            if end < text_length:
+                idx = np.searchsorted(boundaries, end, side='right')
+                if idx > 0 and boundaries[idx - 1] > start + min_break:
+                    end = boundaries[idx - 1]
+            spans.append((start, end))
+            start = end - overlap if end < text_length else end
+        return spans
+
+def _release_pdf_page(reader: Any, page: Any) -> None:
+    """
+    Drop the reader's cached copy of a page's content stream(s) once the
+    page has been extracted, so a long PDF doesn't keep every page's
+    decoded content in memory until the reader is closed.
+    """
+    try:
+        contents = page.raw_get("/Contents")
+        refs = [contents]
+        # /Contents may be one stream or an array of streams
+        resolved = reader.resolved_objects.get((contents.generation, contents.idnum))
+        if isinstance(resolved, list):
+            refs.extend(resolved)
+        for ref in refs:
+            reader.resolved_objects.pop((ref.generation, ref.idnum), None)
+    except Exception:
+        # Direct (non-referenced) contents or a pypdf without this cache
+        pass
+
+def _peak_rss_kb() -> Optional[int]:
+    """Peak resident memory of this process in KB, if the platform reports it"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _docx_text(element: Any) -> str:
+    """
+    Collect the text of a raw w:p element (runs, tabs and line breaks)
+    without building python-docx Paragraph/Run wrapper objects.
+    """
+    parts = []
+    for node in element.iter(qn('w:t'), qn('w:tab'), qn('w:br'), qn('w:cr')):
+        if node.tag == qn('w:t'):
+            parts.append(node.text or "")
+        elif node.tag == qn('w:tab'):
+            parts.append("\t")
+        else:
+            parts.append("\n")
+    return "".join(parts)
+
+def count_words(text: str) -> int:
+    """
+    Count whitespace-delimited words without building a list of substrings.
+    
+    Args:
+        text: Text to count words in
+        
+    Returns:
+        Number of words (same result as len(text.split()))
+    """
+    return sum(1 for _ in _WORD_PATTERN.finditer(text))
+
+# ============================================================================
+# CHUNK RECORD
+# ============================================================================
+
+@dataclass(slots=True)
+class ChunkRecord:
+    """
+    Lightweight container for a single text chunk.
+    
+    Slotted so large documents don't pay for a per-chunk __dict__;
+    converted to ORM rows / Pinecone metadata only at the storage step.
+    """
+    chunk_index: int
+    text: str
+    char_count: int
+    word_count: int
+    start_char: int
+    page_number: Optional[int] = None
+    token_count: Optional[int] = None  # Only known when split by tokens
+    
+    @property
+    def end_char(self) -> int:
+        """Character position just past the end of this chunk"""
+        return self.start_char + self.char_count
+
 # ============================================================================
 # DOCUMENT PROCESSOR CLASS
 # ============================================================================
@@ -75,15 +293,27 @@ class DocumentProcessor:
     - Metadata extraction
     """
     
-    def __init__(self):
+    def __init__(self, keep_page_texts: bool = False, enable_chunk_cache: bool = False):
         """
         Initialize the document processor with configuration settings.
+        
+        Args:
+            keep_page_texts: Also return per-page / per-paragraph / per-sheet
+                text ('page_texts', 'paragraphs', 'sheet_data'). Off by default
+                since it duplicates the full text in memory.
+            enable_chunk_cache: Reuse chunks from CHUNK_CACHE_DIR when the same
+                text is chunked again with the same settings (re-ingest).
         """
-        print("\n[DocumentProcessor] Initializing...")
+        logger.debug("Initializing...")
+        
+        self.keep_page_texts = keep_page_texts
+        self.enable_chunk_cache = enable_chunk_cache
         
         # Configuration from settings
-        self.chunk_size = settings.chunk_size  # Default: 1000 tokens
-        self.chunk_overlap = settings.chunk_overlap  # Default: 200 tokens
+        self.chunk_size = settings.chunk_size  # Default: 1000 characters
+        self.chunk_overlap = settings.chunk_overlap  # Default: 200 characters
+        self.chunk_tokens = settings.chunk_tokens  # Default: 256 tokens
+        self.chunk_token_overlap = settings.chunk_token_overlap  # Default: 50 tokens
         
         # Supported file extensions
         self.supported_extensions = {
@@ -95,71 +325,68 @@ class DocumentProcessor:
             'txt': self.process_text  # Plain text files
         }
         
-        # Initialize text splitter if LangChain is available
-        if LANGCHAIN_AVAILABLE:
-            self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=self.chunk_size,
-                chunk_overlap=self.chunk_overlap,
-                length_function=len,  # Use character count
-                separators=["\n\n", "\n", ".", "!", "?", ";", ",", " ", ""],
-                is_separator_regex=False
-            )
-            print(f"[DocumentProcessor] Text splitter configured:")
-            print(f"  - Chunk size: {self.chunk_size} characters")
-            print(f"  - Overlap: {self.chunk_overlap} characters")
+        # Initialize text splitter - prefer tiktoken, then LangChain
+        if TIKTOKEN_AVAILABLE:
+            self.text_splitter = None
+            logger.debug("Token splitter configured: chunk size %d tokens, overlap %d tokens",
+                         self.chunk_tokens, self.chunk_token_overlap)
+        elif LANGCHAIN_AVAILABLE:
+            self.text_splitter = _get_splitter(self.chunk_size, self.chunk_overlap)
+            logger.debug("Text splitter configured: chunk size %d characters, overlap %d characters",
+                         self.chunk_size, self.chunk_overlap)
         else:
             self.text_splitter = None
-            print("[DocumentProcessor] Using basic text splitter")
+            logger.debug("Using basic text splitter")
         
-        print(f"[DocumentProcessor] Supported formats: {list(self.supported_extensions.keys())}")
-        print("[DocumentProcessor] ✅ Initialization complete\n")
+        logger.debug("Supported formats: %s", list(self.supported_extensions.keys()))
+        logger.debug("Initialization complete")
     
     # ========================================================================
     # MAIN PROCESSING METHOD
     # ========================================================================
     
-    def process_document(self, file_path: str) -> Dict[str, Any]:
+    def process_document(self, file_path: str, stream: bool = False) -> Dict[str, Any]:
         """
         Main method to process any document.
         
         Args:
             file_path: Path to the document file
+            stream: Return 'chunks' as a lazy iterator (see iter_chunks)
+                instead of a list, so callers can pipeline embedding
             
         Returns:
             Dictionary containing:
             - success: Whether processing succeeded
             - text: Full extracted text
-            - chunks: List of text chunks
+            - chunks: List of text chunks (iterator when stream=True)
             - metadata: Document metadata (pages, word count, etc.)
             - error: Error message if failed
         """
-        print(f"\n{'='*60}")
-        print(f"[DocumentProcessor] Starting processing")
-        print(f"  File: {file_path}")
-        print(f"{'='*60}")
+        logger.info("Starting processing: %s", file_path)
         
-        # Step 1: Validate file exists
-        if not os.path.exists(file_path):
+        # Step 1: Validate file exists and get its size (one stat() call)
+        file_path = Path(file_path)
+        try:
+            file_size = file_path.stat().st_size
+        except FileNotFoundError:
             error_msg = f"File not found: {file_path}"
-            print(f"[DocumentProcessor] ❌ {error_msg}")
+            logger.error(error_msg)
             return {
                 'success': False,
                 'error': error_msg
             }
         
         # Step 2: Get file information
-        file_path = Path(file_path)
-        file_size = file_path.stat().st_size
         file_extension = file_path.suffix.lower().strip('.')
         
-        print(f"[DocumentProcessor] File info:")
-        print(f"  - Size: {file_size:,} bytes ({file_size/1024/1024:.2f} MB)")
-        print(f"  - Extension: .{file_extension}")
+        logger.debug("File info: size=%d bytes (%.2f MB), extension=.%s",
+                     file_size, file_size / 1024 / 1024, file_extension)
         
-        # Step 3: Check if file type is supported
-        if file_extension not in self.supported_extensions:
+        # Step 3: Check if file type is supported (single lookup)
+        processor_function = self.supported_extensions.get(file_extension)
+        if processor_function is None:
             error_msg = f"Unsupported file type: .{file_extension}"
-            print(f"[DocumentProcessor] ❌ {error_msg}")
+            logger.error(error_msg)
             return {
                 'success': False,
                 'error': error_msg,
@@ -168,33 +395,54 @@ class DocumentProcessor:
         
         # Step 4: Call the appropriate processor
         try:
-            print(f"[DocumentProcessor] Processing as {file_extension.upper()}...")
-            processor_function = self.supported_extensions[file_extension]
+            logger.debug("Processing as %s...", file_extension.upper())
             result = processor_function(str(file_path))
             
             # Step 5: If successful, create chunks
             if result['success'] and 'text' in result:
-                print(f"[DocumentProcessor] Creating chunks from extracted text...")
-                chunks = self.create_chunks(result['text'])
-                result['chunks'] = chunks
-                print(f"[DocumentProcessor] ✅ Created {len(chunks)} chunks")
+                if stream:
+                    # Chunks are produced as the caller iterates
+                    result['chunks'] = self.iter_chunks(result['text'])
+                else:
+                    logger.debug("Creating chunks from extracted text...")
+                    chunks = self.create_chunks(result['text'])
+                    result['chunks'] = chunks
+                    logger.debug("Created %d chunks", len(chunks))
             
             return result
             
         except Exception as e:
             error_msg = f"Processing failed: {str(e)}"
-            print(f"[DocumentProcessor] ❌ {error_msg}")
-            
-            # Print detailed error for debugging
-            import traceback
-            print("\n[DocumentProcessor] Detailed error:")
-            traceback.print_exc()
+            logger.exception(error_msg)
             
             return {
                 'success': False,
                 'error': error_msg
             }
     
+    @classmethod
+    def process_documents(cls, file_paths: List[str], workers: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Process several documents in parallel, one worker process per file.
+        
+        Extraction and chunking are CPU-bound and each file is independent,
+        so separate processes scale with the number of cores.
+        
+        Args:
+            file_paths: Paths of the documents to process
+            workers: Number of worker processes (default: CPU count)
+            
+        Returns:
+            One process_document() result per path, in the same order
+        """
+        if len(file_paths) <= 1:
+            # Not worth starting a pool for a single file
+            return [cls().process_document(path) for path in file_paths]
+        
+        logger.info("Processing %d documents in parallel", len(file_paths))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(_process_document_worker, file_paths))
+    
     # ========================================================================
     # PDF PROCESSING
     # ========================================================================
@@ -203,75 +451,141 @@ class DocumentProcessor:
         """
         Extract text from PDF files.
         
+        Uses PDFium (pypdfium2) when available, since its C++ text
+        extraction is much faster than pypdf; settings.pdf_backend can
+        force either one.
+        
         Args:
             file_path: Path to PDF file
             
         Returns:
             Dictionary with extracted text and metadata
         """
-        print("[DocumentProcessor] Extracting text from PDF...")
+        logger.debug("Extracting text from PDF...")
         
-        if not PDF_AVAILABLE:
+        backend = settings.pdf_backend.lower()
+        if PDFIUM_AVAILABLE and backend in ("auto", "pdfium"):
+            page_source = self._pdf_pages_pdfium
+        elif PDF_AVAILABLE and backend in ("auto", "pypdf"):
+            page_source = self._pdf_pages_pypdf
+        else:
             return {
                 'success': False,
-                'error': 'PDF support not available. Install pypdf.'
+                'error': f'PDF support not available for backend "{backend}". Install pypdfium2 or pypdf.'
             }
         
         try:
-            # Open and read the PDF
-            reader = PdfReader(file_path)
-            num_pages = len(reader.pages)
-            print(f"[DocumentProcessor] PDF has {num_pages} pages")
-            
-            # Extract text from each page
-            full_text = ""
+            # Extract text from each page (collected as parts, joined once)
+            full_text_parts = []
             page_texts = []
+            pages_with_text = 0
             word_count = 0
+            num_pages = 0
             
-            for page_num, page in enumerate(reader.pages, 1):
-                # Extract text from this page
-                page_text = page.extract_text()
+            for page_num, page_text in enumerate(page_source(file_path), 1):
+                num_pages = page_num
                 
                 # Clean up the text (remove extra whitespace)
-                page_text = re.sub(r'\s+', ' ', page_text).strip()
+                page_text = _WHITESPACE_PATTERN.sub(' ', page_text).strip()
                 
                 if page_text:
-                    page_texts.append({
-                        'page': page_num,
-                        'text': page_text,
-                        'word_count': len(page_text.split())
-                    })
+                    # Whitespace is already collapsed to single spaces,
+                    # so the word count is simply spaces + 1
+                    page_word_count = page_text.count(' ') + 1
                     
-                    full_text += f"\n\n[Page {page_num}]\n{page_text}"
-                    word_count += len(page_text.split())
+                    if self.keep_page_texts:
+                        page_texts.append({
+                            'page': page_num,
+                            'text': page_text,
+                            'word_count': page_word_count
+                        })
+                    
+                    pages_with_text += 1
+                    full_text_parts.append(f"\n\n[Page {page_num}]\n{page_text}")
+                    word_count += page_word_count
                     
                     # Debug: Show progress for large PDFs
-                    if page_num % 10 == 0:
-                        print(f"  Processed {page_num}/{num_pages} pages...")
+                    if page_num % 10 == 0 and logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("Processed %d pages...", page_num)
+                
+                if page_num % PDF_MEMORY_LOG_INTERVAL == 0:
+                    logger.info("Processed %d pages (peak RSS: %s KB)", page_num, _peak_rss_kb())
             
-            print(f"[DocumentProcessor] ✅ Extracted text from {len(page_texts)} pages")
-            print(f"[DocumentProcessor] Total words: {word_count:,}")
+            logger.info("Extracted text from %d pages (%d words)", pages_with_text, word_count)
             
             return {
                 'success': True,
-                'text': full_text.strip(),
+                'text': "".join(full_text_parts).strip(),
                 'metadata': {
                     'page_count': num_pages,
                     'word_count': word_count,
-                    'pages_with_text': len(page_texts),
+                    'pages_with_text': pages_with_text,
                     'file_type': 'pdf'
                 },
-                'page_texts': page_texts  # Useful for page-specific retrieval
+                'page_texts': page_texts  # Only filled when keep_page_texts is set
             }
             
         except Exception as e:
             error_msg = f"PDF processing error: {str(e)}"
-            print(f"[DocumentProcessor] ❌ {error_msg}")
+            logger.error(error_msg)
             return {
                 'success': False,
                 'error': error_msg
             }
     
+    def _pdf_pages_pdfium(self, file_path: str) -> Iterator[str]:
+        """
+        Yield the raw text of each PDF page using PDFium.
+        
+        Args:
+            file_path: Path to PDF file
+            
+        Yields:
+            Page text, one string per page (empty for pages without text)
+        """
+        pdf = pdfium.PdfDocument(file_path)
+        try:
+            num_pages = len(pdf)
+            logger.debug("PDF has %d pages (pdfium)", num_pages)
+            
+            for index in range(num_pages):
+                page = pdf[index]
+                textpage = page.get_textpage()
+                try:
+                    yield textpage.get_text_range()
+                finally:
+                    # Free native page resources as soon as the page is done
+                    textpage.close()
+                    page.close()
+        finally:
+            pdf.close()
+    
+    def _pdf_pages_pypdf(self, file_path: str) -> Iterator[str]:
+        """
+        Yield the raw text of each PDF page using pypdf.
+        
+        Args:
+            file_path: Path to PDF file
+            
+        Yields:
+            Page text, one string per page (empty for pages without text)
+        """
+        # Map the file instead of reading it, so the OS pages it in
+        # on demand rather than pypdf holding a full copy
+        with open(file_path, 'rb') as fp, \
+                mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            reader = PdfReader(mm)
+            logger.debug("PDF has %d pages (pypdf)", len(reader.pages))
+            
+            for page in reader.pages:
+                # Extract text from this page, then let go of its content stream
+                page_text = page.extract_text()
+                _release_pdf_page(reader, page)
+                del page
+                yield page_text
+            
+            del reader
+    
     # ========================================================================
     # WORD DOCUMENT PROCESSING
     # ========================================================================
@@ -286,7 +600,7 @@ class DocumentProcessor:
         Returns:
             Dictionary with extracted text and metadata
         """
-        print("[DocumentProcessor] Extracting text from Word document...")
+        logger.debug("Extracting text from Word document...")
         
         if not DOCX_AVAILABLE:
             return {
@@ -298,56 +612,70 @@ class DocumentProcessor:
             # Open the Word document
             doc = DocxDocument(file_path)
             
-            # Extract text from paragraphs
+            # Walk the body XML once, in document order, instead of going
+            # through doc.paragraphs and doc.tables wrapper objects
+            paragraph_tag = qn('w:p')
+            table_tag = qn('w:tbl')
+            
             paragraphs = []
-            full_text = ""
+            paragraph_count = 0
+            table_count = 0
+            full_text_parts = []
             word_count = 0
+            para_num = 0
             
-            for para_num, paragraph in enumerate(doc.paragraphs, 1):
-                para_text = paragraph.text.strip()
-                
-                if para_text:  # Skip empty paragraphs
-                    paragraphs.append({
-                        'paragraph': para_num,
-                        'text': para_text,
-                        'style': paragraph.style.name if paragraph.style else None
-                    })
+            for element in doc.element.body.iterchildren(paragraph_tag, table_tag):
+                if element.tag == paragraph_tag:
+                    para_num += 1
+                    para_text = _docx_text(element).strip()
                     
-                    full_text += para_text + "\n\n"
-                    word_count += len(para_text.split())
-            
-            # Also extract text from tables
-            table_count = 0
-            for table in doc.tables:
-                table_count += 1
-                table_text = "\n[Table]\n"
-                
-                for row in table.rows:
-                    row_text = " | ".join(cell.text.strip() for cell in row.cells)
-                    table_text += row_text + "\n"
+                    if para_text:  # Skip empty paragraphs
+                        if self.keep_page_texts:
+                            style = DocxParagraph(element, doc).style
+                            paragraphs.append({
+                                'paragraph': para_num,
+                                'text': para_text,
+                                'style': style.name if style else None
+                            })
+                        
+                        paragraph_count += 1
+                        full_text_parts.append(para_text + "\n\n")
+                        word_count += count_words(para_text)
                 
-                full_text += table_text + "\n"
-                word_count += len(table_text.split())
+                else:
+                    # Table: one line per row, cells separated by " | "
+                    table_count += 1
+                    table_lines = ["\n[Table]\n"]
+                    
+                    for row in element.iterchildren(qn('w:tr')):
+                        row_text = " | ".join(
+                            "\n".join(_docx_text(p) for p in cell.iterchildren(paragraph_tag)).strip()
+                            for cell in row.iterchildren(qn('w:tc'))
+                        )
+                        table_lines.append(row_text + "\n")
+                    
+                    table_text = "".join(table_lines)
+                    full_text_parts.append(table_text + "\n")
+                    word_count += count_words(table_text)
             
-            print(f"[DocumentProcessor] ✅ Extracted {len(paragraphs)} paragraphs")
-            print(f"[DocumentProcessor] ✅ Extracted {table_count} tables")
-            print(f"[DocumentProcessor] Total words: {word_count:,}")
+            logger.info("Extracted %d paragraphs and %d tables (%d words)",
+                        paragraph_count, table_count, word_count)
             
             return {
                 'success': True,
-                'text': full_text.strip(),
+                'text': "".join(full_text_parts).strip(),
                 'metadata': {
-                    'paragraph_count': len(paragraphs),
+                    'paragraph_count': paragraph_count,
                     'table_count': table_count,
                     'word_count': word_count,
                     'file_type': 'docx'
                 },
-                'paragraphs': paragraphs  # Useful for structure-aware retrieval
+                'paragraphs': paragraphs  # Only filled when keep_page_texts is set
             }
             
         except Exception as e:
             error_msg = f"Word processing error: {str(e)}"
-            print(f"[DocumentProcessor] ❌ {error_msg}")
+            logger.error(error_msg)
             return {
                 'success': False,
                 'error': error_msg
@@ -367,7 +695,7 @@ class DocumentProcessor:
         Returns:
             Dictionary with extracted text and metadata
         """
-        print("[DocumentProcessor] Extracting text from Excel file...")
+        logger.debug("Extracting text from Excel file...")
         
         if not EXCEL_AVAILABLE:
             return {
@@ -376,69 +704,75 @@ class DocumentProcessor:
             }
         
         try:
-            # Open the Excel workbook
-            workbook = openpyxl.load_workbook(file_path, data_only=True)
+            # Open the Excel workbook in read-only mode so rows are streamed
+            # from the sheet XML instead of building the whole cell grid
+            workbook = openpyxl.load_workbook(file_path, data_only=True, read_only=True, keep_links=False)
             sheet_names = workbook.sheetnames
-            print(f"[DocumentProcessor] Excel has {len(sheet_names)} sheets: {sheet_names}")
+            logger.debug("Excel has %d sheets: %s", len(sheet_names), sheet_names)
             
-            full_text = ""
+            full_text_parts = []
             sheet_data = []
+            sheets_with_data = 0
             total_cells = 0
+            word_count = 0
             
             # Process each sheet
             for sheet_name in sheet_names:
                 sheet = workbook[sheet_name]
-                print(f"  Processing sheet: {sheet_name}")
+                logger.debug("Processing sheet: %s", sheet_name)
                 
-                sheet_text = f"\n[Sheet: {sheet_name}]\n"
+                sheet_lines = [f"\n[Sheet: {sheet_name}]\n"]
+                sheet_word_count = count_words(sheet_lines[0])
                 row_count = 0
                 
                 # Extract data from cells
                 for row in sheet.iter_rows(values_only=True):
-                    # Filter out completely empty rows
-                    if any(cell is not None for cell in row):
-                        row_text = " | ".join(
-                            str(cell) if cell is not None else ""
-                            for cell in row
-                        )
-                        sheet_text += row_text + "\n"
+                    # Filter out completely empty rows (tuple.count runs in C)
+                    filled_cells = len(row) - row.count(None)
+                    if filled_cells:
+                        row_text = " | ".join(map(_cell_str, row))
+                        sheet_lines.append(row_text + "\n")
+                        sheet_word_count += count_words(row_text)
                         row_count += 1
-                        total_cells += sum(1 for cell in row if cell is not None)
+                        total_cells += filled_cells
                 
                 if row_count > 0:
-                    sheet_data.append({
-                        'sheet': sheet_name,
-                        'rows': row_count,
-                        'text': sheet_text
-                    })
-                    full_text += sheet_text + "\n"
+                    sheet_text = "".join(sheet_lines)
+                    if self.keep_page_texts:
+                        sheet_data.append({
+                            'sheet': sheet_name,
+                            'rows': row_count,
+                            'text': sheet_text
+                        })
+                    sheets_with_data += 1
+                    full_text_parts.append(sheet_text + "\n")
+                    word_count += sheet_word_count
                     
-                print(f"    - Extracted {row_count} rows")
+                logger.debug("Extracted %d rows from sheet %s", row_count, sheet_name)
             
             # Close the workbook
             workbook.close()
             
-            word_count = len(full_text.split())
-            print(f"[DocumentProcessor] ✅ Extracted data from {len(sheet_data)} sheets")
-            print(f"[DocumentProcessor] Total cells with data: {total_cells:,}")
-            print(f"[DocumentProcessor] Total words: {word_count:,}")
+            full_text = "".join(full_text_parts)
+            logger.info("Extracted data from %d sheets (%d cells with data, %d words)",
+                        sheets_with_data, total_cells, word_count)
             
             return {
                 'success': True,
                 'text': full_text.strip(),
                 'metadata': {
                     'sheet_count': len(sheet_names),
-                    'sheets_with_data': len(sheet_data),
+                    'sheets_with_data': sheets_with_data,
                     'total_cells': total_cells,
                     'word_count': word_count,
                     'file_type': 'excel'
                 },
-                'sheet_data': sheet_data  # Useful for sheet-specific queries
+                'sheet_data': sheet_data  # Only filled when keep_page_texts is set
             }
             
         except Exception as e:
             error_msg = f"Excel processing error: {str(e)}"
-            print(f"[DocumentProcessor] ❌ {error_msg}")
+            logger.error(error_msg)
             return {
                 'success': False,
                 'error': error_msg
@@ -458,22 +792,25 @@ class DocumentProcessor:
         Returns:
             Dictionary with text and metadata
         """
-        print("[DocumentProcessor] Processing plain text file...")
+        logger.debug("Processing plain text file...")
         
         try:
-            # Read the text file
-            with open(file_path, 'r', encoding='utf-8') as file:
-                text = file.read()
+            if os.path.getsize(file_path) > TEXT_STREAM_THRESHOLD:
+                # Large file: count as we read instead of re-scanning copies
+                text, line_count, word_count = self._read_text_blocks(file_path)
+            else:
+                # Read the text file
+                with open(file_path, 'r', encoding='utf-8') as file:
+                    text = file.read()
+                
+                # Calculate metadata
+                line_count = len(text.splitlines())
+                word_count = count_words(text)
             
-            # Calculate metadata
-            line_count = len(text.splitlines())
-            word_count = len(text.split())
             char_count = len(text)
             
-            print(f"[DocumentProcessor] ✅ Read text file")
-            print(f"[DocumentProcessor] Lines: {line_count:,}")
-            print(f"[DocumentProcessor] Words: {word_count:,}")
-            print(f"[DocumentProcessor] Characters: {char_count:,}")
+            logger.info("Read text file (%d lines, %d words, %d characters)",
+                        line_count, word_count, char_count)
             
             return {
                 'success': True,
@@ -488,17 +825,51 @@ class DocumentProcessor:
             
         except Exception as e:
             error_msg = f"Text file processing error: {str(e)}"
-            print(f"[DocumentProcessor] ❌ {error_msg}")
+            logger.error(error_msg)
             return {
                 'success': False,
                 'error': error_msg
             }
     
+    def _read_text_blocks(self, file_path: str) -> Tuple[str, int, int]:
+        """
+        Read a large text file in fixed-size blocks, counting lines and
+        words on the fly.
+        
+        Args:
+            file_path: Path to text file
+            
+        Returns:
+            Tuple of (full text, line count, word count)
+        """
+        blocks = []
+        line_count = 0
+        word_count = 0
+        previous_ended_in_word = False
+        
+        with open(file_path, 'r', encoding='utf-8') as file:
+            for block in iter(lambda: file.read(TEXT_READ_BLOCK_SIZE), ''):
+                blocks.append(block)
+                line_count += block.count('\n')
+                word_count += count_words(block)
+                
+                # A word split across two blocks was counted twice
+                if previous_ended_in_word and not block[0].isspace():
+                    word_count -= 1
+                previous_ended_in_word = not block[-1].isspace()
+        
+        # Match splitlines(): a trailing line without a newline still counts
+        if blocks and not blocks[-1].endswith('\n'):
+            line_count += 1
+        
+        logger.debug("Streamed %d blocks from %s", len(blocks), file_path)
+        return "".join(blocks), line_count, word_count
+    
     # ========================================================================
     # TEXT CHUNKING
     # ========================================================================
     
-    def create_chunks(self, text: str) -> List[Dict[str, Any]]:
+    def create_chunks(self, text: str) -> List[ChunkRecord]:
         """
         Split text into chunks for vector embedding.
         
@@ -511,100 +882,227 @@ class DocumentProcessor:
             text: Full text to chunk
             
         Returns:
-            List of chunk dictionaries with text and metadata
+            List of ChunkRecord objects with text and metadata
         """
-        print(f"\n[DocumentProcessor] Creating chunks...")
-        print(f"  Text length: {len(text):,} characters")
+        if not self.enable_chunk_cache:
+            return list(self.iter_chunks(text))
         
-        if not text or len(text.strip()) == 0:
-            print("[DocumentProcessor] ⚠️  No text to chunk")
-            return []
+        cache_path = self._chunk_cache_path(text)
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                chunks = [ChunkRecord(**item) for item in json.load(f)]
+            logger.info("Loaded %d chunks from cache (%s)", len(chunks), cache_path.name)
+            return chunks
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError) as e:
+            logger.warning("Ignoring unreadable chunk cache %s: %s", cache_path, e)
         
-        chunks = []
+        chunks = list(self.iter_chunks(text))
+        self._write_chunk_cache(cache_path, chunks)
+        return chunks
+    
+    def _chunk_cache_path(self, text: str) -> Path:
+        """
+        Cache file for this text under the current splitter settings.
+        
+        The key covers the text hash plus everything that changes the output:
+        which splitter runs and its size/overlap (and encoding for tiktoken).
+        """
+        digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+        if TIKTOKEN_AVAILABLE:
+            # v2: windows cut on whole characters, offsets of the stripped text
+            splitter_key = f"tok{self.chunk_tokens}_{self.chunk_token_overlap}_{TOKEN_ENCODER.name}_v2"
+        elif LANGCHAIN_AVAILABLE and self.text_splitter:
+            splitter_key = f"lc{self.chunk_size}_{self.chunk_overlap}"
+        else:
+            splitter_key = f"basic{self.chunk_size}_{self.chunk_overlap}"
+        return CHUNK_CACHE_DIR / f"{digest}_{splitter_key}.json"
+    
+    def _write_chunk_cache(self, cache_path: Path, chunks: List[ChunkRecord]) -> None:
+        """
+        Write chunks to the cache atomically (temp file + rename), so a
+        concurrent reader never sees a half-written file.
+        """
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=cache_path.parent,
+                                             suffix='.tmp', delete=False) as tmp:
+                json.dump([asdict(chunk) for chunk in chunks], tmp)
+            os.replace(tmp.name, cache_path)
+            logger.debug("Cached %d chunks in %s", len(chunks), cache_path)
+        except OSError as e:
+            # Caching is best-effort; chunking already succeeded
+            logger.warning("Could not write chunk cache %s: %s", cache_path, e)
+    
+    def iter_chunks(self, text: str) -> Iterator[ChunkRecord]:
+        """
+        Yield chunks one at a time, as create_chunks() would return them.
+        
+        Lets a consumer (e.g. embedding batches) start work before the whole
+        document has been chunked, without holding every chunk in memory.
         
-        if LANGCHAIN_AVAILABLE and self.text_splitter:
+        Args:
+            text: Full text to chunk
+            
+        Yields:
+            ChunkRecord objects in document order
+        """
+        logger.debug("Creating chunks from %d characters", len(text))
+        
+        # isspace() answers the same question without copying the whole text
+        if not text or text.isspace():
+            logger.warning("No text to chunk")
+            return
+        
+        chunk_count = 0
+        
+        # Chunk size statistics, accumulated as chunks are emitted
+        total_chars = 0
+        min_size = None
+        max_size = 0
+        
+        if TIKTOKEN_AVAILABLE:
+            # Slide a window over the token stream so chunk sizes match
+            # what the embedding model actually sees
+            logger.debug("Using tiktoken token-window splitter")
+            
+            tokens = TOKEN_ENCODER.encode(text, disallowed_special=())
+            stride = max(self.chunk_tokens - self.chunk_token_overlap, 1)
+            
+            # Character offset where each token starts. Windows are sliced
+            # from the decoded text at these offsets rather than decoding
+            # token slices, so a multibyte character split across tokens is
+            # never cut in half (no U+FFFD) and offsets don't drift
+            decoded, offsets = TOKEN_ENCODER.decode_with_offsets(tokens)
+            offsets.append(len(decoded))
+            
+            chunk_index = 0
+            for i in range(0, len(tokens), stride):
+                end = min(i + self.chunk_tokens, len(tokens))
+                window_text = decoded[offsets[i]:offsets[end]]
+                stripped_text = window_text.strip()
+                
+                if stripped_text:
+                    chunk_data = ChunkRecord(
+                        chunk_index=chunk_index,
+                        text=stripped_text,
+                        char_count=len(stripped_text),
+                        word_count=count_words(stripped_text),
+                        start_char=offsets[i] + len(window_text) - len(window_text.lstrip()),
+                        token_count=end - i
+                    )
+                    chunk_count += 1
+                    yield chunk_data
+                    total_chars += chunk_data.char_count
+                    min_size = chunk_data.char_count if min_size is None else min(min_size, chunk_data.char_count)
+                    max_size = max(max_size, chunk_data.char_count)
+                    chunk_index += 1
+                    
+                    # Debug: Show first few chunks (skipped entirely unless DEBUG is on)
+                    if chunk_index <= 3 and logger.isEnabledFor(logging.DEBUG):
+                        preview = stripped_text[:100] + "..." if len(stripped_text) > 100 else stripped_text
+                        logger.debug("Chunk %d: %s", chunk_index-1, preview)
+                
+                # Last window already reached the end of the text
+                if end >= len(tokens):
+                    break
+        
+        elif LANGCHAIN_AVAILABLE and self.text_splitter:
             # Use LangChain's advanced splitter
-            print("[DocumentProcessor] Using LangChain RecursiveCharacterTextSplitter")
+            logger.debug("Using LangChain RecursiveCharacterTextSplitter")
             
             # Split the text
             text_chunks = self.text_splitter.split_text(text)
             
+            # Chunks come back in document order, so search for each one
+            # starting just past the previous match instead of from 0
+            cursor = 0
+            
             # Create chunk dictionaries with metadata
             for i, chunk_text in enumerate(text_chunks):
-                chunk_data = {
-                    'chunk_index': i,
-                    'text': chunk_text.strip(),
-                    'char_count': len(chunk_text),
-                    'word_count': len(chunk_text.split()),
-                    'start_char': text.find(chunk_text[:50]) if len(chunk_text) >= 50 else 0
-                }
-                chunks.append(chunk_data)
+                position = text.find(chunk_text[:50], cursor)
+                if position >= 0:
+                    cursor = position + 1
+                
+                chunk_data = ChunkRecord(
+                    chunk_index=i,
+                    text=chunk_text.strip(),
+                    char_count=len(chunk_text),
+                    word_count=count_words(chunk_text),
+                    start_char=position if position >= 0 else cursor
+                )
+                chunk_count += 1
+                yield chunk_data
+                total_chars += chunk_data.char_count
+                min_size = chunk_data.char_count if min_size is None else min(min_size, chunk_data.char_count)
+                max_size = max(max_size, chunk_data.char_count)
                 
-                # Debug: Show first few chunks
-                if i < 3:
+                # Debug: Show first few chunks (skipped entirely unless DEBUG is on)
+                if i < 3 and logger.isEnabledFor(logging.DEBUG):
                     preview = chunk_text[:100] + "..." if len(chunk_text) > 100 else chunk_text
-                    print(f"  Chunk {i}: {preview}")
+                    logger.debug("Chunk %d: %s", i, preview)
         
         else:
             # Basic chunking fallback
-            print("[DocumentProcessor] Using basic chunking (no LangChain)")
+            logger.debug("Using basic chunking (no LangChain)")
             
             # Simple splitting by character count
             chunk_size = self.chunk_size
             overlap = self.chunk_overlap
             
-            start = 0
+            text_length = len(text)
             chunk_index = 0
             
-            while start < len(text):
-                # Calculate end position
-                end = start + chunk_size
-                
-                # Try to break at a sentence boundary
-                if end < len(text):
-                    # Look for sentence end (.!?) near the chunk boundary
-                    for punct in ['. ', '! ', '? ', '\n\n', '\n']:
-                        last_punct = text.rfind(punct, start, end)
-                        if last_punct != -1 and last_punct > start + chunk_size // 2:
-                            end = last_punct + len(punct)
-                            break
-                
+            # Find every sentence boundary once; each chunk then only needs
+            # a binary search instead of rescanning its window
+            boundaries = [m.end() for m in _SENTENCE_BOUNDARY_PATTERN.finditer(text)]
+            
+            if NUMBA_AVAILABLE:
+                spans = _basic_chunk_offsets_jit(np.array(boundaries, dtype=np.int64),
+                                                 text_length, chunk_size, overlap)
+            else:
+                spans = _basic_chunk_offsets(boundaries, text_length, chunk_size, overlap)
+            
+            for start, end in spans:
                 # Extract chunk
                 chunk_text = text[start:end].strip()
                 
                 if chunk_text:  # Only add non-empty chunks
-                    chunk_data = {
-                        'chunk_index': chunk_index,
-                        'text': chunk_text,
-                        'char_count': len(chunk_text),
-                        'word_count': len(chunk_text.split()),
-                        'start_char': start
-                    }
-                    chunks.append(chunk_data)
+                    chunk_data = ChunkRecord(
+                        chunk_index=chunk_index,
+                        text=chunk_text,
+                        char_count=len(chunk_text),
+                        word_count=count_words(chunk_text),
+                        start_char=start
+                    )
+                    chunk_count += 1
+                    yield chunk_data
+                    total_chars += chunk_data.char_count
+                    min_size = chunk_data.char_count if min_size is None else min(min_size, chunk_data.char_count)
+                    max_size = max(max_size, chunk_data.char_count)
                     chunk_index += 1
                     
-                    # Debug: Show first few chunks
-                    if chunk_index <= 3:
+                    # Debug: Show first few chunks (skipped entirely unless DEBUG is on)
+                    if chunk_index <= 3 and logger.isEnabledFor(logging.DEBUG):
                         preview = chunk_text[:100] + "..." if len(chunk_text) > 100 else chunk_text
-                        print(f"  Chunk {chunk_index-1}: {preview}")
-                
-                # Move to next chunk with overlap
-                start = end - overlap if end < len(text) else end
+                        logger.debug("Chunk %d: %s", chunk_index-1, preview)
         
-        print(f"[DocumentProcessor] ✅ Created {len(chunks)} chunks")
+        logger.info("Created %d chunks", chunk_count)
         
         # Show chunk statistics
-        if chunks:
-            avg_size = sum(c['char_count'] for c in chunks) / len(chunks)
-            min_size = min(c['char_count'] for c in chunks)
-            max_size = max(c['char_count'] for c in chunks)
+        if chunk_count:
+            avg_size = total_chars / chunk_count
             
-            print(f"[DocumentProcessor] Chunk statistics:")
-            print(f"  - Average size: {avg_size:.0f} characters")
-            print(f"  - Min size: {min_size} characters")
-            print(f"  - Max size: {max_size} characters")
-        
-        return chunks
+            logger.debug("Chunk statistics: average %.0f, min %d, max %d characters",
+                         avg_size, min_size, max_size)
+
+def _process_document_worker(file_path: str) -> Dict[str, Any]:
+    """
+    Entry point for process_documents() worker processes.
+    Module-level so it can be pickled; builds its own processor per file.
+    """
+    return DocumentProcessor().process_document(file_path)
 
 # ============================================================================
 # STANDALONE TEST FUNCTION
@@ -676,10 +1174,10 @@ text extraction and chunking for the RAG pipeline.
         if result.get('chunks'):
             first_chunk = result['chunks'][0]
             print(f"\nFirst chunk example:")
-            print(f"  Index: {first_chunk['chunk_index']}")
-            print(f"  Size: {first_chunk['char_count']} characters")
-            print(f"  Words: {first_chunk['word_count']}")
-            print(f"  Text preview: {first_chunk['text'][:200]}...")
+            print(f"  Index: {first_chunk.chunk_index}")
+            print(f"  Size: {first_chunk.char_count} characters")
+            print(f"  Words: {first_chunk.word_count}")
+            print(f"  Text preview: {first_chunk.text[:200]}...")
     else:
         print(f"\n❌ Processing failed: {result.get('error')}")
     
@@ -697,4 +1195,5 @@ text extraction and chunking for the RAG pipeline.
 
 # Run test if this file is executed directly
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(name)s - %(levelname)s - %(message)s')
     test_document_processor()
\ No newline at end of file
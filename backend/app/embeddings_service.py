@@ -18,23 +18,359 @@ FIXED: Attribute initialization order to prevent 'embedding_model' not found err
 # IMPORTS
 # ============================================================================
 import os
+import re
 import time
 import json
-from typing import List, Dict, Any, Optional, Tuple
+import base64
+import asyncio
+import random
+import hashlib
+import logging
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 # OpenAI SDK
 try:
-    from openai import OpenAI
+    import httpx
+    from openai import OpenAI, AsyncOpenAI, APIStatusError
     OPENAI_AVAILABLE = True
-    print("[EmbeddingsService] ✅ OpenAI SDK available")
+    logger.debug("OpenAI SDK available")
 except ImportError:
     OPENAI_AVAILABLE = False
-    print("[EmbeddingsService] ❌ OpenAI SDK not available - install openai")
+    logger.error("OpenAI SDK not available - install openai")
+
+# HTTP/2 lets concurrent batch requests share one TLS connection (needs h2)
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+    logger.info("h2 not available - embedding requests will use HTTP/1.1")
+
+from fastapi import Request
+
+# NumPy for vector math (semantic cache, similarity)
+import numpy as np
+
+# Optional JIT compilation for row normalisation of embedding matrices
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+    logger.debug("Numba available - embedding normalisation will be compiled")
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 # Import our configuration
 from app.config import settings
 
+# Exact token counts for batching, cost tracking and pre-truncation
+try:
+    import tiktoken
+    try:
+        TOKEN_ENCODER = tiktoken.encoding_for_model(settings.embedding_model)
+    except KeyError:
+        # Unknown model name - all current OpenAI embedding models use cl100k_base
+        TOKEN_ENCODER = tiktoken.get_encoding("cl100k_base")
+    logger.debug("tiktoken available (%s)", TOKEN_ENCODER.name)
+except Exception as e:
+    TOKEN_ENCODER = None
+    logger.info("tiktoken not available (%s) - estimating tokens from length", e)
+
+# Maximum number of embedding batch requests in flight at once
+MAX_CONCURRENT_BATCHES = 8
+
+# Recent search queries whose embeddings are kept in memory (LRU)
+QUERY_CACHE_SIZE = 1024
+
+# Chunk embeddings kept in memory (LRU, ~6 KB each at 1536 dims); older
+# ones are still served from the SQLite cache
+MEM_CACHE_SIZE = 10_000
+
+# Connection pool for the async client, sized well above MAX_CONCURRENT_BATCHES
+HTTP_MAX_CONNECTIONS = 64
+HTTP_MAX_KEEPALIVE = 32
+
+# Per-request limits for the embeddings endpoint (2048 inputs, ~300K tokens);
+# batches are packed up to these instead of a fixed number of texts
+MAX_BATCH_INPUTS = 2048
+MAX_BATCH_TOKENS = 280_000
+
+# Retry policy: honour Retry-After when the API sends it, otherwise
+# exponential backoff with jitter so concurrent clients don't retry in step
+RETRY_BASE_DELAY = 1.0  # seconds
+MAX_RETRY_DELAY = 60.0  # seconds
+
+# A successful API key check is remembered for this long (marker file in the
+# temp dir) so dev autoreloads don't make a billed request on every restart
+API_KEY_CHECK_TTL = 600  # seconds
+
+# Embedding models accept at most this many tokens per input; longer inputs
+# are truncated before dispatch (by characters when tiktoken is missing)
+MAX_INPUT_TOKENS = 8191
+MAX_INPUT_CHARS = 30_000
+
+# Whitespace normalisation: collapse runs to one space and strip the ends.
+# _WS_DIRTY_RE finds anything that would change (a run, or a tab/newline/etc.)
+# so already-clean chunks are returned without building a new string
+_WS_RE = re.compile(r"\s+")
+_WS_DIRTY_RE = re.compile(r"\s{2,}|[^\S ]")
+
+def clean_text(text: str) -> str:
+    """Same result as " ".join(text.split()), without the word list"""
+    if text[:1] == " " or text[-1:] == " " or _WS_DIRTY_RE.search(text):
+        return _WS_RE.sub(" ", text).strip()
+    return text
+
+def count_tokens(text: str) -> int:
+    """Number of tokens the embedding model will see (len / 4 without tiktoken)"""
+    if TOKEN_ENCODER is None:
+        return (len(text) + 3) // 4
+    return len(TOKEN_ENCODER.encode(text, disallowed_special=()))
+
+def truncate_to_limit(text: str) -> Tuple[str, int]:
+    """
+    Cut text to the model's input limit.
+    
+    Args:
+        text: Cleaned input text
+        
+    Returns:
+        Tuple of (text that fits, its token count)
+    """
+    if TOKEN_ENCODER is None:
+        text = text[:MAX_INPUT_CHARS]
+        return text, (len(text) + 3) // 4
+    
+    tokens = TOKEN_ENCODER.encode(text, disallowed_special=())
+    if len(tokens) > MAX_INPUT_TOKENS:
+        tokens = tokens[:MAX_INPUT_TOKENS]
+        text = TOKEN_ENCODER.decode(tokens)
+    return text, len(tokens)
+
+def _decode_embedding(item: Any) -> np.ndarray:
+    """
+    Decode one embedding returned with encoding_format="base64" (packed
+    little-endian float32) - a single copy instead of parsing a JSON float
+    per dimension.
+    """
+    return np.frombuffer(base64.b64decode(item.embedding), dtype='<f4')
+
+def _l2_normalize_numpy(matrix: np.ndarray) -> np.ndarray:
+    """Scale each row of matrix to unit length in place (zero rows stay zero)"""
+    norms = np.sqrt(np.einsum('ij,ij->i', matrix, matrix))
+    norms += 1e-12
+    matrix /= norms[:, None]
+    return matrix
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _l2_normalize_jit(matrix):
+        """Compiled twin of _l2_normalize_numpy (rows in parallel, no temporaries)"""
+        n, d = matrix.shape
+        for i in prange(n):
+            s = 0.0
+            for j in range(d):
+                s += matrix[i, j] * matrix[i, j]
+            inv = 1.0 / (np.sqrt(s) + 1e-12)
+            for j in range(d):
+                matrix[i, j] *= inv
+        return matrix
+
+def l2_normalize(matrix: np.ndarray) -> np.ndarray:
+    """
+    L2-normalise the rows of a float32 matrix in place, so dot products
+    are cosine similarities.
+    
+    Args:
+        matrix: C-contiguous float32 array of shape (n, dim)
+        
+    Returns:
+        The same array
+    """
+    if NUMBA_AVAILABLE:
+        return _l2_normalize_jit(matrix)
+    return _l2_normalize_numpy(matrix)
+
+# ============================================================================
+# RATE LIMITER
+# ============================================================================
+
+class TokenBucket:
+    """
+    Client-side limiter for the embeddings quota (tokens and requests per
+    minute), so requests are paced before OpenAI has to answer with 429.
+    
+    The allowed rate adapts AIMD-style: shrink() cuts it (called on a 429)
+    and every GROW_AFTER consecutive successes grow() raises it again,
+    never above the configured quota. Bucket levels are also corrected
+    from OpenAI's x-ratelimit-remaining-* response headers.
+    
+    Used from a single event loop; acquire() does not await between
+    checking and taking capacity, so it needs no lock.
+    """
+    
+    GROW_AFTER = 10  # Consecutive successes before raising the rate
+    MIN_SCALE = 0.05  # Never throttle below 5% of the quota
+    
+    def __init__(self, tpm: int, rpm: int):
+        self.tpm = tpm
+        self.rpm = rpm
+        self.scale = 1.0  # Fraction of the quota currently allowed
+        self._tokens = float(tpm)
+        self._requests = float(rpm)
+        self._updated = time.monotonic()
+        self._successes = 0
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        minutes = (now - self._updated) / 60
+        self._updated = now
+        self._tokens = min(self.tpm * self.scale, self._tokens + minutes * self.tpm * self.scale)
+        self._requests = min(self.rpm * self.scale, self._requests + minutes * self.rpm * self.scale)
+    
+    async def acquire(self, tokens: int) -> None:
+        """
+        Wait until one request carrying `tokens` tokens fits the quota.
+        
+        Args:
+            tokens: Estimated tokens in the request
+        """
+        while True:
+            self._refill()
+            # A request bigger than the whole bucket would otherwise wait forever
+            tokens = min(tokens, self.tpm * self.scale)
+            if self._tokens >= tokens and self._requests >= 1:
+                self._tokens -= tokens
+                self._requests -= 1
+                return
+            
+            token_wait = (tokens - self._tokens) / (self.tpm * self.scale) * 60
+            request_wait = (1 - self._requests) / (self.rpm * self.scale) * 60
+            await asyncio.sleep(max(token_wait, request_wait, 0.01))
+    
+    def shrink(self, factor: float = 0.5) -> None:
+        """Cut the allowed rate (multiplicative decrease)"""
+        self.scale = max(self.scale * factor, self.MIN_SCALE)
+        self._successes = 0
+        self._refill()
+    
+    def grow(self, factor: float = 1.1) -> None:
+        """Raise the allowed rate, up to the configured quota"""
+        self.scale = min(self.scale * factor, 1.0)
+    
+    def record_success(self) -> None:
+        """Count a successful request; grow the rate after a run of them"""
+        self._successes += 1
+        if self._successes >= self.GROW_AFTER:
+            self._successes = 0
+            self.grow()
+    
+    def update_from_headers(self, headers: Any) -> None:
+        """
+        Use OpenAI's remaining-quota headers as the exact bucket level.
+        
+        Args:
+            headers: Response headers (x-ratelimit-remaining-tokens/-requests)
+        """
+        try:
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            if remaining_tokens is not None:
+                self._tokens = min(self._tokens, float(remaining_tokens))
+            if remaining_requests is not None:
+                self._requests = min(self._requests, float(remaining_requests))
+        except (TypeError, ValueError):
+            pass  # Missing or malformed headers - keep the estimate
+
+# ============================================================================
+# SEMANTIC CACHE
+# ============================================================================
+
+class SemanticCache:
+    """
+    Cache keyed by meaning rather than exact text.
+    
+    Stores L2-normalized query embeddings in one float32 matrix; a lookup
+    is a single matrix-vector product, and the stored value for the most
+    similar earlier query is returned if its cosine similarity reaches the
+    threshold. Used to reuse answers for paraphrased questions
+    ("What's France's capital?" vs "Capital of France?").
+    
+    The matrix starts small and doubles as entries are added; once it
+    holds max_entries, the oldest entry is overwritten. Safe to share
+    between threads (chat requests run in worker threads).
+    """
+    
+    def __init__(self, dimension: int, threshold: float = 0.97, max_entries: int = 10_000,
+                 initial_capacity: int = 64):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors = np.zeros((min(initial_capacity, max_entries), dimension), dtype=np.float32)
+        self._values: List[Any] = []
+        self._count = 0  # Total entries ever added (slot = count % max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # Keeps _vectors, _values and _count in step
+    
+    def __len__(self) -> int:
+        return min(self._count, self.max_entries)
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> "np.ndarray":
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+    
+    def lookup(self, embedding: List[float]) -> Optional[Tuple[Any, float]]:
+        """
+        Find the stored value for the most similar earlier embedding.
+        
+        Args:
+            embedding: Query embedding
+            
+        Returns:
+            (value, similarity) if a match reaches the threshold, else None
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            size = len(self)
+            if size:
+                similarities = self._vectors[:size] @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    return self._values[best], float(similarities[best])
+            self.misses += 1
+            return None
+    
+    def add(self, embedding: List[float], value: Any) -> None:
+        """
+        Store a value under an embedding.
+        
+        Args:
+            embedding: Query embedding
+            value: Anything to return for similar future queries
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            slot = self._count % self.max_entries
+            if slot == len(self._vectors):
+                grown = np.zeros((min(2 * slot, self.max_entries), self._vectors.shape[1]), dtype=np.float32)
+                grown[:slot] = self._vectors
+                self._vectors = grown
+            self._vectors[slot] = vector
+            if slot == len(self._values):
+                self._values.append(value)
+            else:
+                self._values[slot] = value
+            self._count += 1
+
 # ============================================================================
 # EMBEDDINGS SERVICE CLASS - FIXED VERSION
 # ============================================================================
@@ -57,7 +393,7 @@ class EmbeddingsService:
         Initialize the embeddings service with OpenAI client.
         FIXED: Set all attributes BEFORE calling any methods that use them
         """
-        print("\n[EmbeddingsService] Initializing...")
+        logger.debug("Initializing...")
         
         # STEP 1: Initialize ALL attributes FIRST (before any method calls)
         # This prevents "attribute not found" errors
@@ -71,13 +407,26 @@ class EmbeddingsService:
         self.total_tokens_used = 0
         self.total_api_calls = 0
         
-        # Client attribute (will be set below)
+        # Paces batch requests to the account's embedding quota
+        self._limiter = TokenBucket(tpm=settings.openai_tpm, rpm=settings.openai_rpm)
+        
+        # Embedding cache: in-process LRU in front of an SQLite file, keyed
+        # by SHA-256 of model + cleaned text, so repeated chunks skip the API
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._mem_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._cache_lock = threading.Lock()  # Fallback requests run in worker threads
+        self._disk_cache = self._open_disk_cache(settings.embedding_cache_path)
+        self._query_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()  # Chat requests run in worker threads
+        
+        # Client attributes (will be set below)
         self.client = None
+        self.aclient = None  # Async client for concurrent batch requests
+        self._http_client = None  # Pooled (HTTP/2) transport behind aclient
         
-        print(f"[EmbeddingsService] Configuration loaded:")
-        print(f"  - Model: {self.embedding_model}")
-        print(f"  - Dimension: {self.embedding_dimension}")
-        print(f"  - Cost: ${self.cost_per_1k_tokens:.5f} per 1K tokens")
+        logger.debug("Configuration loaded: model %s, dimension %d, $%.5f per 1K tokens",
+                     self.embedding_model, self.embedding_dimension, self.cost_per_1k_tokens)
         
         # STEP 2: Check if OpenAI SDK is available
         if not OPENAI_AVAILABLE:
@@ -85,37 +434,306 @@ class EmbeddingsService:
         
         # STEP 3: Check and validate API key
         if not settings.openai_api_key:
-            print("[EmbeddingsService] ⚠️  WARNING: OpenAI API key not set!")
-            print("[EmbeddingsService] Set OPENAI_API_KEY in your .env file")
-            print("[EmbeddingsService] Get your key from: https://platform.openai.com/api-keys")
+            logger.warning("OpenAI API key not set - set OPENAI_API_KEY in your .env file "
+                           "(get a key from https://platform.openai.com/api-keys)")
             # Leave client as None - methods will check for this
         else:
             # STEP 4: Initialize OpenAI client (AFTER all attributes are set)
             try:
-                print("[EmbeddingsService] Initializing OpenAI client...")
-                self.client = OpenAI(api_key=settings.openai_api_key)
-                print(f"[EmbeddingsService] ✅ OpenAI client initialized")
+                logger.debug("Initializing OpenAI client...")
+                # SDK retries are disabled - retries go through _retry_delay()
+                # so Retry-After and jitter are handled in one place
+                self.client = OpenAI(api_key=settings.openai_api_key, max_retries=0)
+                self._http_client = httpx.AsyncClient(
+                    http2=HTTP2_AVAILABLE,
+                    limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                        max_keepalive_connections=HTTP_MAX_KEEPALIVE),
+                    timeout=httpx.Timeout(30.0, connect=5.0)
+                )
+                self.aclient = AsyncOpenAI(api_key=settings.openai_api_key, max_retries=0,
+                                           http_client=self._http_client)
+                logger.debug("OpenAI client initialized")
                 
                 # STEP 5: Test the API key (now all attributes are available)
-                if self._test_api_key():
-                    print("[EmbeddingsService] ✅ API connection verified")
+                if not settings.verify_openai_key:
+                    logger.debug("API key test disabled (VERIFY_OPENAI_KEY=false)")
+                elif self._test_api_key():
+                    logger.info("OpenAI API connection verified")
                 else:
-                    print("[EmbeddingsService] ⚠️  API test failed, but continuing...")
+                    logger.warning("OpenAI API test failed, but continuing...")
                     
             except Exception as e:
-                print(f"[EmbeddingsService] ❌ Failed to initialize OpenAI client: {e}")
+                logger.error("Failed to initialize OpenAI client: %s", e)
                 self.client = None
+                self.aclient = None
+                self._http_client = None
+        
+        logger.debug("Initialization complete")
+    
+    async def aclose(self) -> None:
+        """Close the async client's pooled connections (call on shutdown)"""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+            self.aclient = None
+    
+    def _open_disk_cache(self, path: str) -> Optional[sqlite3.Connection]:
+        """
+        Open (and create if needed) the SQLite embedding cache.
+        
+        Args:
+            path: SQLite file path; empty string disables the disk cache
+            
+        Returns:
+            Connection, or None if disabled or unavailable
+        """
+        if not path:
+            return None
+        try:
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER, vec BLOB)")
+            conn.commit()
+            logger.debug("Embedding cache: %s", path)
+            return conn
+        except sqlite3.Error as e:
+            logger.warning("Embedding cache unavailable (%s), using memory only", e)
+            return None
+    
+    def _cache_key(self, cleaned_text: str) -> str:
+        """Cache key for a cleaned text under the current model"""
+        return hashlib.sha256(f"{self.embedding_model}|{cleaned_text}".encode('utf-8')).hexdigest()
+    
+    def _cache_get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up cached embeddings, memory first, then disk.
+        
+        Args:
+            keys: Cache keys to look up
+            
+        Returns:
+            Dictionary of key -> float32 embedding for the keys that were found
+        """
+        found = {}
+        with self._cache_lock:
+            for key in keys:
+                embedding = self._mem_cache.get(key)
+                if embedding is not None:
+                    self._mem_cache.move_to_end(key)
+                    found[key] = embedding
+            missing = [key for key in keys if key not in found]
+            
+            if missing and self._disk_cache is not None:
+                # Stay well under SQLite's bound-parameter limit
+                for i in range(0, len(missing), 500):
+                    part = missing[i:i + 500]
+                    rows = self._disk_cache.execute(
+                        f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                        part
+                    )
+                    for key, blob in rows:
+                        found[key] = np.frombuffer(blob, dtype=np.float32)
+                        self._mem_cache_store(key, found[key])
+        
+        return found
+    
+    def _mem_cache_store(self, key: str, embedding: np.ndarray) -> None:
+        """Add to the in-memory LRU, evicting the oldest entry (caller holds _cache_lock)"""
+        self._mem_cache[key] = embedding
+        self._mem_cache.move_to_end(key)
+        if len(self._mem_cache) > MEM_CACHE_SIZE:
+            self._mem_cache.popitem(last=False)  # Least recently used
+    
+    def _cache_put_many(self, items: List[Tuple[str, Any]]) -> None:
+        """
+        Store new embeddings in memory and on disk (as packed float32).
+        
+        Args:
+            items: (key, embedding) pairs; embeddings may be lists or arrays
+        """
+        if not items:
+            return
+        items = [(key, np.asarray(embedding, dtype=np.float32)) for key, embedding in items]
+        with self._cache_lock:
+            for key, embedding in items:
+                self._mem_cache_store(key, embedding)
+        
+        if self._disk_cache is not None:
+            try:
+                with self._cache_lock:
+                    self._disk_cache.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, dim, vec) VALUES (?, ?, ?)",
+                        [(key, len(embedding), embedding.tobytes()) for key, embedding in items]
+                    )
+                    self._disk_cache.commit()
+            except sqlite3.Error as e:
+                logger.warning("Could not write embedding cache: %s", e)
+    
+    @staticmethod
+    def _prepare_texts(texts: List[str], known_token_counts: Optional[List[Optional[int]]] = None
+                       ) -> Tuple[List[str], List[int]]:
+        """
+        Clean texts (remove excess whitespace, cap inputs at the model's
+        token limit) and count tokens once for packing and rate limiting.
+        
+        Args:
+            texts: Texts to embed
+            known_token_counts: Token counts already computed by the caller
+                (e.g. DocumentChunk.token_count); those texts are only
+                re-tokenized if they might exceed the input limit
+        
+        Returns:
+            (cleaned texts, token count of each)
+        """
+        cleaned_texts = []
+        token_counts = []
+        for i, text in enumerate(texts):
+            cleaned = clean_text(text)
+            if not cleaned:
+                cleaned = "empty"  # Placeholder for empty texts
+            known = known_token_counts[i] if known_token_counts else None
+            if known is not None and known <= MAX_INPUT_TOKENS:
+                tokens = known
+            else:
+                cleaned, tokens = truncate_to_limit(cleaned)
+            cleaned_texts.append(cleaned)
+            token_counts.append(tokens)
+        return cleaned_texts, token_counts
+    
+    @staticmethod
+    def _pack_batches(indices: List[int], token_counts: List[int], batch_size: int) -> List[Tuple[int, int]]:
+        """
+        Pack consecutive texts into batches by input count and token budget.
+        
+        Args:
+            indices: Texts to send (indices into token_counts)
+            token_counts: Token count of every text
+            batch_size: Maximum number of texts in each API call
+            
+        Returns:
+            (start, end) slices of indices, one per API call
+        """
+        batch_ranges = []
+        batch_start = 0
+        batch_tokens = 0
+        for pos, i in enumerate(indices):
+            tokens = token_counts[i]
+            if pos > batch_start and (pos - batch_start >= batch_size or batch_tokens + tokens > MAX_BATCH_TOKENS):
+                batch_ranges.append((batch_start, pos))
+                batch_start = pos
+                batch_tokens = 0
+            batch_tokens += tokens
+        if batch_start < len(indices):
+            batch_ranges.append((batch_start, len(indices)))
+        return batch_ranges
+    
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Decide whether (and how long) to wait before retrying a failed call.
+        
+        - 429 / 5xx: wait for Retry-After if the response has one, otherwise
+          RETRY_BASE_DELAY * 2**attempt scaled by a random 0.5-1.5 jitter
+        - Other 4xx (bad request, auth, ...): don't retry
+        - Connection errors / timeouts: back off like a 5xx
         
-        print("[EmbeddingsService] ✅ Initialization complete\n")
+        Args:
+            error: The exception raised by the API call
+            attempt: 0-based attempt number that just failed
+            
+        Returns:
+            Seconds to wait, or None if the error is not worth retrying
+        """
+        if isinstance(error, APIStatusError):
+            if error.status_code != 429 and error.status_code < 500:
+                return None
+            retry_after = error.response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return min(float(retry_after), MAX_RETRY_DELAY)
+                except ValueError:
+                    pass  # HTTP-date form - fall back to backoff
+        
+        delay = RETRY_BASE_DELAY * (2 ** attempt) * random.uniform(0.5, 1.5)
+        return min(delay, MAX_RETRY_DELAY)
+    
+    def _create_embeddings(self, inputs: List[str], retry_count: int = 3):
+        """
+        Sync embeddings.create() with the same retry policy as the async path
+        (not paced by the limiter, which belongs to the event loop).
+        
+        Args:
+            inputs: Cleaned texts to embed
+            retry_count: Maximum number of attempts
+            
+        Returns:
+            The API response (raises the last error if every attempt fails)
+        """
+        for attempt in range(retry_count):
+            try:
+                return self.client.embeddings.create(
+                    model=self.embedding_model,
+                    input=inputs,
+                    encoding_format="base64"
+                )
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None or attempt == retry_count - 1:
+                    raise
+                logger.info("Batch attempt %d failed (%s), retrying in %.1fs", attempt + 1, e, delay)
+                time.sleep(delay)
+    
+    async def _acreate_embeddings(self, inputs: List[str], input_tokens: int, retry_count: int = 3):
+        """
+        Async embeddings.create() with the same retry policy as the single path,
+        paced by the token-bucket limiter.
+        
+        Args:
+            inputs: Cleaned texts to embed
+            input_tokens: Total tokens in inputs (for the rate limiter)
+            retry_count: Maximum number of attempts
+            
+        Returns:
+            The API response (raises the last error if every attempt fails)
+        """
+        for attempt in range(retry_count):
+            await self._limiter.acquire(input_tokens)
+            try:
+                raw_response = await self.aclient.embeddings.with_raw_response.create(
+                    model=self.embedding_model,
+                    input=inputs,
+                    encoding_format="base64"
+                )
+                self._limiter.update_from_headers(raw_response.headers)
+                self._limiter.record_success()
+                return raw_response.parse()
+            except Exception as e:
+                if isinstance(e, APIStatusError) and e.status_code == 429:
+                    self._limiter.shrink()
+                delay = self._retry_delay(e, attempt)
+                if delay is None or attempt == retry_count - 1:
+                    raise
+                logger.info("Batch attempt %d failed (%s), retrying in %.1fs", attempt + 1, e, delay)
+                await asyncio.sleep(delay)
     
     def _test_api_key(self):
         """
         Test if the OpenAI API key is valid by making a minimal request.
         FIXED: Now safely uses self.embedding_model which is guaranteed to exist
+        
+        Success is cached for API_KEY_CHECK_TTL seconds per key + model.
         """
+        key_hash = hashlib.sha256(
+            (settings.openai_api_key + self.embedding_model).encode('utf-8')
+        ).hexdigest()[:16]
+        marker = os.path.join(tempfile.gettempdir(), f".embed_key_ok_{key_hash}")
         try:
-            # Debug: Show what we're testing with
-            print(f"[EmbeddingsService] Testing API key with model: {self.embedding_model}")
+            if os.stat(marker).st_mtime > time.time() - API_KEY_CHECK_TTL:
+                logger.debug("API key verified recently, skipping test request")
+                return True
+        except OSError:
+            pass
+        
+        try:
+            logger.debug("Testing API key with model: %s", self.embedding_model)
             
             # Make a test embedding request with minimal text
             response = self.client.embeddings.create(
@@ -126,12 +744,16 @@ class EmbeddingsService:
             
             # Verify the response
             if response and response.data and len(response.data) > 0:
-                embedding_dim = len(response.data[0].embedding)
-                print(f"[EmbeddingsService] ✅ API key is valid!")
-                print(f"[EmbeddingsService] Test embedding dimension: {embedding_dim}")
+                logger.debug("API key is valid, test embedding dimension: %d",
+                             len(response.data[0].embedding))
+                try:
+                    with open(marker, 'a'):
+                        os.utime(marker)
+                except OSError:
+                    pass  # Only costs a test request next time
                 return True
             else:
-                print("[EmbeddingsService] ⚠️  Unexpected response format")
+                logger.warning("Unexpected response format from API key test")
                 return False
                 
         except Exception as e:
@@ -139,19 +761,49 @@ class EmbeddingsService:
             
             # Detailed error analysis
             if "api_key" in error_msg.lower() or "unauthorized" in error_msg.lower():
-                print("[EmbeddingsService] ❌ Invalid API key!")
-                print("[EmbeddingsService] Please check your OpenAI API key in .env file")
+                logger.error("Invalid OpenAI API key - check OPENAI_API_KEY in your .env file")
             elif "quota" in error_msg.lower() or "insufficient_quota" in error_msg.lower():
-                print("[EmbeddingsService] ⚠️  API key valid but quota exceeded")
-                print("[EmbeddingsService] Add credits at: https://platform.openai.com/billing")
+                logger.warning("OpenAI API key valid but quota exceeded - add credits at "
+                               "https://platform.openai.com/billing")
             elif "model" in error_msg.lower():
-                print(f"[EmbeddingsService] ❌ Model '{self.embedding_model}' not available")
-                print("[EmbeddingsService] Try using 'text-embedding-ada-002' instead")
+                logger.error("Model '%s' not available - try 'text-embedding-ada-002' instead",
+                             self.embedding_model)
             else:
-                print(f"[EmbeddingsService] ❌ API test failed: {e}")
+                logger.error("API test failed: %s", e)
             
             return False
     
+    def get_query_embedding(self, query: str) -> Optional[List[float]]:
+        """
+        Embedding for a search query, served from an in-process LRU keyed by
+        the normalised query (whitespace-collapsed, lowercased) so repeated
+        questions skip the API round-trip entirely. The lowercased form is
+        only the key; the model sees the query with its original case, as
+        it sees the document chunks.
+        
+        Args:
+            query: The user's question
+            
+        Returns:
+            List of floats (embedding vector) or None if failed
+        """
+        cleaned = clean_text(query)
+        key = cleaned.lower()
+        with self._query_cache_lock:
+            embedding = self._query_cache.get(key)
+            if embedding is not None:
+                self._query_cache.move_to_end(key)
+                return embedding
+        
+        # API call outside the lock so other queries aren't held up
+        embedding = self.generate_embedding(cleaned)
+        if embedding is not None:
+            with self._query_cache_lock:
+                self._query_cache[key] = embedding
+                if len(self._query_cache) > QUERY_CACHE_SIZE:
+                    self._query_cache.popitem(last=False)  # Least recently used
+        return embedding
+    
     def generate_embedding(self, text: str, retry_count: int = 3) -> Optional[List[float]]:
         """
         Generate embedding for a single text.
@@ -163,186 +815,374 @@ class EmbeddingsService:
         Returns:
             List of floats (embedding vector) or None if failed
         """
-        # Debug: Show what we're embedding
-        preview = text[:100] + "..." if len(text) > 100 else text
-        print(f"\n[EmbeddingsService] Generating embedding for text:")
-        print(f"  Preview: {preview}")
-        print(f"  Length: {len(text)} characters")
-        
         # Check if client is available
         if not self.client:
-            print("[EmbeddingsService] ❌ OpenAI client not initialized!")
-            print("[EmbeddingsService] Check your API key in .env file")
+            logger.error("OpenAI client not initialized - check your API key in .env file")
             return None
         
         # Clean the text (remove excess whitespace)
-        text = " ".join(text.split())
+        text = clean_text(text)
         
         # Check if text is empty
         if not text or len(text.strip()) == 0:
-            print("[EmbeddingsService] ⚠️  Empty text, skipping")
+            logger.debug("Empty text, skipping")
             return None
         
+        # Cut oversize input now instead of waiting for a context_length error
+        text, token_count = truncate_to_limit(text)
+        
+        # Reuse a cached embedding for the same text and model
+        cache_key = self._cache_key(text)
+        cached = self._cache_get_many([cache_key])
+        if cached:
+            self.cache_hits += 1
+            return cached[cache_key].tolist()
+        self.cache_misses += 1
+        
         # Try to generate embedding with retries
         for attempt in range(retry_count):
             try:
                 # Make API call
-                print(f"[EmbeddingsService] API call attempt {attempt + 1}/{retry_count}...")
-                
                 response = self.client.embeddings.create(
                     model=self.embedding_model,
                     input=text,
-                    encoding_format="float"
+                    encoding_format="base64"
                 )
                 
-                # Extract embedding
-                embedding = response.data[0].embedding
+                # Extract embedding (packed float32, decoded in one step)
+                vector = _decode_embedding(response.data[0])
+                self._cache_put_many([(cache_key, vector)])
+                embedding = vector.tolist()
                 
-                # Track usage
+                # Track usage (billed tokens from the API when reported)
                 self.total_api_calls += 1
-                # Estimate tokens (rough approximation: 1 token ≈ 4 characters)
-                estimated_tokens = len(text) / 4
+                estimated_tokens = response.usage.total_tokens if response.usage else token_count
                 self.total_tokens_used += estimated_tokens
                 
                 # Calculate cost
                 cost = (estimated_tokens / 1000) * self.cost_per_1k_tokens
                 
-                print(f"[EmbeddingsService] ✅ Embedding generated successfully!")
-                print(f"  - Vector dimension: {len(embedding)}")
-                print(f"  - Estimated tokens: {estimated_tokens:.0f}")
-                print(f"  - Estimated cost: ${cost:.6f}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Embedding generated: dim=%d tokens=%d cost=$%.6f",
+                                 len(embedding), estimated_tokens, cost)
                 
                 return embedding
                 
             except Exception as e:
-                print(f"[EmbeddingsService] ❌ Attempt {attempt + 1} failed: {e}")
+                logger.info("Embedding attempt %d/%d failed: %s", attempt + 1, retry_count, e)
                 
                 # Check for specific errors
                 error_msg = str(e)
-                if "rate_limit" in error_msg.lower():
-                    # Rate limit hit - wait before retry
-                    wait_time = 2 ** attempt  # Exponential backoff: 1, 2, 4 seconds
-                    print(f"[EmbeddingsService] Rate limit hit, waiting {wait_time} seconds...")
-                    time.sleep(wait_time)
-                elif "context_length" in error_msg.lower():
+                if "context_length" in error_msg.lower():
                     # Text too long
-                    print(f"[EmbeddingsService] Text too long for model!")
-                    print(f"[EmbeddingsService] Max length is ~8000 tokens (32000 chars)")
-                    # Try truncating the text
+                    logger.warning("Text too long for model (max %d tokens)", MAX_INPUT_TOKENS)
+                    # Try truncating the text (only reachable if the token
+                    # count above was an estimate)
                     if len(text) > 30000:  # Roughly 7500 tokens
                         text = text[:30000]
-                        print(f"[EmbeddingsService] Truncated text to {len(text)} characters")
-                    else:
-                        return None
-                elif attempt < retry_count - 1:
-                    # Generic error - wait and retry
-                    time.sleep(1)
-                else:
+                        token_count = count_tokens(text)
+                        logger.info("Truncated text to %d characters", len(text))
+                        continue
+                    return None
+                
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    logger.error("Embedding failed with a non-retryable error: %s", e)
+                    return None
+                if attempt == retry_count - 1:
                     # Final attempt failed
-                    print(f"[EmbeddingsService] All attempts failed!")
+                    logger.error("Embedding failed after %d attempts: %s", retry_count, e)
                     return None
+                
+                time.sleep(delay)
         
         return None
     
-    def generate_embeddings_batch(self, texts: List[str], batch_size: int = 20) -> List[Optional[List[float]]]:
+    def generate_embeddings_batch(self, texts: List[str], batch_size: int = MAX_BATCH_INPUTS) -> List[Optional[List[float]]]:
         """
-        Generate embeddings for multiple texts efficiently.
-        
-        OpenAI allows batching up to 2048 embedding inputs in a single request,
-        but we use smaller batches for better error handling.
+        Synchronous counterpart of agenerate_embeddings_batch() for scripts
+        and tests. Same cleaning, cache and batch packing, but the batches
+        are sent one at a time with the sync client: the async client's
+        connection pool belongs to the app's event loop, so it can't be
+        driven from a throwaway asyncio.run() loop.
         
         Args:
             texts: List of texts to embed
-            batch_size: Number of texts to process in each API call
+            batch_size: Maximum number of texts in each API call
             
         Returns:
             List of embeddings (same order as input texts)
         """
-        print(f"\n{'='*60}")
-        print(f"[EmbeddingsService] Batch Embedding Generation")
-        print(f"  Total texts: {len(texts)}")
-        print(f"  Batch size: {batch_size}")
-        print(f"  Estimated batches: {(len(texts) + batch_size - 1) // batch_size}")
-        print(f"{'='*60}")
+        batch_size = min(batch_size, MAX_BATCH_INPUTS)
+        cleaned_texts, token_counts = self._prepare_texts(texts)
         
-        # Check if client is available
-        if not self.client:
-            print("[EmbeddingsService] ❌ OpenAI client not initialized!")
-            return [None] * len(texts)
+        keys = [self._cache_key(cleaned) for cleaned in cleaned_texts]
+        cached = self._cache_get_many(keys)
+        embeddings: List[Optional[Any]] = [cached.get(key) for key in keys]
+        miss_indices = [i for i, key in enumerate(keys) if key not in cached]
+        self.cache_hits += len(texts) - len(miss_indices)
+        self.cache_misses += len(miss_indices)
+        
+        if miss_indices and not self.client:
+            logger.error("OpenAI client not initialized - check your API key in .env file")
+            miss_indices = []
+        
+        batch_ranges = self._pack_batches(miss_indices, token_counts, batch_size)
+        for batch_num, (start, end) in enumerate(batch_ranges, 1):
+            indices = miss_indices[start:end]
+            batch_tokens = sum(token_counts[i] for i in indices)
+            try:
+                response = self._create_embeddings([cleaned_texts[i] for i in indices])
+            except Exception as e:
+                logger.warning("Batch %d/%d: %d text(s) failed: %s",
+                               batch_num, len(batch_ranges), len(indices), e)
+                continue
+            
+            batch_embeddings = [_decode_embedding(item) for item in response.data]
+            self.total_api_calls += 1
+            self.total_tokens_used += response.usage.total_tokens if response.usage else batch_tokens
+            self._cache_put_many([(keys[i], embedding) for i, embedding in zip(indices, batch_embeddings)])
+            for i, embedding in zip(indices, batch_embeddings):
+                embeddings[i] = embedding
         
-        embeddings = []
+        results: List[Optional[List[float]]] = []
+        for embedding in embeddings:
+            if embedding is None or len(embedding) != self.embedding_dimension:
+                results.append(None)
+            else:
+                row = np.array(embedding, dtype=np.float32).reshape(1, -1)
+                results.append(l2_normalize(row)[0].tolist())
+        return results
+    
+    async def agenerate_embeddings_batch(self, texts: List[str], batch_size: int = MAX_BATCH_INPUTS,
+                                         max_concurrency: int = MAX_CONCURRENT_BATCHES) -> List[Optional[List[float]]]:
+        """
+        List-of-lists form of agenerate_embedding_matrix(), for callers that
+        expect one Python list per text (None where embedding failed).
         
-        # Process in batches
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            total_batches = (len(texts) + batch_size - 1) // batch_size
+        Args:
+            texts: List of texts to embed
+            batch_size: Maximum number of texts in each API call (max 2048)
+            max_concurrency: Maximum number of batch requests in flight
             
-            print(f"\n[EmbeddingsService] Processing batch {batch_num}/{total_batches}")
-            print(f"  Texts in batch: {len(batch_texts)}")
+        Returns:
+            List of embeddings (same order as input texts)
+        """
+        matrix, embedded = await self.agenerate_embedding_matrix(texts, batch_size, max_concurrency)
+        return [row.tolist() if ok else None for row, ok in zip(matrix, embedded)]
+    
+    async def agenerate_embedding_matrix(self, texts: List[str], batch_size: int = MAX_BATCH_INPUTS,
+                                         max_concurrency: int = MAX_CONCURRENT_BATCHES,
+                                         token_counts: Optional[List[Optional[int]]] = None
+                                         ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Generate embeddings for multiple texts efficiently.
+        
+        Collects iter_embeddings() into one contiguous float32 matrix rather
+        than a list of Python float lists (~6 KB per 1536-d vector instead of
+        ~45 KB). Callers that don't need every vector at once should use
+        iter_embeddings() directly.
+        
+        Args:
+            texts: List of texts to embed
+            batch_size: Maximum number of texts in each API call (max 2048)
+            max_concurrency: Maximum number of batch requests in flight
+            token_counts: Known token count of each text (None entries are counted here)
             
-            # Clean texts in batch
-            cleaned_batch = []
-            for text in batch_texts:
-                cleaned = " ".join(text.split())
-                if cleaned and len(cleaned.strip()) > 0:
-                    cleaned_batch.append(cleaned)
-                else:
-                    cleaned_batch.append("empty")  # Placeholder for empty texts
+        Returns:
+            Tuple of (matrix of shape (len(texts), embedding_dimension),
+            boolean mask of rows that were embedded successfully)
+        """
+        matrix = np.zeros((len(texts), self.embedding_dimension), dtype=np.float32)
+        embedded = np.zeros(len(texts), dtype=bool)
+        
+        async for indices, rows in self.iter_embeddings(texts, batch_size, max_concurrency, token_counts):
+            matrix[indices] = rows
+            embedded[indices] = True
+        
+        return matrix, embedded
+    
+    async def iter_embeddings(self, texts: List[str], batch_size: int = MAX_BATCH_INPUTS,
+                              max_concurrency: int = MAX_CONCURRENT_BATCHES,
+                              token_counts: Optional[List[Optional[int]]] = None
+                              ) -> AsyncIterator[Tuple[List[int], np.ndarray]]:
+        """
+        Embed texts and yield the results batch by batch as they arrive.
+        
+        Texts are packed greedily into as few API calls as possible: a batch
+        is closed when it reaches batch_size inputs or MAX_BATCH_TOKENS
+        tokens. Up to max_concurrency batches are in flight at a time, and a
+        new one is only started once the consumer has taken a finished one,
+        so memory stays at a few batches however many texts there are.
+        Cached texts are yielded first.
+        
+        Args:
+            texts: List of texts to embed
+            batch_size: Maximum number of texts in each API call (max 2048)
+            max_concurrency: Maximum number of batch requests in flight
+            token_counts: Known token count of each text (None entries are counted here)
             
+        Yields:
+            Tuples of (indices into texts, float32 matrix with one
+            L2-normalised row per index). Texts that failed are never
+            yielded; batches may arrive out of order.
+        """
+        batch_size = min(batch_size, MAX_BATCH_INPUTS)
+        cleaned_texts, token_counts = self._prepare_texts(texts, token_counts)
+        
+        # Serve repeated texts from the cache; only misses go to the API.
+        # The cache does blocking SQLite I/O behind a threading.Lock that chat
+        # worker threads also take, so it is always called off the event loop
+        keys = [self._cache_key(cleaned) for cleaned in cleaned_texts]
+        cached = await asyncio.to_thread(self._cache_get_many, keys)
+        miss_indices = [i for i, key in enumerate(keys) if key not in cached]
+        self.cache_hits += len(texts) - len(miss_indices)
+        self.cache_misses += len(miss_indices)
+        
+        batch_ranges = self._pack_batches(miss_indices, token_counts, batch_size)
+        total_batches = len(batch_ranges)
+        
+        successful = 0
+        
+        def stack_rows(indices: List[int], embeddings: List[Optional[Any]]) -> Tuple[List[int], Optional[np.ndarray]]:
+            """Keep rows that exist and have the right size; stack and normalise them"""
+            kept, rows = [], []
+            for i, embedding in zip(indices, embeddings):
+                if embedding is None:
+                    continue
+                if len(embedding) != self.embedding_dimension:
+                    logger.warning("Text %d: got %d dimensions, expected %d",
+                                   i, len(embedding), self.embedding_dimension)
+                    continue
+                kept.append(i)
+                rows.append(embedding)
+            if not kept:
+                return kept, None
+            return kept, l2_normalize(np.array(rows, dtype=np.float32))
+        
+        # Cached rows first, in batch_size slices
+        cached_indices = [i for i, key in enumerate(keys) if key in cached]
+        for start in range(0, len(cached_indices), batch_size):
+            part = cached_indices[start:start + batch_size]
+            indices, matrix = stack_rows(part, [cached[keys[i]] for i in part])
+            if indices:
+                successful += len(indices)
+                yield indices, matrix
+        
+        if miss_indices and not self.aclient:
+            logger.error("OpenAI client not initialized - check your API key in .env file")
+            miss_indices, batch_ranges = [], []
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        pending = {}  # task -> indices of its batch
+        batch_iter = iter(enumerate(batch_ranges, 1))
+        
+        def start_batches() -> None:
+            """Top up in-flight batches to max_concurrency"""
+            while len(pending) < max_concurrency:
+                item = next(batch_iter, None)
+                if item is None:
+                    return
+                batch_num, (start, end) = item
+                indices = miss_indices[start:end]
+                task = asyncio.ensure_future(self._aembed_batch(
+                    [cleaned_texts[i] for i in indices],
+                    [token_counts[i] for i in indices],
+                    batch_num, total_batches, semaphore
+                ))
+                pending[task] = indices
+        
+        try:
+            start_batches()
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    batch_indices = pending.pop(task)
+                    results = task.result()
+                    indices, matrix = stack_rows(batch_indices, results)
+                    if not indices:
+                        continue
+                    # Cache the raw vectors (as returned by the API) - SQLite
+                    # write + commit, so in a worker thread like the lookup
+                    kept = set(indices)
+                    new_items = [(keys[i], embedding) for i, embedding
+                                 in zip(batch_indices, results) if i in kept]
+                    await asyncio.to_thread(self._cache_put_many, new_items)
+                    successful += len(indices)
+                    yield indices, matrix
+                start_batches()
+        finally:
+            # Consumer stopped early (or an error) - don't leave requests running
+            for task in pending:
+                task.cancel()
+        
+        # One summary line per call
+        logger.info("Embedded %d/%d texts (%d cached, %d batches, %d concurrent); "
+                    "totals: %d API calls, %d tokens, $%.6f",
+                    successful, len(texts), len(texts) - len(miss_indices), total_batches,
+                    max_concurrency, self.total_api_calls, self.total_tokens_used,
+                    (self.total_tokens_used / 1000) * self.cost_per_1k_tokens)
+    
+    async def _aembed_batch(self, cleaned_batch: List[str], token_counts: List[int],
+                            batch_num: int, total_batches: int,
+                            semaphore: asyncio.Semaphore) -> List[Optional[Any]]:
+        """
+        Embed one batch with a single API call.
+        
+        If the API rejects the batch as a bad request, the batch is split in
+        half and each half retried, so a single bad input is isolated in
+        O(log N) requests and every other text still gets its embedding.
+        Other failures (auth, exhausted retries) fail the whole batch.
+        
+        Args:
+            cleaned_batch: Cleaned texts sent to the API
+            token_counts: Token count of each text in cleaned_batch
+            batch_num: 1-based batch number (for progress output)
+            total_batches: Total number of batches
+            semaphore: Limits how many batch requests run at once
+            
+        Returns:
+            Embeddings for this batch, in order (None where a text failed)
+        """
+        async with semaphore:
             try:
                 # Make batch API call
-                print(f"[EmbeddingsService] Making batch API call...")
-                
-                response = self.client.embeddings.create(
-                    model=self.embedding_model,
-                    input=cleaned_batch,
-                    encoding_format="float"
-                )
+                batch_tokens = sum(token_counts)
+                response = await self._acreate_embeddings(cleaned_batch, batch_tokens)
                 
                 # Extract embeddings
-                batch_embeddings = [item.embedding for item in response.data]
+                batch_embeddings = [_decode_embedding(item) for item in response.data]
                 
                 # Track usage
                 self.total_api_calls += 1
-                estimated_tokens = sum(len(text) / 4 for text in cleaned_batch)
+                estimated_tokens = response.usage.total_tokens if response.usage else batch_tokens
                 self.total_tokens_used += estimated_tokens
                 
-                # Calculate cost
-                cost = (estimated_tokens / 1000) * self.cost_per_1k_tokens
-                
-                print(f"[EmbeddingsService] ✅ Batch {batch_num} completed!")
-                print(f"  - Embeddings generated: {len(batch_embeddings)}")
-                print(f"  - Estimated tokens: {estimated_tokens:.0f}")
-                print(f"  - Estimated cost: ${cost:.6f}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    cost = (estimated_tokens / 1000) * self.cost_per_1k_tokens
+                    logger.debug("Batch %d/%d: %d embeddings, %d tokens, $%.6f", batch_num,
+                                 total_batches, len(batch_embeddings), estimated_tokens, cost)
                 
-                embeddings.extend(batch_embeddings)
+                return batch_embeddings
                 
-                # Small delay to avoid rate limits
-                if i + batch_size < len(texts):
-                    time.sleep(0.1)
-                    
             except Exception as e:
-                print(f"[EmbeddingsService] ❌ Batch {batch_num} failed: {e}")
-                
-                # Fall back to individual processing for this batch
-                print(f"[EmbeddingsService] Falling back to individual processing...")
-                for text in batch_texts:
-                    embedding = self.generate_embedding(text, retry_count=2)
-                    embeddings.append(embedding)
-        
-        # Print summary
-        print(f"\n{'='*60}")
-        print(f"[EmbeddingsService] Batch Processing Complete!")
-        print(f"  Total embeddings: {len(embeddings)}")
-        print(f"  Successful: {sum(1 for e in embeddings if e is not None)}")
-        print(f"  Failed: {sum(1 for e in embeddings if e is None)}")
-        print(f"  Total API calls: {self.total_api_calls}")
-        print(f"  Total tokens used: {self.total_tokens_used:.0f}")
-        print(f"  Total estimated cost: ${(self.total_tokens_used / 1000) * self.cost_per_1k_tokens:.6f}")
-        print(f"{'='*60}\n")
-        
-        return embeddings
+                error = e
+        
+        bad_request = isinstance(error, APIStatusError) and error.status_code == 400
+        if not bad_request or len(cleaned_batch) == 1:
+            logger.warning("Batch %d/%d: %d text(s) failed: %s",
+                           batch_num, total_batches, len(cleaned_batch), error)
+            return [None] * len(cleaned_batch)
+        
+        # Bisect: retry each half (concurrently, still under the semaphore)
+        logger.info("Batch %d/%d rejected (%s), splitting %d texts",
+                    batch_num, total_batches, error, len(cleaned_batch))
+        mid = len(cleaned_batch) // 2
+        left, right = await asyncio.gather(
+            self._aembed_batch(cleaned_batch[:mid], token_counts[:mid], batch_num, total_batches, semaphore),
+            self._aembed_batch(cleaned_batch[mid:], token_counts[mid:], batch_num, total_batches, semaphore)
+        )
+        return left + right
     
 # ============================================================================
 # UTILITY FUNCTIONS FOR TESTING
@@ -358,9 +1198,9 @@ class EmbeddingsService:
         Returns:
             Dictionary with cost breakdown
         """
-        # Estimate tokens (1 token ≈ 4 characters)
-        total_chars = sum(len(text) for text in texts)
-        estimated_tokens = total_chars / 4
+        # Count tokens (tiktoken when available, else 1 token ≈ 4 characters)
+        total_chars = sum(map(len, texts))
+        estimated_tokens = sum(map(count_tokens, texts))
         
         # Calculate cost
         estimated_cost = (estimated_tokens / 1000) * self.cost_per_1k_tokens
@@ -368,12 +1208,26 @@ class EmbeddingsService:
         return {
             'text_count': len(texts),
             'total_characters': total_chars,
-            'estimated_tokens': int(estimated_tokens),
+            'estimated_tokens': estimated_tokens,
             'estimated_cost_usd': round(estimated_cost, 6),
             'model': self.embedding_model,
             'price_per_1k_tokens': self.cost_per_1k_tokens
         }
 
+# ============================================================================
+# FASTAPI DEPENDENCY
+# ============================================================================
+
+def get_embeddings(request: Request) -> Optional[EmbeddingsService]:
+    """
+    Dependency function to get the shared embeddings service.
+    Created once in main.py's lifespan and kept on app.state.
+    
+    Returns:
+        EmbeddingsService, or None if it failed to initialize
+    """
+    return getattr(request.app.state, "embeddings", None)
+
 def test_embeddings_service():
     """
     Test the embeddings service with sample texts.
@@ -432,13 +1286,10 @@ def test_embeddings_service():
         # Check similarity (embeddings of similar texts should be more similar)
         if len(embeddings) >= 2 and embeddings[0] and embeddings[1]:
             # Calculate cosine similarity between first two embeddings
-            import math
-            
             def cosine_similarity(v1, v2):
-                dot_product = sum(a * b for a, b in zip(v1, v2))
-                magnitude1 = math.sqrt(sum(a * a for a in v1))
-                magnitude2 = math.sqrt(sum(b * b for b in v2))
-                return dot_product / (magnitude1 * magnitude2)
+                v1 = np.asarray(v1, dtype=np.float32)
+                v2 = np.asarray(v2, dtype=np.float32)
+                return float(v1 @ v2 / (np.linalg.norm(v1) * np.linalg.norm(v2)))
             
             similarity = cosine_similarity(embeddings[0], embeddings[1])
             print(f"  - Similarity between first two texts: {similarity:.4f}")
@@ -461,4 +1312,5 @@ def test_embeddings_service():
 
 # Run test if executed directly
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(name)s - %(levelname)s - %(message)s')
     test_embeddings_service()
\ No newline at end of file
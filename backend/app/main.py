@@ -17,6 +17,7 @@ try:
     from fastapi.middleware.cors import CORSMiddleware
     from fastapi.responses import JSONResponse
     from contextlib import asynccontextmanager
+    import asyncio
     import time
     import logging
     from typing import Dict, Any
@@ -26,6 +27,8 @@ try:
     from app.config import settings
     from app.database import init_db, test_connection, engine
     from app.models import HealthStatus
+    from app.embeddings_service import EmbeddingsService
+    from app.pinecone_service import PineconeService
 
     # Import API routers (we'll create these next)
     # from app.api import projects, documents, chat
@@ -43,6 +46,16 @@ except ImportError as e:
 # Import API routers (we'll create these next)
 from app.api import projects, documents, chat
 
+# orjson serialises responses several times faster than json.dumps (and
+# handles numpy arrays); fall back to the stock JSONResponse without it
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+    print("[Main] ✅ orjson available - using ORJSONResponse")
+except ImportError:
+    DefaultResponse = JSONResponse
+    print("[Main] ⚠️  orjson not available - using JSONResponse")
+
 
 # Configure logging
 logging.basicConfig(
@@ -51,6 +64,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def _init_pinecone(app: FastAPI) -> None:
+    """Create the shared PineconeService off the event loop and publish it on app.state"""
+    try:
+        logger.info("Initializing Pinecone...")
+        service = await asyncio.to_thread(PineconeService)
+    except Exception as e:
+        logger.error(f"Pinecone initialization failed: {e}")
+        return
+    
+    if service.index is None:
+        logger.error("❌ Pinecone index not available")
+        return
+    app.state.pinecone = service
+    logger.info("✅ Pinecone ready")
+
 # Application lifespan manager (replaces deprecated startup/shutdown events)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -77,21 +105,22 @@ async def lifespan(app: FastAPI):
         logger.error(f"Database initialization failed: {e}")
         # Don't raise - allow app to start for debugging
     
-    # Initialize Pinecone (we'll implement this later)
-    try:
-        logger.info("Initializing Pinecone...")
-        # TODO: Initialize Pinecone connection
-        logger.info("✅ Pinecone ready (mock)")
-    except Exception as e:
-        logger.error(f"Pinecone initialization failed: {e}")
+    # Connect to Pinecone in the background - creating and waiting for the
+    # index can take a while, and the API should start serving meanwhile
+    # (/health reports pinecone: false until it is ready; meanwhile uploads
+    # are stored text-only and chat answers without document context)
+    app.state.pinecone = None
+    pinecone_task = asyncio.create_task(_init_pinecone(app))
     
-    # Test OpenAI connection
+    # Create the shared embeddings service (one OpenAI client and cache for
+    # all requests, injected with Depends(get_embeddings))
     try:
-        logger.info("Testing OpenAI connection...")
-        # TODO: Test OpenAI API
-        logger.info("✅ OpenAI ready (mock)")
+        logger.info("Initializing embeddings service...")
+        app.state.embeddings = EmbeddingsService()
+        logger.info("✅ Embeddings service ready")
     except Exception as e:
-        logger.error(f"OpenAI connection failed: {e}")
+        app.state.embeddings = None
+        logger.error(f"Embeddings service initialization failed: {e}")
     
     logger.info("="*60)
     logger.info("✅ Application started successfully!")
@@ -102,6 +131,12 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     logger.info("Shutting down application...")
+    pinecone_task.cancel()
+    # Stop the chat service's history worker threads
+    chat.close_chat_service()
+    # Close the shared embeddings service's pooled OpenAI connections
+    if app.state.embeddings is not None:
+        await app.state.embeddings.aclose()
     # Close database connections
     engine.dispose()
     logger.info("✅ Application shut down cleanly")
@@ -113,7 +148,8 @@ app = FastAPI(
     description="Internal RAG Bot API for document Q&A",
     docs_url="/docs",  # Swagger UI
     redoc_url="/redoc",  # ReDoc UI
-    lifespan=lifespan  # Use lifespan manager
+    lifespan=lifespan,  # Use lifespan manager
+    default_response_class=DefaultResponse
 )
 
 # Configure CORS middleware
@@ -129,21 +165,23 @@ app.add_middleware(
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     """
-    Add processing time to response headers.
-    Useful for performance monitoring.
+    Add processing time to response headers (debug mode only) and log
+    slow requests. Uses the monotonic nanosecond clock.
     """
-    start_time = time.time()
+    start_ns = time.perf_counter_ns()
     
     # Process request
     response = await call_next(request)
     
     # Calculate processing time
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
+    elapsed_ns = time.perf_counter_ns() - start_ns
+    if settings.debug_mode:
+        response.headers["X-Process-Time"] = str(elapsed_ns / 1e9)
     
     # Log slow requests
-    if process_time > 1.0:  # Log requests taking more than 1 second
-        logger.warning(f"Slow request: {request.method} {request.url.path} took {process_time:.2f}s")
+    if elapsed_ns > 1_000_000_000:  # Log requests taking more than 1 second
+        logger.warning("Slow request: %s %s took %.2fs",
+                       request.method, request.url.path, elapsed_ns / 1e9)
     
     return response
 
@@ -178,12 +216,45 @@ async def root() -> Dict[str, Any]:
         "health": "/health"
     }
 
+# Database probe for /health - a successful probe is reused for
+# HEALTH_CACHE_TTL seconds so frequent liveness checks don't each hit the DB
+_HEALTH_STMT = text("SELECT 1")
+HEALTH_CACHE_TTL = 5.0  # seconds
+HEALTH_PROBE_TIMEOUT = 0.5  # seconds per probe - a slow dependency degrades, never hangs
+_db_last_ok = 0.0  # time.monotonic() of the last successful probe
+
+def _db_select_one() -> None:
+    """Blocking SELECT 1 (run in a worker thread)"""
+    with engine.connect() as conn:
+        conn.execute(_HEALTH_STMT)
+
+async def _probe_database() -> bool:
+    """Database probe (failures are never cached)"""
+    global _db_last_ok
+    if time.monotonic() - _db_last_ok >= HEALTH_CACHE_TTL:
+        await asyncio.to_thread(_db_select_one)
+        _db_last_ok = time.monotonic()
+    return True
+
+async def _probe_pinecone() -> bool:
+    """Pinecone probe - False until the background connection has finished"""
+    service = getattr(app.state, "pinecone", None)
+    return service is not None and service.index is not None
+
+async def _probe_openai() -> bool:
+    """OpenAI probe (mock for now)"""
+    # TODO: Add actual OpenAI health check
+    return True
+
 # Health check endpoint
 @app.get("/health", response_model=HealthStatus, tags=["Health"])
 async def health_check() -> HealthStatus:
     """
     Health check endpoint for monitoring.
     Returns status of all services.
+    
+    Probes run concurrently, each bounded by HEALTH_PROBE_TIMEOUT, so the
+    endpoint takes as long as the slowest probe rather than their sum.
     """
     health = HealthStatus(
         status="healthy",
@@ -191,31 +262,26 @@ async def health_check() -> HealthStatus:
         services={}
     )
     
-    # Check database
-    try:
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-        health.services["database"] = True
-    except Exception as e:
-        health.services["database"] = False
-        health.status = "degraded"
-        logger.error(f"Database health check failed: {e}")
-    
-    # Check Pinecone (mock for now)
-    try:
-        # TODO: Add actual Pinecone health check
-        health.services["pinecone"] = True
-    except Exception as e:
-        health.services["pinecone"] = False
-        health.status = "degraded"
+    probes = {
+        "database": _probe_database(),
+        "pinecone": _probe_pinecone(),
+        "openai": _probe_openai()
+    }
+    results = await asyncio.gather(
+        *(asyncio.wait_for(probe, timeout=HEALTH_PROBE_TIMEOUT) for probe in probes.values()),
+        return_exceptions=True
+    )
     
-    # Check OpenAI (mock for now)
-    try:
-        # TODO: Add actual OpenAI health check
-        health.services["openai"] = True
-    except Exception as e:
-        health.services["openai"] = False
-        health.status = "degraded"
+    for name, result in zip(probes, results):
+        if isinstance(result, BaseException):
+            health.services[name] = False
+            health.status = "degraded"
+            reason = "timed out" if isinstance(result, asyncio.TimeoutError) else result
+            logger.error(f"{name} health check failed: {reason}")
+        else:
+            health.services[name] = bool(result)
+            if not result:
+                health.status = "degraded"
     
     return health
 
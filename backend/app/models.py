@@ -4,10 +4,13 @@ These models ensure type safety and automatic validation for all API endpoints.
 """
 
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field, validator
+from typing import List, Optional, Dict, Any, Literal, Annotated
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints, TypeAdapter, field_validator
 from enum import Enum
 
+# Largest accepted upload
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024  # 10MB in bytes
+
 # Enums for constrained fields
 class FileType(str, Enum):
     """Supported file types for document upload"""
@@ -25,17 +28,27 @@ class DocumentStatus(str, Enum):
     READY = "ready"
     ERROR = "error"
 
+# Field annotations for the above - pydantic-core checks a Literal against a
+# set of strings, without building an Enum member per value; use
+# FileType(value) / DocumentStatus(value) where the enum itself is needed
+FileTypeValue = Literal["pdf", "docx", "doc", "xlsx", "xls", "txt"]
+DocumentStatusValue = Literal["uploading", "processing", "ready", "error"]
+
 class MessageRole(str, Enum):
     """Chat message role"""
     USER = "user"
     ASSISTANT = "assistant"
     SYSTEM = "system"
 
+# Constrained strings, checked (and stripped) by pydantic-core in one pass
+ProjectName = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=100)]
+ProjectDescription = Annotated[str, StringConstraints(strip_whitespace=True, max_length=500)]
+
 # Project Models
 class ProjectBase(BaseModel):
     """Base project model with common fields"""
-    name: str = Field(..., min_length=1, max_length=100, description="Project name")
-    description: Optional[str] = Field(None, max_length=500, description="Project description")
+    name: ProjectName = Field(..., description="Project name")
+    description: Optional[ProjectDescription] = Field(None, description="Project description")
 
 class ProjectCreate(ProjectBase):
     """Model for creating a new project"""
@@ -43,8 +56,8 @@ class ProjectCreate(ProjectBase):
 
 class ProjectUpdate(BaseModel):
     """Model for updating a project"""
-    name: Optional[str] = Field(None, min_length=1, max_length=100)
-    description: Optional[str] = Field(None, max_length=500)
+    name: Optional[ProjectName] = None
+    description: Optional[ProjectDescription] = None
 
 class ProjectResponse(ProjectBase):
     """Model for project responses"""
@@ -61,19 +74,19 @@ class ProjectResponse(ProjectBase):
 class DocumentBase(BaseModel):
     """Base document model"""
     filename: str
-    file_type: FileType
+    file_type: FileTypeValue
     project_id: str
 
 class DocumentCreate(DocumentBase):
     """Model for creating a document record"""
     size: int = Field(..., gt=0, description="File size in bytes")
     
-    @validator('size')
+    @field_validator('size')
+    @classmethod
     def validate_size(cls, v):
         """Validate file size is within limits"""
-        max_size = 10 * 1024 * 1024  # 10MB in bytes
-        if v > max_size:
-            raise ValueError(f"File size exceeds maximum of {max_size} bytes")
+        if v > MAX_UPLOAD_BYTES:
+            raise ValueError(f"File size exceeds maximum of {MAX_UPLOAD_BYTES} bytes")
         return v
 
 class DocumentResponse(DocumentBase):
@@ -81,13 +94,17 @@ class DocumentResponse(DocumentBase):
     id: str
     uploaded_at: datetime
     size: int
-    status: DocumentStatus
+    status: DocumentStatusValue
     page_count: Optional[int] = None
     error_message: Optional[str] = None
     
     class Config:
         from_attributes = True
 
+# Built once at import - list endpoints serialise with it directly instead of
+# FastAPI building a response validator per request
+DocumentListAdapter = TypeAdapter(List[DocumentResponse])
+
 # Chat Models
 
 class ChatRequest(BaseModel):
@@ -100,18 +117,23 @@ class ChatRequest(BaseModel):
     conversation_id: Optional[str] = None  # For maintaining context
     include_sources: bool = True  # Whether to return source documents
     max_chunks: Optional[int] = 5  # How many document chunks to use
+    no_cache: bool = False  # Always generate a fresh answer (skip the semantic cache)
     
-    class Config:
-        # This provides example data for API documentation
-        json_schema_extra = {
-            "example": {
-                "project_id": "proj_abc123",
-                "query": "What are the main features of the product?",
-                "conversation_id": None,
-                "include_sources": True,
-                "max_chunks": 5
-            }
+    # This provides example data for API documentation
+    model_config = ConfigDict(
+        json_schema_extra={
+            "examples": [
+                {
+                    "project_id": "proj_abc123",
+                    "query": "What are the main features of the product?",
+                    "conversation_id": None,
+                    "include_sources": True,
+                    "max_chunks": 5,
+                    "no_cache": False
+                }
+            ]
         }
+    )
 
 class ChatResponse(BaseModel):
     """
@@ -125,27 +147,30 @@ class ChatResponse(BaseModel):
     message_metadata: Optional[Dict[str, Any]] = None  # Additional info (tokens, time, etc.)
     error: Optional[str] = None  # Error message if something went wrong
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "success": True,
-                "response": "Based on the documents, the main features include...",
-                "conversation_id": "conv_123456",
-                "sources": [
-                    {
-                        "document_id": "doc_789",
-                        "filename": "product_guide.pdf",
-                        "relevance_score": 0.92
+    model_config = ConfigDict(
+        json_schema_extra={
+            "examples": [
+                {
+                    "success": True,
+                    "response": "Based on the documents, the main features include...",
+                    "conversation_id": "conv_123456",
+                    "sources": [
+                        {
+                            "document_id": "doc_789",
+                            "filename": "product_guide.pdf",
+                            "relevance_score": 0.92
+                        }
+                    ],
+                    "message_metadata": {
+                        "response_time": 2.5,
+                        "chunks_used": 3,
+                        "model": "gpt-4-turbo-preview",
+                        "tokens_used": 850
                     }
-                ],
-                "message_metadata": {
-                    "response_time": 2.5,
-                    "chunks_used": 3,
-                    "model": "gpt-4-turbo-preview",
-                    "tokens_used": 850
                 }
-            }
+            ]
         }
+    )
 
 class ConversationHistory(BaseModel):
     """
@@ -159,28 +184,31 @@ class ConversationHistory(BaseModel):
     updated_at: datetime  # Last message time
     message_count: Optional[int] = 0  # Total number of messages
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "conversation_id": "conv_123456",
-                "project_id": "proj_abc123",
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": "What is machine learning?",
-                        "timestamp": "2024-01-15T10:30:00Z"
-                    },
-                    {
-                        "role": "assistant",
-                        "content": "Machine learning is a subset of AI...",
-                        "timestamp": "2024-01-15T10:30:05Z"
-                    }
-                ],
-                "created_at": "2024-01-15T10:30:00Z",
-                "updated_at": "2024-01-15T10:30:05Z",
-                "message_count": 2
-            }
+    model_config = ConfigDict(
+        json_schema_extra={
+            "examples": [
+                {
+                    "conversation_id": "conv_123456",
+                    "project_id": "proj_abc123",
+                    "messages": [
+                        {
+                            "role": "user",
+                            "content": "What is machine learning?",
+                            "timestamp": "2024-01-15T10:30:00Z"
+                        },
+                        {
+                            "role": "assistant",
+                            "content": "Machine learning is a subset of AI...",
+                            "timestamp": "2024-01-15T10:30:05Z"
+                        }
+                    ],
+                    "created_at": "2024-01-15T10:30:00Z",
+                    "updated_at": "2024-01-15T10:30:05Z",
+                    "message_count": 2
+                }
+            ]
         }
+    )
 
 class MessageRequest(BaseModel):
     """
@@ -191,17 +219,20 @@ class MessageRequest(BaseModel):
     content: str  # The actual message text
     message_metadata: Optional[Dict[str, Any]] = None  # Additional data
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "role": "user",
-                "content": "What are vectors in the context of AI?",
-                "message_metadata": {
-                    "source": "web_ui",
-                    "user_id": "user_123"
+    model_config = ConfigDict(
+        json_schema_extra={
+            "examples": [
+                {
+                    "role": "user",
+                    "content": "What are vectors in the context of AI?",
+                    "message_metadata": {
+                        "source": "web_ui",
+                        "user_id": "user_123"
+                    }
                 }
-            }
+            ]
         }
+    )
 
 # Debug print to confirm models are loaded
 print("[Models] Chat models loaded: ChatRequest, ChatResponse, ConversationHistory, MessageRequest")
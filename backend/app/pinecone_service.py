@@ -14,7 +14,9 @@ This module handles:
 Architecture:
 - Each document chunk becomes a vector in Pinecone
 - Vectors are indexed by document_id_chunk_index
-- Metadata includes text, document info, and timestamps
+- Metadata is just document_id, chunk_index and a text hash; the chunk
+  text itself lives in PostgreSQL (document_chunks) and is fetched by the
+  caller for the top-k matches
 """
 
 # ============================================================================
@@ -22,21 +24,104 @@ Architecture:
 # ============================================================================
 import os
 import time
-from typing import List, Dict, Any, Optional, Tuple
+import hashlib
+import logging
+from typing import List, Dict, Any, Optional, Tuple, Sequence, Iterator
+from collections import deque
 from datetime import datetime
 import json
 
+import numpy as np
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
 # Pinecone client
 try:
     from pinecone import Pinecone, ServerlessSpec
     PINECONE_AVAILABLE = True
-    print("[PineconeService] ✅ Pinecone SDK available")
+    logger.debug("Pinecone SDK available")
 except ImportError:
     PINECONE_AVAILABLE = False
-    print("[PineconeService] ❌ Pinecone SDK not available - install pinecone-client")
+    logger.error("Pinecone SDK not available - install pinecone-client")
+
+# gRPC transport (protobuf vectors over HTTP/2 - about half the payload of
+# REST/JSON); same upsert/query/delete API, falls back to REST without it
+try:
+    from pinecone.grpc import PineconeGRPC
+    PINECONE_GRPC_AVAILABLE = True
+    logger.debug("Pinecone gRPC transport available")
+except ImportError:
+    PINECONE_GRPC_AVAILABLE = False
+    logger.info("Pinecone gRPC transport not available - using REST (install pinecone-client[grpc])")
 
 # Import our configuration
 from app.config import settings
+from app.document_processor import ChunkRecord
+
+# Upserts are sent in batches of this many vectors (Pinecone recommends <= 100),
+# with up to UPSERT_CONCURRENCY batches in flight on the index's thread pool
+UPSERT_BATCH_SIZE = 100
+UPSERT_CONCURRENCY = 8
+
+# Pinecone accepts at most 1000 IDs per delete request
+DELETE_BATCH_SIZE = 1000
+
+# Delays (seconds) between readiness checks after creating the index
+INDEX_READY_BACKOFF = (0.5, 1, 2, 4, 8, 16)
+
+def _namespace_vector_count(stats: Any, namespace: Optional[str]) -> int:
+    """Vector count of one namespace from describe_index_stats() (0 if absent)"""
+    summary = (stats.namespaces or {}).get(namespace or "")
+    if summary is None:
+        return 0
+    return summary['vector_count'] if isinstance(summary, dict) else summary.vector_count
+
+def _wait(result: Any) -> Any:
+    """Block on an async_req upsert (gRPC future or REST ApplyResult)"""
+    return result.result() if hasattr(result, 'result') else result.get()
+
+def _iter_vector_batches(
+    document_id: str,
+    chunks: Sequence[ChunkRecord],
+    embeddings: Sequence[Optional[Sequence[float]]],
+    batch_size: int = UPSERT_BATCH_SIZE
+) -> Iterator[List[Tuple[str, List[float], Dict[str, Any]]]]:
+    """
+    Yield upsert batches of (id, values, metadata) tuples, skipping chunks
+    without an embedding.
+    
+    IDs are document_id_chunk_N. Each batch's rows are coerced to one
+    float32 block (what Pinecone stores) and converted to lists in a single
+    pass. Metadata is kept minimal - the chunk text is stored in PostgreSQL
+    (document_chunks) and looked up by (document_id, chunk_index) after a
+    search; the hash lets callers detect a stale row.
+    """
+    def build(kept):
+        values = np.asarray([embedding for _, _, embedding in kept], dtype=np.float32).tolist()
+        return [
+            (
+                f"{document_id}_chunk_{index}",
+                row,
+                {
+                    'document_id': document_id,
+                    'chunk_index': index,
+                    'text_hash': hashlib.sha1(chunk.text.encode('utf-8')).hexdigest()[:16]
+                }
+            )
+            for (index, chunk, _), row in zip(kept, values)
+        ]
+    
+    kept = []
+    for index, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
+        if embedding is None:
+            continue
+        kept.append((index, chunk, embedding))
+        if len(kept) == batch_size:
+            yield build(kept)
+            kept = []
+    if kept:
+        yield build(kept)
 
 # ============================================================================
 # PINECONE SERVICE CLASS
@@ -57,7 +142,7 @@ class PineconeService:
         """
         Initialize the Pinecone service and connect to the index.
         """
-        print("\n[PineconeService] Initializing...")
+        logger.debug("Initializing...")
         
         # Check if Pinecone is available
         if not PINECONE_AVAILABLE:
@@ -70,47 +155,48 @@ class PineconeService:
         
         # Check API key
         if not settings.pinecone_api_key:
-            print("[PineconeService] ⚠️  WARNING: Pinecone API key not set!")
-            print("[PineconeService] Set PINECONE_API_KEY in your .env file")
-            print("[PineconeService] Get your key from: https://app.pinecone.io/")
+            logger.warning("Pinecone API key not set - set PINECONE_API_KEY in your .env file "
+                           "(get a key from https://app.pinecone.io/)")
             self.pc = None
         else:
             # Initialize Pinecone client
             try:
-                print("[PineconeService] Connecting to Pinecone...")
-                print(f"[PineconeService] API Key: {settings.pinecone_api_key[:8]}...")
+                logger.debug("Connecting to Pinecone (API key %s...)", settings.pinecone_api_key[:8])
                 
-                # Initialize Pinecone with new client structure (as of 2024)
-                self.pc = Pinecone(api_key=settings.pinecone_api_key)
+                # Initialize Pinecone with new client structure (as of 2024),
+                # over gRPC when available
+                client_class = PineconeGRPC if PINECONE_GRPC_AVAILABLE else Pinecone
+                self.pc = client_class(api_key=settings.pinecone_api_key)
                 
-                print(f"[PineconeService] ✅ Pinecone client initialized")
+                logger.debug("Pinecone client initialized (%s)", client_class.__name__)
                 
                 # Connect to or create index
                 self._setup_index()
                 
             except Exception as e:
-                print(f"[PineconeService] ❌ Failed to initialize Pinecone: {e}")
+                logger.error("Failed to initialize Pinecone: %s", e)
                 self.pc = None
                 self.index = None
         
-        print("[PineconeService] ✅ Initialization complete\n")
+        logger.debug("Initialization complete")
     
     def _setup_index(self):
         """
         Set up the Pinecone index - create if doesn't exist, connect if it does.
         """
         try:
-            print(f"[PineconeService] Setting up index: {self.index_name}")
+            logger.debug("Setting up index: %s", self.index_name)
             
             # List existing indexes
             existing_indexes = self.pc.list_indexes()
-            print(f"[PineconeService] Existing indexes: {[idx.name for idx in existing_indexes]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Existing indexes: %s", [idx.name for idx in existing_indexes])
             
             # Check if our index exists
             index_exists = any(idx.name == self.index_name for idx in existing_indexes)
             
             if not index_exists:
-                print(f"[PineconeService] Index '{self.index_name}' doesn't exist. Creating...")
+                logger.info("Index '%s' doesn't exist. Creating...", self.index_name)
                 
                 # Create the index with serverless spec (recommended for free tier)
                 self.pc.create_index(
@@ -123,50 +209,47 @@ class PineconeService:
                     )
                 )
                 
-                print(f"[PineconeService] ✅ Index '{self.index_name}' created!")
-                
-                # Wait for index to be ready
-                print("[PineconeService] Waiting for index to be ready...")
-                time.sleep(10)  # Initial wait
+                logger.info("Index '%s' created", self.index_name)
                 
-                # Poll until ready
-                max_attempts = 30
-                for i in range(max_attempts):
+                # Wait for index to be ready, polling with exponential
+                # backoff (serverless indexes are usually ready in seconds)
+                logger.info("Waiting for index to be ready...")
+                for delay in (0, *INDEX_READY_BACKOFF):
+                    time.sleep(delay)
                     try:
-                        index_description = self.pc.describe_index(self.index_name)
-                        if index_description.status.ready:
-                            print("[PineconeService] ✅ Index is ready!")
+                        if self.pc.describe_index(self.index_name).status.ready:
+                            logger.info("Index is ready")
                             break
-                    except:
-                        pass
-                    
-                    print(f"[PineconeService] Waiting... ({i+1}/{max_attempts})")
-                    time.sleep(2)
+                    except Exception as e:
+                        logger.debug("describe_index failed (%s), retrying", e)
+                else:
+                    logger.warning("Index '%s' still not ready after %.1fs - continuing",
+                                   self.index_name, sum(INDEX_READY_BACKOFF))
             else:
-                print(f"[PineconeService] ✅ Index '{self.index_name}' already exists")
+                logger.debug("Index '%s' already exists", self.index_name)
             
-            # Connect to the index
-            self.index = self.pc.Index(self.index_name)
+            # Connect to the index (over REST, pool_threads serves async_req
+            # upserts; the gRPC index has its own futures)
+            if PINECONE_GRPC_AVAILABLE:
+                self.index = self.pc.Index(self.index_name)
+            else:
+                self.index = self.pc.Index(self.index_name, pool_threads=UPSERT_CONCURRENCY)
             
             # Get index statistics
             stats = self.index.describe_index_stats()
-            print(f"[PineconeService] Index statistics:")
-            print(f"  - Total vectors: {stats.total_vector_count}")
-            print(f"  - Dimension: {stats.dimension}")
-            print(f"  - Index fullness: {stats.index_fullness:.2%}")
+            logger.debug("Index statistics: %d vectors, dimension %d, fullness %.2f%%",
+                         stats.total_vector_count, stats.dimension, stats.index_fullness * 100)
             
         except Exception as e:
-            print(f"[PineconeService] ❌ Error setting up index: {e}")
-            print(f"[PineconeService] Debug info:")
-            print(f"  - Index name: {self.index_name}")
-            print(f"  - Dimension: {self.dimension}")
+            logger.error("Error setting up index '%s' (dimension %d): %s",
+                         self.index_name, self.dimension, e)
             raise
     
     def upsert_embeddings(
         self, 
         document_id: str, 
-        chunks: List[Dict[str, Any]], 
-        embeddings: List[List[float]],
+        chunks: List[ChunkRecord], 
+        embeddings: Sequence[Optional[Sequence[float]]],
         project_namespace: str
     ) -> Dict[str, Any]:
         """
@@ -174,114 +257,76 @@ class PineconeService:
         
         Args:
             document_id: Unique identifier for the document
-            chunks: List of chunk dictionaries with text and metadata
-            embeddings: List of embedding vectors (same order as chunks)
+            chunks: List of ChunkRecord objects with text and metadata
+            embeddings: Embedding vectors (lists or float32 array rows, None
+                where embedding failed), same order as chunks
+            project_namespace: Namespace to store vectors in (project ID)
             
         Returns:
             Dictionary with upload statistics
         """
-        print(f"\n[PineconeService] Upserting embeddings for document: {document_id}")
-        print(f"  - Number of chunks: {len(chunks)}")
-        print(f"  - Number of embeddings: {len(embeddings)}")
+        logger.debug("Upserting embeddings for document %s: %d chunks, %d embeddings",
+                     document_id, len(chunks), len(embeddings))
         
         if not self.index:
-            print("[PineconeService] ❌ Index not initialized!")
+            logger.error("Index not initialized")
             return {'success': False, 'error': 'Index not initialized'}
         
-        # Prepare vectors for upsert
-        vectors = []
-        successful = 0
-        failed = 0
+        successful = sum(1 for embedding in embeddings if embedding is not None)
+        failed = len(chunks) - successful
+        if failed:
+            logger.warning("Skipping %d chunks without embeddings", failed)
         
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            # Skip if embedding is None (failed to generate)
-            if embedding is None:
-                print(f"[PineconeService] ⚠️  Skipping chunk {i} - no embedding")
-                failed += 1
-                continue
+        if not successful:
+            logger.warning("No valid vectors to upsert")
+            return {
+                'success': False,
+                'error': 'No valid embeddings',
+                'successful': 0,
+                'failed': len(chunks)
+            }
+        
+        # Upsert vectors to Pinecone in batches, built one at a time so only
+        # the batches in flight are materialised as Python lists
+        try:
+            logger.debug("Upserting %d vectors to Pinecone...", successful)
             
-            # Create unique ID for this chunk
-            chunk_id = f"{document_id}_chunk_{i}"
+            # async_req returns a future; keep at most UPSERT_CONCURRENCY
+            # in flight, waiting on the oldest before dispatching more
+            pending = deque()
+            total_upserted = 0
+            batches = 0
+            for batch in _iter_vector_batches(document_id, chunks, embeddings):
+                if len(pending) >= UPSERT_CONCURRENCY:
+                    total_upserted += _wait(pending.popleft()).upserted_count
+                pending.append(self.index.upsert(vectors=batch, namespace=project_namespace, async_req=True))
+                batches += 1
+            while pending:
+                total_upserted += _wait(pending.popleft()).upserted_count
             
-            # Prepare metadata (Pinecone has limits on metadata size)
-            # Maximum metadata size is 10KB per vector
-            chunk_text = chunk.get('text', '')
+            logger.debug("Upserted %d vectors in %d batches", total_upserted, batches)
             
-            # Truncate text if too long for metadata (keep under 5000 chars to be safe)
-            if len(chunk_text) > 5000:
-                chunk_text = chunk_text[:5000] + "..."
+            # Verify by checking stats (once, after all batches)
+            stats = self.index.describe_index_stats()
+            namespace_vectors = _namespace_vector_count(stats, project_namespace)
+            logger.info("Document %s: upserted %d vectors (%d in namespace '%s', %d in index)",
+                        document_id, total_upserted, namespace_vectors,
+                        project_namespace, stats.total_vector_count)
             
-            metadata = {
-                'document_id': document_id,
-                'chunk_index': i,
-                'text': chunk_text,  # Store the actual text for retrieval
-                'char_count': chunk.get('char_count', 0),
-                'word_count': chunk.get('word_count', 0),
-                'timestamp': datetime.utcnow().isoformat()
+            return {
+                'success': True,
+                'upserted': total_upserted,
+                'successful': successful,
+                'failed': failed,
+                'total_vectors_in_index': stats.total_vector_count,
+                'vectors_in_namespace': namespace_vectors
             }
             
-            # Add to vectors list
-            vectors.append({
-                'id': chunk_id,
-                'values': embedding,
-                'metadata': metadata
-            })
-            
-            successful += 1
-            
-            # Debug: Show progress for large documents
-            if (i + 1) % 10 == 0:
-                print(f"  Processed {i + 1}/{len(chunks)} chunks...")
-        
-        # Upsert vectors to Pinecone in batches
-        if vectors:
-            try:
-                print(f"[PineconeService] Upserting {len(vectors)} vectors to Pinecone...")
-                
-                # Pinecone recommends batch sizes of 100 or less
-                batch_size = 100
-                total_upserted = 0
-                
-                for i in range(0, len(vectors), batch_size):
-                    batch = vectors[i:i + batch_size]
-                    
-                    # Upsert batch
-                    response = self.index.upsert(vectors=batch, namespace=project_namespace)
-                    
-                    total_upserted += response.upserted_count
-                    print(f"  Batch {i//batch_size + 1}: Upserted {response.upserted_count} vectors")
-                
-                print(f"[PineconeService] ✅ Successfully upserted {total_upserted} vectors!")
-                
-                # Wait a moment for indexing
-                time.sleep(1)
-                
-                # Verify by checking stats
-                stats = self.index.describe_index_stats()
-                print(f"[PineconeService] Updated index statistics:")
-                print(f"  - Total vectors: {stats.total_vector_count}")
-                
-                return {
-                    'success': True,
-                    'upserted': total_upserted,
-                    'successful': successful,
-                    'failed': failed,
-                    'total_vectors_in_index': stats.total_vector_count
-                }
-                
-            except Exception as e:
-                print(f"[PineconeService] ❌ Error upserting vectors: {e}")
-                return {
-                    'success': False,
-                    'error': str(e),
-                    'successful': 0,
-                    'failed': len(chunks)
-                }
-        else:
-            print("[PineconeService] ⚠️  No valid vectors to upsert")
+        except Exception as e:
+            logger.error("Error upserting vectors: %s", e)
             return {
                 'success': False,
-                'error': 'No valid embeddings',
+                'error': str(e),
                 'successful': 0,
                 'failed': len(chunks)
             }
@@ -290,27 +335,33 @@ class PineconeService:
         self, 
         query_embedding: List[float], 
         top_k: int = 5,
-        # filter: Optional[Dict] = None,
         include_metadata: bool = True,
         project_namespace: str = None
     ) -> List[Dict[str, Any]]:
         """
         Search for similar vectors in Pinecone.
         
+        Each project is its own namespace, so a query only scans that
+        project's vectors - no metadata filter is needed to scope it.
+        
+        Each result is {**metadata, 'id', 'score'}. 'text' is only present
+        for vectors upserted before chunk text moved out of the metadata;
+        otherwise the caller fetches it from PostgreSQL (see
+        database.get_chunk_texts).
+        
         Args:
             query_embedding: The query vector to search for
             top_k: Number of results to return
-            filter: Optional metadata filter
             include_metadata: Whether to include metadata in results
             project_namespace: Namespace to search within (project ID)
             
         Returns:
-            List of search results with scores and metadata
+            List of flat search result dicts
         """
-        print(f"\n[PineconeService] Searching for {top_k} similar vectors...")
+        logger.debug("Searching for %d similar vectors...", top_k)
         
         if not self.index:
-            print("[PineconeService] ❌ Index not initialized!")
+            logger.error("Index not initialized")
             return []
         
         try:
@@ -318,35 +369,27 @@ class PineconeService:
             results = self.index.query(
                 vector=query_embedding,
                 top_k=top_k,
-                # filter=filter,
                 include_metadata=include_metadata,
                 namespace=project_namespace
             )
 
-            # Process results
-            search_results = []
-            for match in results.matches:
-                result = {
-                    'id': match.id,
-                    'score': match.score,  # Cosine similarity (higher is better, max 1.0)
-                    'document_id': match.metadata.get('document_id') if match.metadata else None,
-                    'chunk_index': match.metadata.get('chunk_index') if match.metadata else None,
-                    'text': match.metadata.get('text') if match.metadata else None,
-                    'metadata': match.metadata if match.metadata else {}
-                }
-                search_results.append(result)
-                
-                # Debug: Show top results
-                if len(search_results) <= 3:
-                    preview = result['text'][:100] if result['text'] else 'No text'
-                    print(f"  Result {len(search_results)}: Score={result['score']:.4f}")
-                    print(f"    Preview: {preview}...")
+            # Flatten each match: id, score (cosine similarity, higher is
+            # better, max 1.0) and its metadata fields (document_id,
+            # chunk_index, ... - 'text' only on legacy vectors)
+            search_results = [
+                {**(m.metadata or {}), 'id': m.id, 'score': m.score}
+                for m in results.matches
+            ]
             
-            print(f"[PineconeService] ✅ Found {len(search_results)} results")
+            if logger.isEnabledFor(logging.DEBUG):
+                for i, result in enumerate(search_results[:3], 1):
+                    preview = (result.get('text') or 'No text')[:100]
+                    logger.debug("Result %d: score=%.4f preview=%s...", i, result['score'], preview)
+            logger.debug("Found %d results", len(search_results))
             return search_results
             
         except Exception as e:
-            print(f"[PineconeService] ❌ Search error: {e}")
+            logger.error("Search error: %s", e)
             return []
     
     def delete_namespace(self, namespace: str) -> bool:
@@ -360,88 +403,83 @@ class PineconeService:
             True if successful, False otherwise
         """
 
-        print(f"\n[PineconeService] Deleting all vectors in namespace: {namespace}")
+        logger.debug("Deleting all vectors in namespace: %s", namespace)
         
         if not self.index:
-            print("[PineconeService] ❌ Index not initialized!")
+            logger.error("Index not initialized")
             return False
         
         try:
             # Delete all vectors in the specified namespace
             self.index.delete(delete_all=True, namespace=namespace)
             
-            print(f"[PineconeService] ✅ Deleted all vectors in namespace {namespace}")
+            logger.info("Deleted all vectors in namespace %s", namespace)
             return True
             
         except Exception as e:
-            print(f"[PineconeService] ❌ Delete error: {e}")
+            logger.error("Delete error: %s", e)
             return False
         
 
-    def delete_document(self, document_id: str) -> bool:
+    def delete_document(
+        self,
+        document_id: str,
+        project_namespace: Optional[str] = None,
+        chunk_count: Optional[int] = None
+    ) -> bool:
         """
         Delete all vectors for a specific document.
         
+        Vector IDs follow the pattern document_id_chunk_N, so they are
+        deleted by ID - built directly from chunk_count when it is known,
+        otherwise listed by ID prefix. No similarity query is needed and
+        there is no cap on the number of chunks.
+        
         Args:
             document_id: The document ID to delete
+            project_namespace: Namespace the vectors were stored in (project ID)
+            chunk_count: Number of chunks upserted for the document, if known
             
         Returns:
             True if successful, False otherwise
         """
-        print(f"\n[PineconeService] Deleting vectors for document: {document_id}")
+        logger.debug("Deleting vectors for document: %s", document_id)
         
         if not self.index:
-            print("[PineconeService] ❌ Index not initialized!")
+            logger.error("Index not initialized")
             return False
         
         try:
-            # We need to find all chunk IDs for this document
-            # Since we use the pattern: document_id_chunk_N
-            # We can use metadata filtering to find them
-            
-            # First, query to find all chunks for this document
-            # Note: Pinecone doesn't support wildcard deletes, so we need IDs
-            
-            # Get a sample vector to use for querying (any vector will do)
-            stats = self.index.describe_index_stats()
-            if stats.total_vector_count == 0:
-                print("[PineconeService] No vectors in index")
-                return True
-            
-            # Query with a dummy vector but filter by document_id
-            dummy_vector = [0.0] * self.dimension
-            results = self.index.query(
-                vector=dummy_vector,
-                top_k=1000,  # Get up to 1000 chunks
-                filter={'document_id': document_id},
-                include_metadata=False
-            )
+            if chunk_count is not None:
+                ids = [f"{document_id}_chunk_{i}" for i in range(chunk_count)]
+                id_pages = (ids[i:i + DELETE_BATCH_SIZE] for i in range(0, len(ids), DELETE_BATCH_SIZE))
+            else:
+                # Serverless indexes can't delete by metadata filter; list IDs by prefix
+                id_pages = self.index.list(prefix=f"{document_id}_chunk_", namespace=project_namespace)
             
-            # Extract chunk IDs
-            chunk_ids = [match.id for match in results.matches]
+            deleted = 0
+            for id_page in id_pages:
+                if id_page:
+                    self.index.delete(ids=list(id_page), namespace=project_namespace)
+                    deleted += len(id_page)
             
-            if chunk_ids:
-                print(f"[PineconeService] Found {len(chunk_ids)} chunks to delete")
-                
-                # Delete the chunks
-                self.index.delete(ids=chunk_ids)
-                
-                print(f"[PineconeService] ✅ Deleted {len(chunk_ids)} vectors")
-                return True
-            else:
-                print(f"[PineconeService] No chunks found for document {document_id}")
-                return True
+            logger.info("Deleted %d vector IDs for document %s", deleted, document_id)
+            return True
                 
         except Exception as e:
-            print(f"[PineconeService] ❌ Delete error: {e}")
+            logger.error("Delete error: %s", e)
             return False
     
-    def get_index_stats(self) -> Dict[str, Any]:
+    def get_index_stats(self, project_namespace: Optional[str] = None) -> Dict[str, Any]:
         """
         Get current index statistics.
         
+        Args:
+            project_namespace: Also report the vector count of this namespace
+            
         Returns:
-            Dictionary with index statistics
+            Dictionary with index statistics ('namespaces' maps each
+            namespace to its vector count)
         """
         if not self.index:
             return {'error': 'Index not initialized'}
@@ -449,16 +487,33 @@ class PineconeService:
         try:
             stats = self.index.describe_index_stats()
             
-            return {
+            result = {
                 'index_name': self.index_name,
                 'total_vectors': stats.total_vector_count,
                 'dimension': stats.dimension,
                 'index_fullness': stats.index_fullness,
-                'namespaces': stats.namespaces
+                'namespaces': {
+                    name: _namespace_vector_count(stats, name)
+                    for name in (stats.namespaces or {})
+                }
             }
+            if project_namespace is not None:
+                result['namespace_vectors'] = _namespace_vector_count(stats, project_namespace)
+            return result
         except Exception as e:
             return {'error': str(e)}
 
+def get_pinecone(request: Request) -> Optional[PineconeService]:
+    """
+    Dependency function to get the shared Pinecone service.
+    Connected in the background by main.py's lifespan and kept on app.state.
+    
+    Returns:
+        PineconeService, or None while connecting or if it failed - callers
+        fall back to working without vectors
+    """
+    return getattr(request.app.state, "pinecone", None)
+
 # ============================================================================
 # UTILITY FUNCTIONS FOR TESTING
 # ============================================================================
@@ -500,22 +555,20 @@ def test_pinecone_service():
     # Create test data
     test_document_id = f"test_doc_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     
+    test_texts = [
+        'Machine learning is a subset of artificial intelligence.',
+        'Python is a popular programming language for data science.',
+        'Neural networks are inspired by the human brain.'
+    ]
     test_chunks = [
-        {
-            'text': 'Machine learning is a subset of artificial intelligence.',
-            'char_count': 56,
-            'word_count': 8
-        },
-        {
-            'text': 'Python is a popular programming language for data science.',
-            'char_count': 58,
-            'word_count': 9
-        },
-        {
-            'text': 'Neural networks are inspired by the human brain.',
-            'char_count': 49,
-            'word_count': 8
-        }
+        ChunkRecord(
+            chunk_index=i,
+            text=text,
+            char_count=len(text),
+            word_count=len(text.split()),
+            start_char=0
+        )
+        for i, text in enumerate(test_texts)
     ]
     
     # Generate simple test embeddings (normally these come from OpenAI)
@@ -551,7 +604,7 @@ def test_pinecone_service():
         for i, result in enumerate(search_results, 1):
             print(f"\n  Result {i}:")
             print(f"    Score: {result['score']:.4f}")
-            print(f"    Text: {result['text'][:100] if result['text'] else 'N/A'}...")
+            print(f"    Text: {(result.get('text') or 'N/A')[:100]}...")
     else:
         print("No results found")
     
@@ -570,4 +623,5 @@ def test_pinecone_service():
 
 # Run test if executed directly
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.DEBUG, format='%(name)s - %(levelname)s - %(message)s')
     test_pinecone_service()
\ No newline at end of file
@@ -4,42 +4,15 @@ Run this to diagnose configuration issues.
 """
 
 import os
+import re
 import sys
+from pathlib import Path
 
-print("="*60)
-print("🔍 Configuration Debug Tool")
-print("="*60)
+# KEY=VALUE lines of a .env file (comments and blank lines don't match)
+_ENV_RE = re.compile(r'^[ \t]*([^#\s=][^=\n]*)=(.*?)[ \t\r]*$', re.MULTILINE)
 
-# Step 1: Check Python environment
-print("\n1. Python Environment:")
-print(f"   Python version: {sys.version}")
-print(f"   Current directory: {os.getcwd()}")
-print(f"   Virtual env: {sys.prefix}")
-
-# Step 2: Check .env file
-print("\n2. Checking .env file:")
-env_path = os.path.join(os.getcwd(), '.env')
-if os.path.exists(env_path):
-    print(f"   ✅ .env file found at: {env_path}")
-    print(f"   File size: {os.path.getsize(env_path)} bytes")
-    
-    # Read and display .env content (hide sensitive values)
-    print("\n   .env contents (sensitive values hidden):")
-    with open(env_path, 'r', encoding='utf-8') as f:
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
-            if line and not line.startswith('#'):
-                if '=' in line:
-                    key, value = line.split('=', 1)
-                    if 'KEY' in key or 'PASSWORD' in key:
-                        print(f"   Line {line_num}: {key}=***HIDDEN***")
-                    else:
-                        print(f"   Line {line_num}: {key}={value}")
-else:
-    print(f"   ❌ .env file NOT found at: {env_path}")
-    print("   Creating a template .env file...")
-    
-    template = """# OpenAI Configuration
+# Written to .env when none exists (step 2)
+_ENV_TEMPLATE = b"""# OpenAI Configuration
 OPENAI_API_KEY=your_openai_api_key_here
 OPENAI_MODEL=gpt-4-turbo-preview
 
@@ -71,11 +44,47 @@ CHUNK_OVERLAP=200
 EMBEDDING_MODEL=text-embedding-3-small
 EMBEDDING_DIMENSION=1536
 """
+
+print("="*60)
+print("🔍 Configuration Debug Tool")
+print("="*60)
+
+# Step 1: Check Python environment
+print("\n1. Python Environment:")
+print(f"   Python version: {sys.version}")
+print(f"   Current directory: {os.getcwd()}")
+print(f"   Virtual env: {sys.prefix}")
+
+# Step 2: Check .env file
+print("\n2. Checking .env file:")
+env_path = os.path.join(os.getcwd(), '.env')
+if os.path.exists(env_path):
+    print(f"   ✅ .env file found at: {env_path}")
+    print(f"   File size: {os.path.getsize(env_path)} bytes")
+    
+    # Read and display .env content (hide sensitive values)
+    print("\n   .env contents (sensitive values hidden):")
+    data = Path(env_path).read_text(encoding='utf-8')
+    line_num, pos = 1, 0
+    for match in _ENV_RE.finditer(data):
+        # Line numbers counted incrementally between matches
+        line_num += data.count('\n', pos, match.start())
+        pos = match.start()
+        key, value = match.groups()
+        if 'KEY' in key or 'PASSWORD' in key:
+            print(f"   Line {line_num}: {key}=***HIDDEN***")
+        else:
+            print(f"   Line {line_num}: {key}={value}")
+else:
+    print(f"   ❌ .env file NOT found at: {env_path}")
+    print("   Creating a template .env file...")
     
-    with open('.env', 'w', encoding='utf-8') as f:
-        f.write(template)
+    Path(env_path).write_bytes(_ENV_TEMPLATE)
     print("   ✅ Created template .env file")
 
+# os.environ bound once and read locally below (load_dotenv updates it in place)
+env = os.environ
+
 # Step 3: Test dotenv loading
 print("\n3. Testing python-dotenv:")
 try:
@@ -88,7 +97,7 @@ try:
     # Check specific environment variables
     test_vars = ['DATABASE_URL', 'APP_NAME', 'ALLOWED_EXTENSIONS', 'DEBUG_MODE']
     for var in test_vars:
-        value = os.getenv(var)
+        value = env.get(var)
         if value:
             if 'PASSWORD' in var or 'KEY' in var:
                 print(f"   {var}: ***HIDDEN***")
@@ -123,23 +132,21 @@ except ImportError as e:
 
 # Step 5: Test database URL parsing
 print("\n5. Testing Database URL:")
-db_url = os.getenv('DATABASE_URL', 'not set')
+db_url = env.get('DATABASE_URL', 'not set')
 if db_url != 'not set':
-    # Parse and validate PostgreSQL URL
-    if db_url.startswith('postgresql://'):
-        try:
-            # Extract components
-            parts = db_url.replace('postgresql://', '').split('@')
-            if len(parts) == 2:
-                user_pass = parts[0].split(':')
-                host_db = parts[1].split('/')
-                print(f"   ✅ Valid PostgreSQL URL structure")
-                print(f"   User: {user_pass[0]}")
-                print(f"   Host: {host_db[0].split(':')[0]}")
-                print(f"   Port: {host_db[0].split(':')[1] if ':' in host_db[0] else '5432'}")
-                print(f"   Database: {host_db[1] if len(host_db) > 1 else 'unknown'}")
-        except Exception as e:
-            print(f"   ❌ Error parsing database URL: {e}")
+    # Parse and validate PostgreSQL URL with SQLAlchemy's own parser (the one
+    # create_engine uses - handles driver suffixes and escaped passwords)
+    try:
+        from sqlalchemy.engine import make_url
+        url = make_url(db_url)
+        if url.get_backend_name() == 'postgresql' and url.host:
+            print(f"   ✅ Valid PostgreSQL URL structure")
+            print(f"   User: {url.username}")
+            print(f"   Host: {url.host}")
+            print(f"   Port: {url.port or 5432}")
+            print(f"   Database: {url.database or 'unknown'}")
+    except Exception as e:
+        print(f"   ❌ Error parsing database URL: {e}")
 else:
     print("   ❌ DATABASE_URL not set in environment")
 
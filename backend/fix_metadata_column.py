@@ -2,7 +2,8 @@
 Fix Metadata Column Name Conflict
 ==================================
 This script renames the 'metadata' column to 'message_metadata' in the messages table
-to avoid SQLAlchemy's reserved word conflict.
+to avoid SQLAlchemy's reserved word conflict, and makes sure the column is jsonb
+with the GIN index the model expects.
 
 Usage: python fix_metadata_column.py
 
@@ -12,14 +13,24 @@ Date: 2024
 
 import sys
 import os
+import logging
 from datetime import datetime
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
 
 # Add backend to path for imports
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from sqlalchemy import create_engine, text
 from sqlalchemy.exc import OperationalError, ProgrammingError
-from app.config import settings
+from sqlalchemy.pool import NullPool
+
+@lru_cache(maxsize=1)
+def _settings():
+    """App settings, loaded (and validated) on first use rather than at import"""
+    from app.config import settings
+    return settings
 
 def fix_metadata_column():
     """
@@ -33,17 +44,16 @@ def fix_metadata_column():
     # Create database connection
     print(f"\n[1] Connecting to database...")
     
+    engine = None
     try:
-        engine = create_engine(settings.database_url)
+        # One connection, then exit - no pool to set up or tear down
+        engine = create_engine(_settings().database_url, poolclass=NullPool)
         
-        with engine.connect() as conn:
-            # Test connection
-            result = conn.execute(text("SELECT 1"))
-            print(f"    ✅ Connected successfully")
-            
-            # Step 1: Check what columns exist in messages table
-            print(f"\n[2] Checking current messages table structure...")
-            
+        # One transaction for the whole fix - committed once on exit (DDL is
+        # transactional in PostgreSQL), rolled back if anything fails
+        with engine.begin() as conn:
+            # Step 1: Check what columns exist in messages table (this first
+            # query doubles as the connection test)
             check_query = text("""
                 SELECT column_name, data_type
                 FROM information_schema.columns 
@@ -51,9 +61,10 @@ def fix_metadata_column():
                 ORDER BY ordinal_position
             """)
             
-            result = conn.execute(check_query)
-            columns = result.fetchall()
+            columns = dict(conn.execute(check_query).fetchall())
+            print(f"    ✅ Connected successfully")
             
+            print(f"\n[2] Checking current messages table structure...")
             if not columns:
                 print(f"    ⚠️  Messages table doesn't exist")
                 print(f"    Run: python init_database.py")
@@ -61,14 +72,12 @@ def fix_metadata_column():
             
             # Print current columns
             print(f"    Current columns in messages table:")
-            column_names = []
-            for col_name, data_type in columns:
+            for col_name, data_type in columns.items():
                 print(f"      - {col_name}: {data_type}")
-                column_names.append(col_name)
             
             # Step 2: Determine what action to take
-            has_metadata = 'metadata' in column_names
-            has_message_metadata = 'message_metadata' in column_names
+            has_metadata = 'metadata' in columns
+            has_message_metadata = 'message_metadata' in columns
             
             print(f"\n[3] Determining required action...")
             
@@ -81,9 +90,8 @@ def fix_metadata_column():
                     response = input("    Do you want to drop the old 'metadata' column? (y/n): ")
                     
                     if response.lower() == 'y':
-                        drop_query = text("ALTER TABLE messages DROP COLUMN metadata")
-                        conn.execute(drop_query)
-                        conn.commit()
+                        conn.execute(text("ALTER TABLE messages DROP COLUMN metadata"))
+                        del columns['metadata']
                         print(f"    ✅ Old 'metadata' column dropped")
                 
             elif has_metadata:
@@ -91,13 +99,14 @@ def fix_metadata_column():
                 print(f"    ⚠️  Found 'metadata' column - renaming to 'message_metadata'")
                 
                 print(f"\n[4] Renaming column...")
-                rename_query = text("""
+                conn.execute(text("""
                     ALTER TABLE messages 
                     RENAME COLUMN metadata TO message_metadata
-                """)
-                
-                conn.execute(rename_query)
-                conn.commit()
+                """))
+                columns = {
+                    ('message_metadata' if name == 'metadata' else name): data_type
+                    for name, data_type in columns.items()
+                }
                 print(f"    ✅ Column renamed successfully")
                 
             else:
@@ -105,59 +114,56 @@ def fix_metadata_column():
                 print(f"    ⚠️  No metadata column found - creating 'message_metadata'")
                 
                 print(f"\n[4] Adding message_metadata column...")
-                add_query = text("""
+                conn.execute(text("""
                     ALTER TABLE messages 
-                    ADD COLUMN message_metadata JSON NULL
-                """)
-                
-                conn.execute(add_query)
-                conn.commit()
+                    ADD COLUMN message_metadata JSONB NULL
+                """))
+                columns['message_metadata'] = 'jsonb'
                 print(f"    ✅ Column added successfully")
             
-            # Step 3: Verify final structure
-            print(f"\n[5] Verifying final table structure...")
-            
-            result = conn.execute(check_query)
-            final_columns = result.fetchall()
+            # Step 3: The model declares JSONB with a GIN index; a renamed or
+            # pre-existing column may still be plain json
+            if columns['message_metadata'] != 'jsonb':
+                print(f"\n[4b] Converting message_metadata to jsonb...")
+                conn.execute(text("""
+                    ALTER TABLE messages
+                    ALTER COLUMN message_metadata TYPE jsonb
+                    USING message_metadata::jsonb
+                """))
+                columns['message_metadata'] = 'jsonb'
+                print(f"    ✅ Column converted successfully")
+            
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_messages_metadata_gin
+                ON messages USING gin (message_metadata jsonb_path_ops)
+            """))
+            
+            # Step 4: Final structure - the DDL above raises on failure, so the
+            # column list is updated in place rather than queried again
+            print(f"\n[5] Final table structure...")
             
             print(f"    Final columns in messages table:")
-            for col_name, data_type in final_columns:
+            for col_name, data_type in columns.items():
                 if col_name in ['message_metadata', 'metadata']:
                     print(f"      - {col_name}: {data_type} ⭐")  # Highlight metadata columns
                 else:
                     print(f"      - {col_name}: {data_type}")
+            print(f"\n    ✅ Success! 'message_metadata' column is ready")
             
-            # Verify message_metadata exists
-            final_column_names = [col[0] for col in final_columns]
-            if 'message_metadata' in final_column_names:
-                print(f"\n    ✅ Success! 'message_metadata' column is ready")
-            else:
-                print(f"\n    ❌ Failed to create/rename column")
-                return False
-            
-            # Show statistics
+            # Show statistics (both counts in one query)
             print(f"\n[6] Database statistics:")
             
-            # Count messages
-            count_query = text("SELECT COUNT(*) FROM messages")
-            result = conn.execute(count_query)
-            message_count = result.fetchone()[0]
+            message_count, metadata_count = conn.execute(text("""
+                SELECT COUNT(*), COUNT(message_metadata)
+                FROM messages
+            """)).one()
             print(f"    Total messages: {message_count}")
-            
-            # Count messages with metadata
-            metadata_query = text("""
-                SELECT COUNT(*) 
-                FROM messages 
-                WHERE message_metadata IS NOT NULL
-            """)
-            result = conn.execute(metadata_query)
-            metadata_count = result.fetchone()[0]
             print(f"    Messages with metadata: {metadata_count}")
-            
-            print("\n" + "="*70)
-            print("✅ DATABASE FIX COMPLETE")
-            print("="*70)
-            return True
+        
+        print("\n" + "="*70)
+        print("✅ DATABASE FIX COMPLETE")
+        print("="*70)
+        return True
             
     except OperationalError as e:
         print(f"\n❌ Database connection error: {e}")
@@ -175,12 +181,17 @@ def fix_metadata_column():
         
     except Exception as e:
         print(f"\n❌ Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Metadata column fix failed")
         return False
+        
+    finally:
+        if engine is not None:
+            engine.dispose()
 
 # Run the fix when script is executed
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    
     success = fix_metadata_column()
     
     if success:
@@ -11,14 +11,71 @@ Date: 2024
 
 import sys
 import os
+import logging
 from datetime import datetime
+from functools import lru_cache
+from urllib.parse import urlparse, ParseResult
+
+logger = logging.getLogger(__name__)
 
 # Add backend to path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from sqlalchemy import create_engine, text, Column, String
 from sqlalchemy.exc import OperationalError, ProgrammingError
-from app.config import settings
+from sqlalchemy.pool import NullPool
+
+@lru_cache(maxsize=1)
+def _settings():
+    """App settings, loaded (and validated) on first use rather than at import"""
+    from app.config import settings
+    return settings
+
+@lru_cache(maxsize=1)
+def _db() -> ParseResult:
+    """Parsed settings.database_url (parsed once)"""
+    return urlparse(_settings().database_url)
+
+# Queries reused across the migration, built once
+COLUMN_EXISTS_SQL = text("""
+    SELECT column_name 
+    FROM information_schema.columns 
+    WHERE table_name = :table 
+    AND column_name = :column
+""")
+
+TABLE_STRUCTURE_SQL = text("""
+    SELECT column_name, data_type, is_nullable
+    FROM information_schema.columns
+    WHERE table_name = :table
+    ORDER BY ordinal_position
+""")
+
+# Adds conversation_id and its indexes if missing. ix_messages_legacy_scan
+# is a partial index matching update_existing_messages()' window order - it
+# covers only the rows still to be grouped, and is dropped once they have been
+ADD_CONVERSATION_ID_SQL = text("""
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'messages' AND column_name = 'conversation_id'
+        ) THEN
+            ALTER TABLE messages ADD COLUMN conversation_id VARCHAR NULL;
+        END IF;
+        CREATE INDEX IF NOT EXISTS ix_messages_conversation_id
+            ON messages(conversation_id);
+        CREATE INDEX IF NOT EXISTS ix_messages_legacy_scan
+            ON messages(project_id, timestamp, id)
+            WHERE conversation_id IS NULL;
+    END $$;
+""")
+
+# COUNT(DISTINCT ...) skips NULLs, so both statistics come from one scan
+MESSAGE_STATS_SQL = text("""
+    SELECT COUNT(*), COUNT(DISTINCT conversation_id)
+    FROM messages
+""")
 
 def add_conversation_id_column():
     """
@@ -30,27 +87,24 @@ def add_conversation_id_column():
     
     # Create database connection
     print(f"\n[1] Connecting to database...")
-    print(f"    Database URL: {settings.database_url.split('@')[1] if '@' in settings.database_url else 'local'}")
+    db = _db()
+    print(f"    Database URL: {f'{db.hostname}:{db.port or 5432}{db.path}' if db.hostname else 'local'}")
     
+    engine = None
     try:
-        engine = create_engine(settings.database_url)
+        # One connection, then exit - no pool to set up or tear down
+        engine = create_engine(_settings().database_url, poolclass=NullPool)
         
         with engine.connect() as conn:
-            # Test connection
-            result = conn.execute(text("SELECT 1"))
+            # Opening the connection is the liveness check - a failure raises
+            # OperationalError, reported below
             print(f"    ✅ Connected successfully")
             
             # Check if column already exists
             print(f"\n[2] Checking if conversation_id column exists...")
             
-            check_query = text("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'messages' 
-                AND column_name = 'conversation_id'
-            """)
-            
-            result = conn.execute(check_query)
+            check_params = {'table': 'messages', 'column': 'conversation_id'}
+            result = conn.execute(COLUMN_EXISTS_SQL, check_params)
             column_exists = result.fetchone() is not None
             
             if column_exists:
@@ -58,14 +112,7 @@ def add_conversation_id_column():
                 
                 # Show current messages table structure
                 print(f"\n[3] Current messages table structure:")
-                structure_query = text("""
-                    SELECT column_name, data_type, is_nullable
-                    FROM information_schema.columns
-                    WHERE table_name = 'messages'
-                    ORDER BY ordinal_position
-                """)
-                
-                result = conn.execute(structure_query)
+                result = conn.execute(TABLE_STRUCTURE_SQL, {'table': 'messages'})
                 columns = result.fetchall()
                 
                 print(f"    Columns in messages table:")
@@ -75,55 +122,22 @@ def add_conversation_id_column():
                 
             else:
                 print(f"    ⚠️  Column 'conversation_id' does not exist")
-                print(f"\n[3] Adding conversation_id column...")
-                
-                # Add the column
-                alter_query = text("""
-                    ALTER TABLE messages 
-                    ADD COLUMN conversation_id VARCHAR NULL
-                """)
+                print(f"\n[3] Adding conversation_id column and indexes...")
                 
-                conn.execute(alter_query)
+                # Column + indexes in one server-side block (one round trip,
+                # one transaction); guarded so a concurrent run is a no-op
+                conn.execute(ADD_CONVERSATION_ID_SQL)
                 conn.commit()
                 print(f"    ✅ Column added successfully")
-                
-                # Add index for better performance
-                print(f"\n[4] Adding index on conversation_id...")
-                index_query = text("""
-                    CREATE INDEX IF NOT EXISTS ix_messages_conversation_id 
-                    ON messages(conversation_id)
-                """)
-                
-                conn.execute(index_query)
-                conn.commit()
-                print(f"    ✅ Index added successfully")
-                
-                # Verify the column was added
-                print(f"\n[5] Verifying migration...")
-                result = conn.execute(check_query)
-                if result.fetchone():
-                    print(f"    ✅ Migration completed successfully!")
-                else:
-                    print(f"    ❌ Migration verification failed")
-                    return False
+                print(f"    ✅ Index on conversation_id added")
+                print(f"    ✅ Legacy scan index added")
+                print(f"    ✅ Migration completed successfully!")
             
             # Show statistics
-            print(f"\n[6] Database statistics:")
+            print(f"\n[4] Database statistics:")
             
-            # Count messages
-            count_query = text("SELECT COUNT(*) FROM messages")
-            result = conn.execute(count_query)
-            message_count = result.fetchone()[0]
+            message_count, conv_count = conn.execute(MESSAGE_STATS_SQL).one()
             print(f"    Total messages: {message_count}")
-            
-            # Count conversations (distinct conversation_ids)
-            conv_query = text("""
-                SELECT COUNT(DISTINCT conversation_id) 
-                FROM messages 
-                WHERE conversation_id IS NOT NULL
-            """)
-            result = conn.execute(conv_query)
-            conv_count = result.fetchone()[0]
             print(f"    Total conversations: {conv_count}")
             
             print("\n" + "="*70)
@@ -147,70 +161,68 @@ def add_conversation_id_column():
         
     except Exception as e:
         print(f"\n❌ Unexpected error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Migration failed")
         return False
+        
+    finally:
+        if engine is not None:
+            engine.dispose()
 
 def update_existing_messages():
     """
     Optional: Update existing messages with conversation IDs.
     Groups messages by timestamp proximity.
+    
+    Done in one statement: a window over (project_id, timestamp) starts a
+    new group at each project change or gap of more than an hour, and the
+    UPDATE writes every message's conversation_id in the same pass.
     """
     print("\n[Optional] Updating existing messages with conversation IDs...")
     
+    engine = None
     try:
-        engine = create_engine(settings.database_url)
+        # One connection, then exit - no pool to set up or tear down
+        engine = create_engine(_settings().database_url, poolclass=NullPool)
         
-        with engine.connect() as conn:
-            # Get messages without conversation_id
-            query = text("""
-                SELECT id, project_id, timestamp 
-                FROM messages 
-                WHERE conversation_id IS NULL
-                ORDER BY project_id, timestamp
+        with engine.begin() as conn:
+            update_query = text("""
+                WITH ordered AS (
+                    SELECT id, project_id, timestamp,
+                           LAG(timestamp) OVER w AS prev_ts,
+                           LAG(project_id) OVER w AS prev_project
+                    FROM messages
+                    WHERE conversation_id IS NULL
+                    WINDOW w AS (ORDER BY project_id, timestamp, id)
+                ),
+                grouped AS (
+                    SELECT id,
+                           SUM(CASE WHEN prev_ts IS NULL
+                                      OR prev_project <> project_id
+                                      OR timestamp - prev_ts > INTERVAL '1 hour'
+                                    THEN 1 ELSE 0 END)
+                               OVER (ORDER BY project_id, timestamp, id) - 1 AS gid
+                    FROM ordered
+                ),
+                updated AS (
+                    UPDATE messages m
+                    -- zero-padded to at least 4 digits, like f"{n:04d}"
+                    SET conversation_id = 'conv_legacy_' ||
+                        LPAD(grouped.gid::text, GREATEST(4, LENGTH(grouped.gid::text)), '0')
+                    FROM grouped
+                    WHERE m.id = grouped.id
+                    RETURNING m.conversation_id
+                )
+                SELECT COUNT(*), COUNT(DISTINCT conversation_id) FROM updated
             """)
             
-            result = conn.execute(query)
-            messages = result.fetchall()
+            messages_updated, conversations_created = conn.execute(update_query).one()
             
-            if messages:
-                print(f"    Found {len(messages)} messages without conversation_id")
-                
-                # Group messages by project and time proximity (within 1 hour)
-                from datetime import timedelta
-                
-                conversations_created = 0
-                current_project = None
-                current_conv_id = None
-                last_timestamp = None
-                
-                for msg_id, project_id, timestamp in messages:
-                    # Check if we need a new conversation
-                    if (current_project != project_id or 
-                        last_timestamp is None or 
-                        (timestamp - last_timestamp) > timedelta(hours=1)):
-                        
-                        # Create new conversation ID
-                        current_conv_id = f"conv_legacy_{conversations_created:04d}"
-                        current_project = project_id
-                        conversations_created += 1
-                    
-                    # Update message with conversation_id
-                    update_query = text("""
-                        UPDATE messages 
-                        SET conversation_id = :conv_id 
-                        WHERE id = :msg_id
-                    """)
-                    
-                    conn.execute(update_query, {
-                        'conv_id': current_conv_id,
-                        'msg_id': msg_id
-                    })
-                    
-                    last_timestamp = timestamp
-                
-                conn.commit()
-                print(f"    ✅ Updated {len(messages)} messages")
+            # Every message has a conversation_id now - the partial index
+            # from add_conversation_id_column() is empty and no longer needed
+            conn.execute(text("DROP INDEX IF EXISTS ix_messages_legacy_scan"))
+            
+            if messages_updated:
+                print(f"    ✅ Updated {messages_updated} messages")
                 print(f"    ✅ Created {conversations_created} conversation groups")
             else:
                 print(f"    No messages need updating")
@@ -218,8 +230,14 @@ def update_existing_messages():
     except Exception as e:
         print(f"    ⚠️  Could not update existing messages: {e}")
         print(f"    This is optional - new messages will have conversation_id")
+        
+    finally:
+        if engine is not None:
+            engine.dispose()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    
     # Run the migration
     success = add_conversation_id_column()
     